@@ -0,0 +1,65 @@
+"""Run the benchmarks without asv
+
+Usage: python -m benchmarks [--quick] [PATTERN]
+
+Each benchmark is timed with timeit, and the best time per call is printed.
+PATTERN is a substring filter on the benchmark names.
+"""
+import argparse
+import inspect
+import itertools
+import timeit
+
+from . import bench_codegen, bench_schemapi
+
+MODULES = [bench_schemapi, bench_codegen]
+
+
+def iter_benchmarks(pattern=''):
+    """Yield (name, class, method name, params) for all benchmarks"""
+    for module in MODULES:
+        for clsname, cls in inspect.getmembers(module, inspect.isclass):
+            if not clsname.startswith('Time'):
+                continue
+            params = getattr(cls, 'params', None)
+            if params is None:
+                grid = [()]
+            elif params and isinstance(params[0], list):
+                grid = list(itertools.product(*params))
+            else:
+                grid = [(p,) for p in params]
+            for method in sorted(dir(cls)):
+                if not method.startswith('time_'):
+                    continue
+                for p in grid:
+                    name = '{}.{}.{}({})'.format(module.__name__.split('.')[-1],
+                                                 clsname, method,
+                                                 ', '.join(map(repr, p)))
+                    if pattern in name:
+                        yield name, cls, method, p
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='run each benchmark only once')
+    parser.add_argument('pattern', nargs='?', default='')
+    args = parser.parse_args(args)
+
+    for name, cls, method, params in iter_benchmarks(args.pattern):
+        bench = cls()
+        if hasattr(bench, 'setup'):
+            bench.setup(*params)
+        func = getattr(bench, method)
+        timer = timeit.Timer(lambda: func(*params))
+        if args.quick:
+            number, repeat = 1, 1
+        else:
+            number, _ = timer.autorange()
+            repeat = 3
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        print('{:<70} {:>10.3f} ms'.format(name, 1000 * best))
+
+
+if __name__ == '__main__':
+    main()
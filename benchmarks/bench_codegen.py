@@ -0,0 +1,38 @@
+"""Benchmarks of module generation"""
+from schemapi import SchemaModuleGenerator
+
+from .common import synthetic, vegalite_like, wide
+
+
+class TimeModuleCode(object):
+    params = [10, 100, 1000]
+    param_names = ['size']
+
+    def setup(self, size):
+        self.gen = SchemaModuleGenerator(wide(size)[0])
+
+    def time_module_code(self, size):
+        self.gen.module_code()
+
+
+class TimeSyntheticModuleCode(object):
+    params = [10, 100, 1000]
+    param_names = ['n_definitions']
+
+    def setup(self, n_definitions):
+        self.gen = SchemaModuleGenerator(synthetic(n_definitions)[0])
+
+    def time_module_code(self, n_definitions):
+        self.gen.module_code()
+
+
+class TimeVegaLiteLikeModuleCode(object):
+    def setup(self):
+        self.schema = vegalite_like()[0]
+        self.gen = SchemaModuleGenerator(self.schema, root_name='VegaLite')
+
+    def time_module_code(self):
+        self.gen.module_code()
+
+    def time_generator_init(self):
+        SchemaModuleGenerator(self.schema, root_name='VegaLite')
@@ -0,0 +1,50 @@
+"""Benchmarks of SchemaBase construction, serialization and validation"""
+from .common import SpecBenchmark, deep, synthetic, union, vegalite_like, wide
+
+
+class TimeWide(SpecBenchmark):
+    params = [10, 100, 1000]
+    param_names = ['size']
+
+    def make(self, size):
+        return wide(size)
+
+
+class TimeDeep(SpecBenchmark):
+    params = [5, 20, 80]
+    param_names = ['depth']
+
+    def make(self, depth):
+        return deep(depth)
+
+
+class TimeUnion(SpecBenchmark):
+    params = [2, 8, 32]
+    param_names = ['width']
+
+    def make(self, width):
+        return union(width)
+
+
+class TimeVegaLiteLike(SpecBenchmark):
+    root_name = 'VegaLite'
+
+    def make(self):
+        return vegalite_like()
+
+
+class TimeSynthetic(SpecBenchmark):
+    params = [10, 100, 300]
+    param_names = ['n_definitions']
+
+    def make(self, n_definitions):
+        return synthetic(n_definitions)
+
+
+class TimeSyntheticArrays(SpecBenchmark):
+    params = [100, 1000, 10000]
+    param_names = ['array_length']
+    timeout = 300
+
+    def make(self, array_length):
+        return synthetic(5, depth=1, array_length=array_length)
@@ -0,0 +1,153 @@
+"""Schemas, specs and helpers shared by the benchmarks"""
+import json
+import os
+
+from schemapi import SchemaBase, SchemaModuleGenerator
+from schemapi.schemapi import debug_mode
+from schemapi.synthetic import random_instance, random_schema
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def load_json(filename):
+    with open(os.path.join(DATA_DIR, filename)) as f:
+        return json.load(f)
+
+
+def vegalite_like():
+    """Return the bundled Vega-Lite-shaped (schema, spec) fixture"""
+    return (load_json('vegalite_like_schema.json'),
+            load_json('vegalite_like_spec.json'))
+
+
+def wide(size):
+    """A root object with ``size`` properties, a third of them definitions"""
+    definitions = {}
+    properties = {}
+    instance = {}
+    for i in range(size):
+        name = 'p{}'.format(i)
+        if i % 3 == 0:
+            definitions['Def{}'.format(i)] = {
+                'type': 'object',
+                'properties': {'name': {'type': 'string'},
+                               'value': {'type': 'number'}},
+                'required': ['name'],
+            }
+            properties[name] = {'$ref': '#/definitions/Def{}'.format(i)}
+            instance[name] = {'name': name, 'value': i}
+        elif i % 3 == 1:
+            properties[name] = {'type': 'string'}
+            instance[name] = name
+        else:
+            properties[name] = {'type': 'array', 'items': {'type': 'number'}}
+            instance[name] = list(range(10))
+    schema = {'definitions': definitions, 'properties': properties}
+    return schema, instance
+
+
+def deep(depth):
+    """A chain of ``depth`` definitions, each referencing the next"""
+    definitions = {}
+    for i in range(depth):
+        properties = {'value': {'type': 'number'}}
+        if i + 1 < depth:
+            properties['child'] = {'$ref': '#/definitions/Node{}'.format(i + 1)}
+        definitions['Node{}'.format(i)] = {'type': 'object',
+                                           'properties': properties}
+    schema = {'definitions': definitions, '$ref': '#/definitions/Node0'}
+    instance = {'value': depth - 1}
+    for i in reversed(range(depth - 1)):
+        instance = {'value': i, 'child': instance}
+    return schema, instance
+
+
+def union(width, length=50):
+    """An array of ``anyOf`` unions of ``width`` object types
+
+    Every instance item matches only the last alternative, which is the
+    worst case for branch selection.
+    """
+    definitions = {
+        'Branch{}'.format(i): {'type': 'object',
+                               'properties': {'k{}'.format(i): {'type': 'string'}},
+                               'required': ['k{}'.format(i)],
+                               'additionalProperties': False}
+        for i in range(width)
+    }
+    item = {'anyOf': [{'$ref': '#/definitions/Branch{}'.format(i)}
+                      for i in range(width)]}
+    schema = {'definitions': definitions,
+              'properties': {'items': {'type': 'array', 'items': item}}}
+    key = 'k{}'.format(width - 1)
+    instance = {'items': [{key: str(i)} for i in range(length)]}
+    return schema, instance
+
+
+def synthetic(n_definitions, depth=5, array_length=2, seed=0):
+    """A random schema and a matching instance"""
+    schema = random_schema(n_definitions=n_definitions, depth=depth, seed=seed)
+    instance = random_instance(schema, array_length=array_length,
+                               optional_probability=0.8, seed=seed)
+    return schema, instance
+
+
+def import_module(schema, name, root_name='Root'):
+    """Generate a wrapper module for schema, without adding to sys.modules"""
+    gen = SchemaModuleGenerator(schema, root_name=root_name)
+    return gen.import_as(name, add_to_sys_modules=False)
+
+
+def wrapper_classes(module):
+    """Return the SchemaBase subclasses defined in a generated module"""
+    return [val for val in vars(module).values()
+            if isinstance(val, type) and issubclass(val, SchemaBase)]
+
+
+class SpecBenchmark(object):
+    """Base class timing the runtime paths of a generated wrapper
+
+    Derived classes implement ``make(*params)`` returning (schema, instance).
+    """
+    root_name = 'Root'
+    timeout = 120
+
+    def make(self, *params):
+        raise NotImplementedError()
+
+    def setup(self, *params):
+        schema, self.instance = self.make(*params)
+        module = import_module(schema, 'bench_' + type(self).__name__,
+                               root_name=self.root_name)
+        self.root = getattr(module, self.root_name)
+        self.classes = wrapper_classes(module)
+        with debug_mode(False):
+            self.obj = self.root.from_dict(self.instance, validate=False,
+                                           _wrapper_classes=self.classes)
+
+    def time_init(self, *params):
+        with debug_mode(False):
+            self.obj.__class__(*self.obj._args, **self.obj._kwds)
+
+    def time_init_debug_mode(self, *params):
+        with debug_mode(True):
+            self.obj.__class__(*self.obj._args, **self.obj._kwds)
+
+    def time_to_dict(self, *params):
+        self.obj.to_dict()
+
+    def time_to_dict_novalidate(self, *params):
+        self.obj.to_dict(validate=False)
+
+    def time_to_json(self, *params):
+        self.obj.to_json()
+
+    def time_from_dict(self, *params):
+        self.root.from_dict(self.instance, _wrapper_classes=self.classes)
+
+    def time_validate(self, *params):
+        self.root.validate(self.instance)
+
+    def time_copy(self, *params):
+        self.obj.copy()
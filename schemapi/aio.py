@@ -0,0 +1,87 @@
+"""Helpers for the asyncio API of SchemaBase
+
+``SchemaBase.from_json_async``, ``to_json_async`` and ``validate_async`` run
+the CPU-bound parsing, serialization and validation in an executor, so that
+large specs do not block the event loop. By default this is the event loop's
+default executor (a thread pool); use ``set_executor`` or ``use_executor`` to
+choose another one. With a process pool, the wrapper classes involved must be
+importable (and so picklable) in the worker processes.
+
+>>> import asyncio
+>>> async def main():
+...     return await run_in_executor(sum, [1, 2, 3])
+>>> asyncio.run(main())
+6
+"""
+import asyncio
+import contextlib
+import functools
+
+
+# The executor used by run_in_executor; None for the loop's default executor
+_EXECUTOR = None
+
+# The size of the chunks written to streams by write_stream
+CHUNK_SIZE = 64 * 1024
+
+
+def set_executor(executor):
+    """Set the executor used for CPU-bound work (None for the default)"""
+    global _EXECUTOR
+    _EXECUTOR = executor
+
+
+def get_executor():
+    """Return the executor used for CPU-bound work, or None"""
+    return _EXECUTOR
+
+
+@contextlib.contextmanager
+def use_executor(executor):
+    """Context manager which sets the executor within its block"""
+    global _EXECUTOR
+    original = _EXECUTOR
+    _EXECUTOR = executor
+    try:
+        yield
+    finally:
+        _EXECUTOR = original
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Call func(*args, **kwargs) in the executor and return the result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR,
+                                      functools.partial(func, *args, **kwargs))
+
+
+async def read_stream(stream):
+    """Read all data from a stream
+
+    stream may be a string or bytes-like object (returned as is), an object
+    with a coroutine ``read()`` method such as ``asyncio.StreamReader``, or an
+    async iterable of bytes or strings.
+    """
+    if isinstance(stream, (str, bytes, bytearray, memoryview)):
+        return stream
+    if hasattr(stream, 'read'):
+        return await stream.read()
+    chunks = [chunk async for chunk in stream]
+    if chunks and isinstance(chunks[0], str):
+        return ''.join(chunks)
+    return b''.join(chunks)
+
+
+async def write_stream(stream, data):
+    """Write bytes to a stream in chunks
+
+    stream must have a ``write()`` method. If it also has a coroutine
+    ``drain()`` method, as ``asyncio.StreamWriter`` does, it is awaited after
+    each chunk so that the writer respects flow control.
+    """
+    drain = getattr(stream, 'drain', None)
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        stream.write(view[start:start + CHUNK_SIZE])
+        if drain is not None:
+            await drain()
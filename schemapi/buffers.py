@@ -0,0 +1,82 @@
+"""Opaque array buffers within schema objects
+
+Large numeric arrays (e.g. inline data values) can be passed to schema
+wrappers as buffers rather than lists: NumPy arrays, ``memoryview`` objects or
+``array.array`` objects. Buffers are opaque to schemapi: ``copy`` shares them
+rather than copying them element by element, ``from_dict`` stores them without
+walking their items, and ``to_dict`` converts them to lists in bulk with their
+``tolist`` method.
+
+>>> import array
+>>> buf = array.array('d', [1.0, 2.5])
+>>> is_buffer(buf), is_buffer([1.0, 2.5])
+(True, False)
+>>> tolist(buf)
+[1.0, 2.5]
+
+In validation, buffers are accepted as arrays, and NumPy integer scalars as
+integers. Validation (on by default) still checks the items of a buffer one by
+one, so that constructing objects holding large buffers with
+``validate=False`` is much faster.
+"""
+import array
+import numbers
+
+import jsonschema
+
+
+_BUFFER_TYPES = (memoryview, array.array)
+
+
+def register_buffer_type(cls):
+    """Register a class whose instances are treated as buffers
+
+    Instances must have a ``tolist`` method. Classes implementing the NumPy
+    array interface are recognized without registration.
+    """
+    global _BUFFER_TYPES
+    if cls not in _BUFFER_TYPES:
+        _BUFFER_TYPES += (cls,)
+
+
+def is_buffer(obj):
+    """Return True if obj is an opaque buffer"""
+    return (isinstance(obj, _BUFFER_TYPES)
+            or hasattr(type(obj), '__array_interface__'))
+
+
+def tolist(obj):
+    """Convert a buffer to a (possibly nested) list of Python scalars"""
+    return obj.tolist()
+
+
+def _accepting(base_checker, type, extra_check):
+    """Return a type check accepting instances passing either check"""
+    def check(checker, instance):
+        return base_checker.is_type(instance, type) or extra_check(instance)
+    return check
+
+
+def _is_integral(instance):
+    return (isinstance(instance, numbers.Integral)
+            and not isinstance(instance, bool))
+
+
+# Validator classes accepting buffers, keyed by the jsonschema validator class
+# they extend
+_VALIDATORS = {}
+
+
+def validator_for(schema):
+    """Return the jsonschema validator class for schema, accepting buffers"""
+    base = jsonschema.validators.validator_for(schema)
+    cls = _VALIDATORS.get(base)
+    if cls is None:
+        base_checker = base.TYPE_CHECKER
+        type_checker = base_checker.redefine_many({
+            'array': _accepting(base_checker, 'array', is_buffer),
+            'integer': _accepting(base_checker, 'integer', _is_integral),
+        })
+        cls = _VALIDATORS[base] = jsonschema.validators.extend(
+            base, type_checker=type_checker)
+    return cls
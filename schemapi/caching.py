@@ -0,0 +1,269 @@
+"""Opt-in caching of validation results
+
+While a ``ValidationCache`` is enabled, ``SchemaBase.validate`` (and hence
+``to_dict``/``from_dict`` with validation) and ``SchemaBase.is_valid`` look up
+the outcome of validating an instance against a schema before running
+jsonschema. Entries are keyed by a digest of a typed encoding of the instance
+and by the identity of the schema and root schema, so that validating an
+instance equal to one validated before costs one encoding and one hash:
+
+>>> from schemapi import caching
+>>> with caching.cached_validation() as cache:
+...     pass  # validate or construct some objects here
+>>> cache.hits, cache.misses
+(0, 0)
+
+Schemas are identified by identity, and must not be modified while they are
+used with a cache; entries keep their schemas alive. The encoding tells apart
+all values which validation may tell apart (e.g. ``1``, ``1.0`` and ``True``,
+or lists and tuples). Instances which it does not cover (e.g. those holding
+tuples, buffers, non-finite floats or dicts with non-string keys) are
+validated without the cache.
+"""
+import collections
+import contextlib
+import copy
+import hashlib
+import math
+import threading
+import time
+
+import jsonschema
+
+
+# The active ValidationCache, or None if caching is disabled.
+_CACHE = None
+
+# Marks a missing entry
+_MISSING = object()
+
+
+class _Unencodable(Exception):
+    pass
+
+
+def _encode(value, parts):
+    """Append an unambiguous encoding of a JSON value to parts"""
+    cls = type(value)
+    if cls is str:
+        parts.append('s{}:'.format(len(value)))
+        parts.append(value)
+    elif value is None:
+        parts.append('n')
+    elif cls is bool:
+        parts.append('T' if value else 'F')
+    elif cls is int:
+        parts.append('i{};'.format(value))
+    elif cls is float:
+        if not math.isfinite(value):
+            raise _Unencodable(value)
+        parts.append('f{!r};'.format(value))
+    elif cls is list:
+        parts.append('l{}:'.format(len(value)))
+        for val in value:
+            _encode(val, parts)
+    elif cls is dict:
+        parts.append('d{}:'.format(len(value)))
+        if not all(type(key) is str for key in value):
+            raise _Unencodable(value)
+        for key in sorted(value):
+            _encode(key, parts)
+            _encode(value[key], parts)
+    else:
+        raise _Unencodable(value)
+
+
+def _digest(value):
+    """Return a digest of the encoding of a JSON value, or None if it cannot
+    be encoded"""
+    parts = []
+    try:
+        _encode(value, parts)
+    except (_Unencodable, RecursionError):
+        return None
+    encoded = ''.join(parts).encode('utf-8', 'surrogatepass')
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+class _Ref(object):
+    """A reference to an object, compared by identity
+
+    Keys hold schemas through it, so that their ids cannot be reused while
+    an entry exists.
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return self.obj is other.obj
+
+
+class ValidationCache(object):
+    """A bounded, thread-safe LRU cache of validation outcomes
+
+    Parameters
+    ----------
+    maxsize : int, default 1024
+        The maximum number of entries. The least recently used entries are
+        evicted first.
+    ttl : float, optional
+        If specified, entries expire this many seconds after they are stored.
+    clock : callable, optional
+        The function returning the current time in seconds used for ttl
+        (default: ``time.monotonic``).
+
+    Attributes
+    ----------
+    hits, misses : int
+        the number of lookups which found, or did not find, an entry
+    evictions : int
+        the number of entries evicted to respect maxsize
+    expirations : int
+        the number of entries found to be expired
+    """
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive, not {}".format(maxsize))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return ("ValidationCache(maxsize={}, ttl={!r}, size={}, hits={}, "
+                "misses={})".format(self.maxsize, self.ttl, len(self),
+                                    self.hits, self.misses))
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups which found an entry"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def key(self, instance, schema, rootschema):
+        """Return the key of an instance and schema, or None if the instance
+        cannot be encoded"""
+        digest = _digest(instance)
+        if digest is None:
+            return None
+        return (_Ref(schema), _Ref(rootschema), digest)
+
+    def get(self, key):
+        """Return the outcome stored for key
+
+        This is None if the instance was valid, the validation error if it was
+        invalid, and a sentinel if there is no entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None \
+                    and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, outcome):
+        """Store the outcome of a validation"""
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, outcome)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def validate(self, instance, schema, rootschema, validate):
+        """Validate instance with validate(instance, schema, rootschema),
+        reusing a cached outcome if there is one"""
+        key = self.key(instance, schema, rootschema)
+        if key is None:
+            return validate(instance, schema, rootschema)
+        outcome = self.get(key)
+        if outcome is _MISSING:
+            try:
+                validate(instance, schema, rootschema)
+            except jsonschema.ValidationError as err:
+                self.put(key, err)
+                raise
+            self.put(key, None)
+        elif outcome is not None:
+            # raise a copy, so that tracebacks do not accumulate
+            raise copy.copy(outcome)
+
+    def is_valid(self, instance, schema, rootschema, is_valid):
+        """Return is_valid(instance, schema, rootschema), reusing a cached
+        outcome if there is one
+
+        Only valid outcomes are stored, since there is no error to store.
+        """
+        key = self.key(instance, schema, rootschema)
+        if key is None:
+            return is_valid(instance, schema, rootschema)
+        outcome = self.get(key)
+        if outcome is _MISSING:
+            valid = is_valid(instance, schema, rootschema)
+            if valid:
+                self.put(key, None)
+            return valid
+        return outcome is None
+
+
+def enable_validation_cache(cache=None):
+    """Enable caching of validation results in cache (default: a new
+    ValidationCache)"""
+    global _CACHE
+    _CACHE = ValidationCache() if cache is None else cache
+    return _CACHE
+
+
+def disable_validation_cache():
+    """Disable caching of validation results, returning the cache used so far"""
+    global _CACHE
+    cache, _CACHE = _CACHE, None
+    return cache
+
+
+def get_validation_cache():
+    """Return the active ValidationCache, or None if caching is disabled"""
+    return _CACHE
+
+
+@contextlib.contextmanager
+def cached_validation(cache=None):
+    """Context manager which enables caching of validation results within its
+    block
+
+    Yields the ValidationCache used. The previous state is restored on exit.
+    """
+    global _CACHE
+    original = _CACHE
+    _CACHE = ValidationCache() if cache is None else cache
+    try:
+        yield _CACHE
+    finally:
+        _CACHE = original
@@ -1,6 +1,10 @@
 """Code generation utilities"""
+import collections
+import hashlib
 import imp
+import importlib.util
 import json
+import marshal
 import os
 import pkgutil
 import pprint
@@ -8,10 +12,10 @@ import re
 import sys
 import textwrap
 
-import jsonschema
-
+from .schemastore import load_schema, write_schema
 from .utils import (SchemaInfo, is_valid_identifier, indent_docstring, indent_arglist,
-                    load_metaschema)
+                    prune_schema, validate_schema)
+from .version import version as _schemapi_version
 
 
 class CodeSnippet(object):
@@ -23,43 +27,193 @@ class CodeSnippet(object):
         return self.code
 
 
-def _get_args(info):
+class ConstantPool(object):
+    """A pool of schema fragments shared by generated code
+
+    Dicts and lists which occur more than once within the schemas added to
+    the pool are emitted once, as module-level constants, and referred to by
+    name wherever they occur; the evaluated schemas then share these objects.
+    All schemas must be added with add() before any is passed to
+    substitute(), and the code() of the pool must precede the code using the
+    substituted schemas.
+
+    Parameters
+    ----------
+    prefix : string
+        The prefix of the names of the constants
+    min_length : integer
+        Fragments whose repr is estimated to be shorter than this are not
+        pooled, as their name would not be much shorter.
+    reserved : iterable of strings
+        Names which constants must not use
+    """
+    def __init__(self, prefix='_SCHEMA_', min_length=20, reserved=()):
+        self.prefix = prefix
+        self.min_length = min_length
+        self.reserved = set(reserved)
+        self._ids = {}
+        self._lengths = {}
+        self._counts = collections.Counter()
+        self._memo = {}
+        self._names = {}
+        self._next = 0
+        self._definitions = []
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def _id(self, value, count=False):
+        """Return the structural id of a JSON value"""
+        if not isinstance(value, (dict, list)):
+            key = (type(value), value)
+            ident = self._ids.setdefault(key, len(self._ids))
+            self._lengths.setdefault(ident, len(repr(value)))
+            return ident
+        memo = self._memo.get(id(value))
+        if memo is None:
+            if isinstance(value, dict):
+                items = tuple((self._id(key), self._id(val, count))
+                              for key, val in value.items())
+                key = ('dict', items)
+            else:
+                items = tuple((self._id(val, count),) for val in value)
+                key = ('list', items)
+            ident = self._ids.setdefault(key, len(self._ids))
+            self._lengths.setdefault(ident, 2 + sum(
+                self._lengths[i] + 2 for item in items for i in item))
+            # keep a reference to value, so that its id cannot be reused
+            memo = self._memo[id(value)] = (value, ident)
+        elif count:
+            # count the fragments within a repeated object
+            for val in (value.values() if isinstance(value, dict) else value):
+                self._id(val, count)
+        if count:
+            self._counts[memo[1]] += 1
+        return memo[1]
+
+    def add(self, schema):
+        """Count the fragments of a schema"""
+        self._id(schema, count=True)
+
+    def _name(self):
+        while True:
+            name = '{}{}'.format(self.prefix, self._next)
+            self._next += 1
+            if name not in self.reserved:
+                return name
+
+    def substitute(self, schema):
+        """Return a copy of schema with repeated fragments replaced by the
+        CodeSnippets of their constants"""
+        if not isinstance(schema, (dict, list)):
+            return schema
+        ident = self._id(schema)
+        name = self._names.get(ident)
+        if name is not None:
+            return CodeSnippet(name)
+        if isinstance(schema, dict):
+            result = {key: self.substitute(val) for key, val in schema.items()}
+        else:
+            result = [self.substitute(val) for val in schema]
+        if (self._counts[ident] > 1
+                and self._lengths[ident] >= self.min_length):
+            name = self._names[ident] = self._name()
+            prefix = '{} = '.format(name)
+            self._definitions.append(prefix + textwrap.indent(
+                pprint.pformat(result), len(prefix) * ' ').lstrip())
+            return CodeSnippet(name)
+        return result
+
+    def code(self):
+        """Return the code defining the constants used so far"""
+        return '\n'.join(self._definitions)
+
+
+ArgInfo = collections.namedtuple('ArgInfo', ['nonkeyword', 'required', 'kwds',
+                                             'invalid_kwds', 'additional'])
+
+
+class SignatureTable(object):
+    """Memoized table of __init__ argument info, keyed by schema node
+
+    A single table can be shared between all class generators for a root
+    schema, so that the arguments of common ``allOf`` parents are only
+    computed once. Entries are ArgInfo tuples whose sets are frozen, so that
+    they can be safely shared.
+    """
+    def __init__(self):
+        self._table = {}
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, info):
+        # Arguments depend only on the resolved schema, so that references
+        # to the same definition share a single entry.
+        key = (id(info.schema), id(info.rootschema))
+        entry = self._table.get(key)
+        if entry is not None:
+            if entry[-1] is None:
+                raise ValueError("Circular allOf reference in schema "
+                                 "{}".format(info.raw_schema))
+            return entry[-1]
+        # Keep references to the keyed schemas so their ids cannot be reused
+        self._table[key] = (info.schema, info.rootschema, None)
+        try:
+            arginfo = self._compute(info)
+        except:
+            del self._table[key]
+            raise
+        self._table[key] = (info.schema, info.rootschema, arginfo)
+        return arginfo
+
+    def _compute(self, info):
+        # TODO: - set additional properties correctly
+        #       - handle patternProperties etc.
+        required = frozenset()
+        kwds = frozenset()
+        invalid_kwds = frozenset()
+
+        # TODO: specialize for anyOf/oneOf?
+
+        if info.is_allOf():
+            # recursively look up all children
+            arginfo = [self[child] for child in info.allOf]
+            nonkeyword = all(args.nonkeyword for args in arginfo)
+            required = frozenset().union(*(args.required for args in arginfo))
+            kwds = frozenset().union(*(args.kwds for args in arginfo))
+            invalid_kwds = frozenset().union(*(args.invalid_kwds
+                                               for args in arginfo))
+            additional = all(args.additional for args in arginfo)
+        elif info.is_empty() or info.is_compound():
+            nonkeyword = True
+            additional = True
+        elif info.is_value():
+            nonkeyword = True
+            additional=False
+        elif info.is_object():
+            invalid_kwds = ({p for p in info.required if not is_valid_identifier(p)} |
+                            {p for p in info.properties if not is_valid_identifier(p)})
+            required = {p for p in info.required if is_valid_identifier(p)}
+            kwds = {p for p in info.properties if is_valid_identifier(p)}
+            kwds -= required
+            invalid_kwds = frozenset(invalid_kwds)
+            required = frozenset(required)
+            kwds = frozenset(kwds)
+            nonkeyword = False
+            additional = True
+            #additional = info.additionalProperties or info.patternProperties
+        else:
+            raise ValueError("Schema object not understood")
+
+        return ArgInfo(nonkeyword, required, kwds, invalid_kwds, additional)
+
+
+def _get_args(info, signature_table=None):
     """Return the list of args & kwds for building the __init__ function"""
-    # TODO: - set additional properties correctly
-    #       - handle patternProperties etc.
-    required = set()
-    kwds = set()
-    invalid_kwds = set()
-
-    # TODO: specialize for anyOf/oneOf?
-
-    if info.is_allOf():
-        # recursively call function on all children
-        arginfo = [_get_args(child) for child in info.allOf]
-        nonkeyword = all(args[0] for args in arginfo)
-        required = set.union(set(), *(args[1] for args in arginfo))
-        kwds = set.union(set(), *(args[2] for args in arginfo))
-        invalid_kwds = set.union(set(), *(args[3] for args in arginfo))
-        additional = all(args[4] for args in arginfo)
-    elif info.is_empty() or info.is_compound():
-        nonkeyword = True
-        additional = True
-    elif info.is_value():
-        nonkeyword = True
-        additional=False
-    elif info.is_object():
-        invalid_kwds = ({p for p in info.required if not is_valid_identifier(p)} |
-                        {p for p in info.properties if not is_valid_identifier(p)})
-        required = {p for p in info.required if is_valid_identifier(p)}
-        kwds = {p for p in info.properties if is_valid_identifier(p)}
-        kwds -= required
-        nonkeyword = False
-        additional = True
-        #additional = info.additionalProperties or info.patternProperties
-    else:
-        raise ValueError("Schema object not understood")
-
-    return (nonkeyword, required, kwds, invalid_kwds, additional)
+    if signature_table is None:
+        signature_table = SignatureTable()
+    return signature_table[info]
 
 
 class SchemaClassGenerator(object):
@@ -83,6 +237,18 @@ class SchemaClassGenerator(object):
     rootschemarepr : CodeSnippet or object, optional
         An object whose repr will be used in the place of the explicit root
         schema.
+    info_cache : dict, optional
+        A cache passed to the SchemaInfo objects used for code generation.
+        Sharing it between generators with the same rootschema avoids
+        recomputing descriptions of common subschemas.
+    signature_table : SignatureTable, optional
+        The table from which __init__ arguments are read. Sharing it between
+        generators with the same rootschema avoids recomputing the arguments
+        of common allOf parents.
+    constants : ConstantPool, optional
+        If specified, repeated fragments of the schema and root schema (which
+        must have been added to the pool) refer to the constants of this
+        pool, whose code must precede the class definition.
     """
     schema_class_template = textwrap.dedent('''
     class {classname}({basename}):
@@ -103,7 +269,8 @@ class SchemaClassGenerator(object):
 
     def __init__(self, classname, schema, rootschema=None,
                  basename='SchemaBase', schemarepr=None, rootschemarepr=None,
-                 nodefault=()):
+                 nodefault=(), info_cache=None, signature_table=None,
+                 constants=None):
         self.classname = classname
         self.schema = schema
         self.rootschema = rootschema
@@ -111,17 +278,29 @@ class SchemaClassGenerator(object):
         self.schemarepr = schemarepr
         self.rootschemarepr = rootschemarepr
         self.nodefault = nodefault
+        self.info_cache = {} if info_cache is None else info_cache
+        if signature_table is None:
+            signature_table = SignatureTable()
+        self.signature_table = signature_table
+        self.constants = constants
+
+    def _substitute(self, schema):
+        if self.constants is None:
+            return schema
+        return self.constants.substitute(schema)
 
     def schema_class(self):
         """Generate code for a schema class"""
         rootschema = self.rootschema if self.rootschema is not None else self.schema
-        schemarepr = self.schemarepr if self.schemarepr is not None else self.schema
+        schemarepr = self.schemarepr
+        if schemarepr is None:
+            schemarepr = self._substitute(self.schema)
         rootschemarepr = self.rootschemarepr
         if rootschemarepr is None:
             if rootschema is self.schema:
                 rootschemarepr = CodeSnippet('_schema')
             else:
-                rootschemarepr = rootschema
+                rootschemarepr = self._substitute(rootschema)
         return self.schema_class_template.format(
             classname=self.classname,
             basename=self.basename,
@@ -136,7 +315,7 @@ class SchemaClassGenerator(object):
         #       for example, a non-object definition should list valid type, enum
         #       values, etc.
         # TODO: use _get_args here for more information on allOf objects
-        info = SchemaInfo(self.schema, self.rootschema)
+        info = SchemaInfo(self.schema, self.rootschema, cache=self.info_cache)
         doc = ["{} schema wrapper".format(self.classname),
                '',
                info.medium_description]
@@ -145,7 +324,7 @@ class SchemaClassGenerator(object):
                 re.sub(r"\n\{\n(\n|.)*\n\}",'',info.description)).splitlines()
 
         if info.properties:
-            nonkeyword, required, kwds, invalid_kwds, additional = _get_args(info)
+            nonkeyword, required, kwds, invalid_kwds, additional = self.signature_table[info]
             doc += ['',
                     'Attributes',
                     '----------',
@@ -159,10 +338,19 @@ class SchemaClassGenerator(object):
             doc += ['']
         return indent_docstring(doc, indent_level=indent, width=100, lstrip=True)
 
-    def init_code(self, indent=0):
-        """Return code suitablde for the __init__ function of a Schema class"""
-        info = SchemaInfo(self.schema, rootschema=self.rootschema)
-        nonkeyword, required, kwds, invalid_kwds, additional =_get_args(info)
+    def init_args(self):
+        """Return the argument lists of the __init__ function of a Schema class
+
+        Returns
+        -------
+        args : list of strings
+            The arguments in the signature of __init__, starting with 'self'
+        super_args : list of strings
+            The arguments passed to the __init__ function of the base class
+        """
+        info = SchemaInfo(self.schema, rootschema=self.rootschema,
+                          cache=self.info_cache)
+        nonkeyword, required, kwds, invalid_kwds, additional = self.signature_table[info]
 
         nodefault=set(self.nodefault)
         required -= nodefault
@@ -186,6 +374,12 @@ class SchemaClassGenerator(object):
             args.append('**kwds')
             super_args.append('**kwds')
 
+        return args, super_args
+
+    def init_code(self, indent=0):
+        """Return code suitablde for the __init__ function of a Schema class"""
+        args, super_args = self.init_args()
+
         arg_indent_level = 9 + indent
         super_arg_indent_level = 23 + len(self.classname) + indent
 
@@ -208,6 +402,21 @@ class SchemaModuleGenerator(object):
         The name of the root class (default: 'Root')
     schemapi_import : string
         The import path for schemapi (default: 'schemapi')
+    schema_file : string or Path, optional
+        If specified, the generated module loads its root schema from this
+        file with ``schemapi.schemastore.load_schema`` rather than embedding
+        it as a literal, so that modules using the same schema file share one
+        copy of it. The schema is written to this file whenever the module
+        code is generated or imported, unless the file already holds it.
+    include : list of strings, optional
+        If specified, only classes for these definitions and the definitions
+        they reference (transitively) are generated, and the root schema is
+        pruned to those definitions (see ``schemapi.utils.prune_schema``).
+        The root class is always generated.
+    share_constants : boolean, default True
+        If True, fragments which occur more than once in the embedded root
+        schema are written once, as module-level constants (see
+        ConstantPool), so that the module is smaller and faster to import.
     """
 
     schema_module_header = textwrap.dedent("""
@@ -215,18 +424,54 @@ class SchemaModuleGenerator(object):
 
     from {schemapi} import SchemaBase, Undefined
     """)
-    def __init__(self, schema, root_name='Root', schemapi_import='schemapi'):
+    def __init__(self, schema, root_name='Root', schemapi_import='schemapi',
+                 schema_file=None, include=None, share_constants=True):
+        if include is not None:
+            schema = prune_schema(schema, include)
         self.schema = schema
         self.root_name = root_name
         self.schemapi_import = schemapi_import
+        if schema_file is not None:
+            schema_file = os.path.abspath(os.fspath(schema_file))
+        self.schema_file = schema_file
+        self.share_constants = share_constants
         self._validate()
 
     def _validate(self):
-        metaschema = load_metaschema()
-        jsonschema.validate(self.schema, metaschema)
+        validate_schema(self.schema)
+
+    def _write_schema_file(self):
+        """Write the schema to the schema file, unless it already holds it"""
+        try:
+            if load_schema(self.schema_file) == self.schema:
+                return
+        except (OSError, ValueError):
+            pass
+        write_schema(self.schema, self.schema_file)
+
+    def _schema_file_code(self, modulepath):
+        """Return the expression of the schema file path in the module"""
+        if modulepath is not None:
+            moduledir = os.path.dirname(os.path.abspath(modulepath))
+            try:
+                relpath = os.path.relpath(self.schema_file, moduledir)
+            except ValueError:
+                # e.g. on another drive
+                pass
+            else:
+                return f"os.path.join(os.path.dirname(__file__), {relpath!r})"
+        return repr(self.schema_file)
+
+    def module_code(self, modulepath=None):
+        """Generate a Python module implementing the schema
 
-    def module_code(self):
-        """Generate a Python module implementing the schema"""
+        Parameters
+        ----------
+        modulepath : string or Path, optional
+            The path the module will be written to. If specified, the module
+            refers to the schema file (if any) by its path relative to the
+            module; otherwise by its absolute path.
+        """
         definitions = self.schema.get('definitions', {})
 
         if self.root_name in definitions:
@@ -235,10 +480,33 @@ class SchemaModuleGenerator(object):
 
         code = ['"""Module generated by SchemaModuleGenerator"""',
                 f"from {self.schemapi_import} import SchemaBase, Undefined"]
-
-        schemarepr = textwrap.indent(pprint.pformat(self.schema), 4 * ' ').lstrip()
+        if self.schema_file is not None:
+            self._write_schema_file()
+            code[-1] += (f"\nfrom {self.schemapi_import}.schemastore "
+                         "import load_schema")
+            if modulepath is not None:
+                code.insert(1, "import os")
+
+        # descriptions and arguments of shared subschemas are computed once
+        # for all classes
+        info_cache = {}
+        signature_table = SignatureTable()
+
+        if self.schema_file is not None:
+            schemarepr = f"load_schema({self._schema_file_code(modulepath)})"
+        elif self.share_constants:
+            constants = ConstantPool(reserved=[self.root_name, *definitions])
+            constants.add(self.schema)
+            schemarepr = pprint.pformat(constants.substitute(self.schema))
+            schemarepr = textwrap.indent(schemarepr, 4 * ' ').lstrip()
+            if len(constants):
+                code.append(constants.code())
+        else:
+            schemarepr = textwrap.indent(pprint.pformat(self.schema), 4 * ' ').lstrip()
         root = SchemaClassGenerator(self.root_name, self.schema,
-                                    schemarepr=CodeSnippet(schemarepr))
+                                    schemarepr=CodeSnippet(schemarepr),
+                                    info_cache=info_cache,
+                                    signature_table=signature_table)
         code.append(root.schema_class())
         
         for name, subschema in definitions.items():
@@ -248,7 +516,9 @@ class SchemaModuleGenerator(object):
                                        schema=subschema,
                                        rootschema=self.schema,
                                        schemarepr=CodeSnippet(schemarepr),
-                                       rootschemarepr=CodeSnippet(rootschemarepr))
+                                       rootschemarepr=CodeSnippet(rootschemarepr),
+                                       info_cache=info_cache,
+                                       signature_table=signature_table)
             code.append(gen.schema_class())
 
         return '\n\n'.join(code)
@@ -267,12 +537,12 @@ class SchemaModuleGenerator(object):
             the full absolute path to the written module
         """
         modulename = os.fspath(modulename)  # support pathlib.Path & others
-        code = self.module_code()
+        code = self.module_code(modulename)
         with open(modulename, 'w') as f:
             f.write(code)
         return os.path.abspath(modulename)
 
-    def import_as(self, modulename, add_to_sys_modules=True):
+    def import_as(self, modulename, add_to_sys_modules=True, cache_dir=None):
         """Import wrapper as a dynamically-generated module.
 
         Parameters
@@ -282,14 +552,150 @@ class SchemaModuleGenerator(object):
         add_to_sys_modules : boolean
             if True (default) then add the modulename to sys.modules to allow
             accessing the module contents via standard import statements.
+        cache_dir : string or Path, optional
+            if specified, then the compiled module is cached in this directory
+            keyed by a hash of the schema, and reused by later imports. See
+            also ``import_cached``, which skips schema validation as well.
 
         Returns
         -------
         module :
             the dynamically-created module.
         """
-        module = imp.new_module(modulename)
-        if add_to_sys_modules:
-            sys.modules[modulename] = module
-        exec(self.module_code(), module.__dict__)
-        return module
+        if cache_dir is None:
+            code = self.module_code()
+        else:
+            code = _load_cached_code(self.schema, self.root_name,
+                                     self.schemapi_import, cache_dir,
+                                     self.schema_file, self.share_constants)
+            if code is None:
+                code = _write_cached_code(self, cache_dir)
+            elif self.schema_file is not None:
+                self._write_schema_file()
+        return _exec_module(code, modulename, add_to_sys_modules)
+
+
+def default_cache_dir():
+    """Return the default directory for cached generated modules
+
+    This is $SCHEMAPI_CACHE_DIR if set, and otherwise a schemapi directory
+    within $XDG_CACHE_HOME (default: ~/.cache).
+    """
+    cache_dir = os.environ.get('SCHEMAPI_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+    cache_home = (os.environ.get('XDG_CACHE_HOME')
+                  or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'schemapi')
+
+
+def _cache_path(schema, root_name, schemapi_import, cache_dir,
+                schema_file=None, share_constants=True):
+    """Return the path of the cached bytecode for a generated module"""
+    key = [schema, root_name, schemapi_import, _schemapi_version,
+           sys.implementation.cache_tag, share_constants]
+    if schema_file is not None:
+        key.append(schema_file)
+    key = json.dumps(key, sort_keys=True)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(os.fspath(cache_dir), digest + '.schemapi.pyc')
+
+
+def _load_cached_code(schema, root_name, schemapi_import, cache_dir,
+                      schema_file=None, share_constants=True):
+    """Load cached bytecode for a generated module, or return None"""
+    path = _cache_path(schema, root_name, schemapi_import, cache_dir,
+                       schema_file, share_constants)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    magic = importlib.util.MAGIC_NUMBER
+    if not data.startswith(magic):
+        return None
+    try:
+        return marshal.loads(data[len(magic):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_cached_code(generator, cache_dir):
+    """Compile the module for a generator and write it to the cache
+
+    The bytecode is written atomically, so that concurrent processes never
+    read a partially-written file. Failure to write the cache is not an error.
+    """
+    code = compile(generator.module_code(),
+                   '<schemapi:{}>'.format(generator.root_name), 'exec')
+    path = _cache_path(generator.schema, generator.root_name,
+                       generator.schemapi_import, cache_dir,
+                       generator.schema_file, generator.share_constants)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return code
+
+
+def _exec_module(code, modulename, add_to_sys_modules=True):
+    """Execute code (a string or code object) as a new module"""
+    module = imp.new_module(modulename)
+    if add_to_sys_modules:
+        sys.modules[modulename] = module
+    exec(code, module.__dict__)
+    return module
+
+
+def import_cached(schema, modulename, root_name='Root',
+                  schemapi_import='schemapi', add_to_sys_modules=True,
+                  cache_dir=None, include=None):
+    """Import a schema wrapper module, using cached bytecode if available
+
+    The compiled module, including the embedded schema, is cached in
+    ``cache_dir`` keyed by a hash of the schema and generator options. When
+    the cache is warm, the module is neither regenerated, recompiled, nor
+    validated against the metaschema, so that e.g. worker processes which
+    import the same wrapper start quickly.
+
+    Parameters
+    ----------
+    schema : dict
+        The root schema description
+    modulename : string
+        a valid Python module name.
+    root_name : string
+        The name of the root class (default: 'Root')
+    schemapi_import : string
+        The import path for schemapi (default: 'schemapi')
+    add_to_sys_modules : boolean
+        if True (default) then add the modulename to sys.modules to allow
+        accessing the module contents via standard import statements.
+    cache_dir : string or Path, optional
+        The cache directory. If not specified, default_cache_dir() is used.
+    include : list of strings, optional
+        If specified, only the classes reachable from these definitions are
+        generated (see SchemaModuleGenerator).
+
+    Returns
+    -------
+    module :
+        the dynamically-created module.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    if include is not None:
+        schema = prune_schema(schema, include)
+    code = _load_cached_code(schema, root_name, schemapi_import, cache_dir)
+    if code is None:
+        generator = SchemaModuleGenerator(schema, root_name=root_name,
+                                          schemapi_import=schemapi_import)
+        code = _write_cached_code(generator, cache_dir)
+    return _exec_module(code, modulename, add_to_sys_modules)
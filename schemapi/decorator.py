@@ -1,7 +1,52 @@
+import functools
 import warnings
 from . import codegen, SchemaBase, Undefined
 
 
+# The class is bound to a reserved name, so that it is not shadowed by
+# arguments named after schema properties (e.g. 'cls').
+_CLASS_NAME = '__class_'
+
+_init_factory_template = """
+def make_init({classname}):
+    def __init__({arglist}):
+        super({classname}, self).__init__({super_arglist})
+    return __init__
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _init_factory(args, super_args):
+    """Return a function which builds an __init__ function for a class
+
+    Factories are cached by argument signature, so that the code for classes
+    which share a signature is only compiled once.
+    """
+    names = {arg.lstrip('*').split('=')[0] for arg in args}
+    if _CLASS_NAME in names:
+        raise ValueError("Schema property name {!r} is reserved"
+                         "".format(_CLASS_NAME))
+    code = _init_factory_template.format(classname=_CLASS_NAME,
+                                         arglist=', '.join(args),
+                                         super_arglist=', '.join(super_args))
+    namespace = {'Undefined': Undefined}
+    exec(code, namespace)
+    return namespace['make_init']
+
+
+class _LazyDocstring(object):
+    """Descriptor which generates a class docstring on first access"""
+    def __init__(self, generator):
+        self._generator = generator
+        self._doc = None
+
+    def __get__(self, obj, cls=None):
+        if self._generator is not None:
+            self._doc = self._generator.docstring()
+            self._generator = None
+        return self._doc
+
+
 def schemaclass(*args, init_func=True, docstring=True, property_map=True):
     """A decorator to add boilerplate to a schema class
 
@@ -9,7 +54,7 @@ def schemaclass(*args, init_func=True, docstring=True, property_map=True):
     one or all of three attributes/methods, based on the schema:
 
     - An __init__ function
-    - a __doc__ docstring
+    - a __doc__ docstring, which is generated on first access
 
     In all cases, if the attribute/method is explicitly defined in the class
     it will not be overwritten.
@@ -36,14 +81,14 @@ def schemaclass(*args, init_func=True, docstring=True, property_map=True):
                                       rootschema=cls._rootschema)
 
         if init_func and '__init__' not in cls.__dict__:
-            init_code = gen.init_code()
-            globals_ = {name: cls, 'Undefined': Undefined}
-            locals_ = {}
-            exec(init_code, globals_, locals_)
-            setattr(cls, '__init__', locals_['__init__'])
+            args, super_args = gen.init_args()
+            __init__ = _init_factory(tuple(args), tuple(super_args))(cls)
+            __init__.__module__ = cls.__module__
+            __init__.__qualname__ = cls.__qualname__ + '.__init__'
+            setattr(cls, '__init__', __init__)
 
         if docstring and not cls.__doc__:
-            setattr(cls, '__doc__', gen.docstring())
+            setattr(cls, '__doc__', _LazyDocstring(gen))
         return cls
 
     if len(args) == 0:
@@ -0,0 +1,205 @@
+"""Structural digests of schema objects
+
+``digest(obj)`` returns a 16-byte BLAKE2 digest of the class and the content
+of a schema object. It is stable across processes, and objects which compare
+equal have equal digests: numbers are digested by value, so that ``1``,
+``1.0`` and ``True`` have the same digest, as they compare equal in Python.
+``SchemaBase.__hash__`` is based on the digest, and ``SchemaBase.__eq__``
+uses cached digests to tell unequal objects apart without comparing them.
+
+Digests are cached on schema objects which hold no lists, dicts or buffers
+(which may be modified in place without the object knowing). A cached digest
+is used as long as the object has not been modified and the digests of its
+children are unchanged. A schema object used as a dict key or set member must
+not be modified while it is used as such.
+
+>>> digest([1, 'a']) == digest([1.0, 'a'])
+True
+>>> digest([1]) == digest(['1'])
+False
+"""
+import hashlib
+import numbers
+import struct
+
+from . import buffers
+from . import schemapi as _schemapi
+
+
+class _Info(object):
+    """What a digest depends on, and what it tells about the value"""
+    __slots__ = ('memo', 'children', 'mutable', 'exact', 'opaque')
+
+    def __init__(self, memo):
+        # entries computed within this call, by id
+        self.memo = memo
+        # the (schema object, digest) pairs of the children
+        self.children = []
+        # True if the value holds lists, dicts or buffers
+        self.mutable = False
+        # True if values with equal digests have equal JSON representations
+        self.exact = True
+        # True if the value holds values which may compare equal to values
+        # with another digest
+        self.opaque = False
+
+
+def _update_int(h, value):
+    encoded = str(value).encode('ascii')
+    h.update(b'i' + struct.pack('<Q', len(encoded)))
+    h.update(encoded)
+
+
+def _update_float(h, value, info):
+    if value.is_integer():
+        # equal numbers have equal digests
+        info.exact = False
+        _update_int(h, int(value))
+    else:
+        h.update(b'f' + struct.pack('<d', value))
+
+
+def _update_dict(h, value, info):
+    items = [(key, val) for key, val in value.items()
+             if val is not _schemapi.Undefined]
+    h.update(b'd' + struct.pack('<Q', len(items)))
+    if all(type(key) is str for key, _ in items):
+        for key, val in sorted(items, key=lambda item: item[0]):
+            _update(h, key, info)
+            _update(h, val, info)
+    else:
+        # order the items by their digests
+        info.exact = False
+        pairs = []
+        for key, val in items:
+            pair = hashlib.blake2b(digest_size=16)
+            _update(pair, key, info)
+            _update(pair, val, info)
+            pairs.append(pair.digest())
+        for pair in sorted(pairs):
+            h.update(pair)
+
+
+def _update(h, value, info):
+    """Feed an encoding of a JSON-like value to h, in which values comparing
+    equal are encoded alike"""
+    if isinstance(value, _schemapi.SchemaBase):
+        entry = _entry(value, info.memo)
+        h.update(b'S')
+        h.update(entry[0])
+        info.children.append((value, entry[0]))
+        info.exact = info.exact and entry[1]
+        info.opaque = info.opaque or entry[2]
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8', 'surrogatepass')
+        h.update(b's' + struct.pack('<Q', len(encoded)))
+        h.update(encoded)
+    elif value is None:
+        h.update(b'n')
+    elif isinstance(value, bool):
+        info.exact = False
+        _update_int(h, int(value))
+    elif isinstance(value, numbers.Integral):
+        _update_int(h, int(value))
+    elif isinstance(value, float):
+        _update_float(h, value, info)
+    elif isinstance(value, dict):
+        info.mutable = True
+        _update_dict(h, value, info)
+    elif isinstance(value, (list, tuple)):
+        info.mutable = info.mutable or isinstance(value, list)
+        h.update(b'l' + struct.pack('<Q', len(value)))
+        for val in value:
+            _update(h, val, info)
+    elif buffers.is_buffer(value):
+        info.mutable = True
+        _update(h, buffers.tolist(value), info)
+    else:
+        # e.g. Decimal, or NumPy scalars equal to a float
+        try:
+            number = float(value)
+        except (TypeError, ValueError, OverflowError):
+            number = None
+        if number is not None and number == value:
+            _update_float(h, number, info)
+        else:
+            info.exact = False
+            info.opaque = True
+            _update(h, '{}:{!r}'.format(type(value).__name__, value), info)
+
+
+def _valid(obj, entry, memo):
+    """Return True if the digests of the children of a cached entry are
+    unchanged"""
+    return all(_entry(child, memo)[0] == value for child, value in entry[3])
+
+
+def _entry(obj, memo):
+    """Return the (digest, exact, opaque) entry of a schema object"""
+    key = id(obj)
+    if key in memo:
+        return memo[key]
+    entry = obj._digest
+    if entry is None or not _valid(obj, entry, memo):
+        info = _Info(memo)
+        h = hashlib.blake2b(digest_size=16)
+        cls = type(obj)
+        _update(h, '{}.{}'.format(cls.__module__, cls.__qualname__), info)
+        if obj._args and not obj._kwds:
+            h.update(b'a')
+            _update(h, obj._args[0], info)
+        else:
+            h.update(b'k')
+            _update_dict(h, obj._kwds, info)
+        entry = (h.digest(), info.exact, info.opaque, info.children)
+        object.__setattr__(obj, '_digest', None if info.mutable else entry)
+    memo[key] = entry
+    return entry
+
+
+def digest_entry(obj):
+    """Return the (digest, exact, opaque) of a schema object, reusing cached
+    digests (see cached())"""
+    return _entry(obj, {})[:3]
+
+
+def cached_digest(obj):
+    """Return the digest of a schema object, reusing cached digests"""
+    return _entry(obj, {})[0]
+
+
+def cached(obj):
+    """Return the cached (digest, exact, opaque) of a schema object, or None
+
+    Nothing is computed: None is returned unless the digests of obj and of
+    all its children are cached. If exact is True, objects with equal
+    digests have equal JSON representations. If opaque is True, objects
+    with other digests may compare equal to obj.
+    """
+    entry = obj._digest
+    if entry is None:
+        return None
+    for child, value in entry[3]:
+        child_entry = cached(child)
+        if child_entry is None or child_entry[0] != value:
+            return None
+    return entry[:3]
+
+
+def digest(value):
+    """Return the structural digest of a schema object or JSON-like value"""
+    if isinstance(value, _schemapi.SchemaBase):
+        return cached_digest(value)
+    h = hashlib.blake2b(digest_size=16)
+    _update(h, value, _Info({}))
+    return h.digest()
+
+
+def is_cached(obj):
+    """Return True if obj has a valid cached digest"""
+    return cached(obj) is not None
+
+
+def invalidate(obj):
+    """Discard the cached digest of obj, which is about to be modified"""
+    object.__setattr__(obj, '_digest', None)
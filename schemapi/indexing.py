@@ -0,0 +1,167 @@
+"""Indexes of the schema objects within a tree, by class and JSON path
+
+A ``TypeIndex`` records every schema object within a tree under its class and
+its JSON path (the tuple of property names and list indices leading to it in
+the output of ``to_dict``), so that repeated queries (e.g. for all the
+encodings of a large spec) do not walk the whole tree. An index is built by
+``SchemaBase.from_dict(..., index=True)`` or by ``TypeIndex(root)``, and is
+updated in place when properties of the objects in the tree are assigned:
+
+>>> from schemapi import indexing
+>>> from schemapi.schemapi import SchemaBase
+>>> class Node(SchemaBase):
+...     _schema = {'type': 'object'}
+>>> b = Node(name='b')
+>>> root = Node(children=[Node(name='a'), b])
+>>> index = indexing.TypeIndex(root)
+>>> [path for path, node in index.items(Node)]
+[(), ('children', 0), ('children', 1)]
+>>> b.child = Node(name='c')
+>>> index.at(('children', 1, 'child'))
+[Node({
+  name: 'c'
+})]
+
+Lists and dicts read from objects in the tree may be modified in place, so
+reading one (as in ``root.children[1].child = ...``) marks the index as
+stale, and the next query rebuilds it from scratch. So does applying a JSON
+patch. Trees of interned objects (see ``schemapi.interning``) cannot be
+indexed.
+"""
+import collections
+
+from . import schemapi as _schemapi
+
+
+class TypeIndex(object):
+    """An index of the schema objects within a tree
+
+    Parameters
+    ----------
+    root : SchemaBase
+        The root of the tree. Objects belong to at most one index at a time:
+        indexing a tree moves its objects from any previous index, which is
+        then marked as stale.
+    """
+    def __init__(self, root):
+        if root._canonical is not None or root._interned:
+            raise ValueError("Cannot index a tree of interned objects")
+        self.root = root
+        self._stale = True
+        self._refresh()
+
+    def __len__(self):
+        self._refresh()
+        return sum(len(nodes) for nodes in self._by_path.values())
+
+    def invalidate(self):
+        """Mark the index as stale, so that the next query rebuilds it"""
+        self._stale = True
+
+    def _refresh(self):
+        if not self._stale:
+            return
+        self._by_path = {}
+        self._by_class = collections.defaultdict(dict)
+        # ids of objects occurring at several paths within the tree
+        self._aliased = set()
+        self._stale = False
+        self._add(self.root, ())
+
+    def _contains(self, obj):
+        """Return True if obj is indexed at its own path"""
+        return any(node is obj for node in self._by_path.get(obj._path, ()))
+
+    def _add(self, value, path):
+        if isinstance(value, _schemapi.SchemaBase):
+            if value._index is self and self._contains(value):
+                self._aliased.add(id(value))
+            else:
+                if value._index is not None and value._index is not self:
+                    # the previous index no longer receives updates
+                    value._index.invalidate()
+                object.__setattr__(value, '_index', self)
+                object.__setattr__(value, '_path', path)
+            self._by_path.setdefault(path, []).append(value)
+            self._by_class[type(value)][path, id(value)] = value
+            if value._args and not value._kwds:
+                self._add(value._args[0], path)
+            else:
+                for key, val in value._kwds.items():
+                    self._add(val, path + (key,))
+        elif isinstance(value, (list, tuple)):
+            for i, val in enumerate(value):
+                self._add(val, path + (i,))
+        elif isinstance(value, dict):
+            for key, val in value.items():
+                self._add(val, path + (key,))
+
+    def _remove(self, value, path):
+        if isinstance(value, _schemapi.SchemaBase):
+            nodes = self._by_path.get(path, [])
+            for i, node in enumerate(nodes):
+                if node is value:
+                    break
+            else:
+                return
+            del nodes[i]
+            if not nodes:
+                del self._by_path[path]
+            del self._by_class[type(value)][path, id(value)]
+            if value._args and not value._kwds:
+                self._remove(value._args[0], path)
+            else:
+                for key, val in value._kwds.items():
+                    self._remove(val, path + (key,))
+        elif isinstance(value, (list, tuple)):
+            for i, val in enumerate(value):
+                self._remove(val, path + (i,))
+        elif isinstance(value, dict):
+            for key, val in value.items():
+                self._remove(val, path + (key,))
+
+    def _replace(self, obj, key, old, new):
+        """Update the index when a property of obj is replaced"""
+        if self._stale or not self._contains(obj):
+            # obj has been removed from the tree
+            return
+        if id(obj) in self._aliased:
+            self._stale = True
+            return
+        path = obj._path + (key,)
+        self._remove(old, path)
+        self._add(new, path)
+
+    def items(self, cls=None, subclasses=True):
+        """Return the (path, object) pairs of the instances of cls
+
+        If cls is None, all objects are returned. If subclasses is False, only
+        instances of cls itself are returned.
+        """
+        self._refresh()
+        if cls is None:
+            cls = _schemapi.SchemaBase
+        if subclasses:
+            classes = [c for c in self._by_class if issubclass(c, cls)]
+        else:
+            classes = [cls]
+        return [(path, node) for c in classes
+                for (path, _), node in self._by_class.get(c, {}).items()]
+
+    def find(self, cls, subclasses=True):
+        """Return the instances of cls within the tree"""
+        return [node for _, node in self.items(cls, subclasses)]
+
+    def at(self, path):
+        """Return the objects at a JSON path, outermost first"""
+        self._refresh()
+        return list(self._by_path.get(tuple(path), ()))
+
+
+def index_of(obj):
+    """Return the up-to-date TypeIndex whose tree contains obj, or None"""
+    index = obj._index
+    if index is None:
+        return None
+    index._refresh()
+    return index if index._contains(obj) else None
@@ -0,0 +1,213 @@
+"""Opt-in instrumentation of SchemaBase hot paths
+
+When instrumentation is enabled, calls to ``SchemaBase.validate``,
+``to_dict``, ``to_json``, ``from_dict``, ``copy`` and the constructor lookup
+within ``from_dict`` are counted and timed per wrapper class. When it is
+disabled (the default), the only overhead is one extra function call.
+
+Times are inclusive: the time of a ``to_dict`` call includes the time of the
+``to_dict`` calls of its children, and of its validation.
+
+>>> from schemapi import instrumentation
+>>> with instrumentation.instrument() as stats:
+...     pass  # build, serialize and validate some objects here
+>>> print(stats.report())  # doctest: +SKIP
+"""
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+
+# The Stats object calls are recorded in, or None if instrumentation is
+# disabled. Use enable_instrumentation()/disable_instrumentation() or the
+# instrument() context manager rather than setting this directly.
+_STATS = None
+
+
+class CallStats(object):
+    """Counters for a single (class, operation) pair
+
+    Attributes
+    ----------
+    calls : int
+        the number of calls
+    time : float
+        the cumulative time of the calls in seconds
+    nbytes : int
+        the cumulative number of bytes produced by the calls, for operations
+        which serialize (e.g. to_json)
+    """
+    __slots__ = ('calls', 'time', 'nbytes')
+
+    def __init__(self, calls=0, time=0.0, nbytes=0):
+        self.calls = calls
+        self.time = time
+        self.nbytes = nbytes
+
+    def __repr__(self):
+        return "CallStats(calls={}, time={!r}, nbytes={})".format(
+            self.calls, self.time, self.nbytes)
+
+    def __eq__(self, other):
+        return (isinstance(other, CallStats)
+                and (self.calls, self.time, self.nbytes)
+                == (other.calls, other.time, other.nbytes))
+
+    def add(self, other):
+        self.calls += other.calls
+        self.time += other.time
+        self.nbytes += other.nbytes
+
+
+def _classname(cls):
+    """Return a readable name for a class or constructor function"""
+    module = getattr(cls, '__module__', None)
+    name = getattr(cls, '__qualname__', None) or repr(cls)
+    return '{}.{}'.format(module, name) if module else name
+
+
+class Stats(object):
+    """Call counts, cumulative times and bytes produced per class
+
+    Entries are keyed by ``(cls, operation)``, where cls is the wrapper class
+    and operation is the name of the instrumented method. Calls may be
+    recorded by several threads.
+    """
+    def __init__(self):
+        self._data = collections.defaultdict(CallStats)
+        self._lock = threading.Lock()
+
+    def record(self, cls, operation, elapsed, nbytes=0):
+        with self._lock:
+            entry = self._data[cls, operation]
+            entry.calls += 1
+            entry.time += elapsed
+            entry.nbytes += nbytes
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+    def __getitem__(self, key):
+        return self._data.get(key, CallStats())
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._data))
+
+    def items(self):
+        """Return a list of the (cls, operation), CallStats pairs"""
+        with self._lock:
+            return list(self._data.items())
+
+    def by_class(self):
+        """Return a dict mapping each class to its totals over operations"""
+        totals = collections.defaultdict(CallStats)
+        for (cls, operation), entry in self.items():
+            totals[cls].add(entry)
+        return dict(totals)
+
+    def by_operation(self):
+        """Return a dict mapping each operation to its totals over classes"""
+        totals = collections.defaultdict(CallStats)
+        for (cls, operation), entry in self.items():
+            totals[operation].add(entry)
+        return dict(totals)
+
+    def top(self, n=10, key='time'):
+        """Return the n (cls, operation), CallStats pairs with largest key"""
+        return sorted(self.items(),
+                      key=lambda item: getattr(item[1], key),
+                      reverse=True)[:n]
+
+    def report(self, n=20, key='time'):
+        """Return a table of the n entries with largest key as a string"""
+        lines = ['{:<50} {:<16} {:>8} {:>12} {:>12}'.format(
+            'class', 'operation', 'calls', 'time (ms)', 'bytes')]
+        for (cls, operation), entry in self.top(n, key=key):
+            lines.append('{:<50} {:<16} {:>8} {:>12.3f} {:>12}'.format(
+                _classname(cls), operation, entry.calls,
+                1000 * entry.time, entry.nbytes))
+        return '\n'.join(lines)
+
+
+def enable_instrumentation(stats=None):
+    """Enable instrumentation, recording into stats (default: a new Stats)"""
+    global _STATS
+    _STATS = Stats() if stats is None else stats
+    return _STATS
+
+
+def disable_instrumentation():
+    """Disable instrumentation, returning the Stats recorded so far"""
+    global _STATS
+    stats, _STATS = _STATS, None
+    return stats
+
+
+def get_stats():
+    """Return the active Stats object, or None if instrumentation is disabled"""
+    return _STATS
+
+
+@contextlib.contextmanager
+def instrument(stats=None):
+    """Context manager which enables instrumentation within its block
+
+    Yields the Stats object in which calls are recorded. The previous
+    instrumentation state is restored on exit.
+    """
+    global _STATS
+    original = _STATS
+    _STATS = Stats() if stats is None else stats
+    try:
+        yield _STATS
+    finally:
+        _STATS = original
+
+
+def _default_owner(args, result):
+    obj = args[0]
+    return obj if isinstance(obj, type) else type(obj)
+
+
+def instrumented(operation, owner=_default_owner, nbytes=None):
+    """Decorator recording calls of a method while instrumentation is enabled
+
+    Parameters
+    ----------
+    operation : string
+        The name under which calls are recorded
+    owner : callable, optional
+        ``owner(args, result)`` returns the class calls are recorded for. By
+        default this is the class of the first argument (or the first
+        argument itself, for classmethods). result is None if the call raised
+        an exception.
+    nbytes : callable, optional
+        ``nbytes(result)`` returns the number of bytes produced by the call.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = _STATS
+            if stats is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                # failed calls (e.g. rejected validation) are timed as well
+                stats.record(owner(args, None), operation,
+                             time.perf_counter() - start)
+                raise
+            elapsed = time.perf_counter() - start
+            stats.record(owner(args, result), operation, elapsed,
+                         nbytes(result) if nbytes is not None else 0)
+            return result
+        return wrapper
+    return decorator
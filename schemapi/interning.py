@@ -0,0 +1,244 @@
+"""Opt-in hash-consing of schema objects
+
+While interning is enabled, every schema object constructed (including by
+``from_dict`` and ``copy``) shares its state with a canonical instance for
+its structure: structurally equal objects, and structurally equal subtrees of
+different objects, are stored once. Canonical instances are never handed out.
+The objects returned to the caller borrow their state, and take a private
+copy of it when they are first modified (copy-on-write), so that mutating one
+object never affects another. Reading a property holding a schema object
+returns an object borrowing the child's state, which takes a private copy of
+its parent's state only once it is modified itself. Reading a property holding
+a list or dict, which the caller may modify in place, takes a private copy
+right away. The shared state cannot be modified directly: its dicts and lists
+raise ValueError on modification.
+
+Interned objects have value semantics: ``Parent(child=c).child`` is equal to
+``c`` but is not ``c`` itself, and later changes to ``c`` are not reflected in
+the parent.
+
+>>> from schemapi import interning
+>>> with interning.interning() as table:
+...     pass  # construct schema objects here
+>>> len(table), table.hits, table.misses
+(0, 0, 0)
+"""
+import contextlib
+import weakref
+
+from . import buffers
+from . import schemapi as _schemapi
+
+
+# The active InternTable, or None if interning is disabled.
+_TABLE = None
+
+
+def _read_only(*args, **kwargs):
+    raise ValueError("Cannot modify the shared state of interned schema "
+                     "objects")
+
+
+class _FrozenDict(dict):
+    """A dict of the shared state of interned objects, which cannot be
+    modified"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class _FrozenList(list):
+    """A list of the shared state of interned objects, which cannot be
+    modified"""
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = remove = pop = clear = _read_only
+    sort = reverse = _read_only
+
+
+class InternTable(object):
+    """A table of canonical schema objects, keyed by structure
+
+    Entries are held weakly: a canonical object is discarded once no object
+    borrows its state.
+
+    Attributes
+    ----------
+    hits : int
+        the number of objects interned to an existing canonical object
+    misses : int
+        the number of canonical objects created
+    """
+    def __init__(self):
+        self._entries = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, value):
+        """Return the structural key of a canonical value"""
+        if isinstance(value, _schemapi.SchemaBase):
+            return ('obj', id(value))
+        elif isinstance(value, dict):
+            return ('dict', frozenset((self._key(key), self._key(val))
+                                      for key, val in value.items()))
+        elif isinstance(value, list):
+            return ('list', tuple(self._key(val) for val in value))
+        elif isinstance(value, tuple):
+            return ('tuple', tuple(self._key(val) for val in value))
+        elif isinstance(value, float):
+            # distinguishes -0.0 from 0.0, and makes nan equal to itself
+            return (float, value.hex())
+        elif buffers.is_buffer(value):
+            return ('id', id(value))
+        try:
+            hash(value)
+        except TypeError:
+            return ('id', id(value))
+        return (type(value), value)
+
+    def _canonical_value(self, value):
+        if isinstance(value, _schemapi.SchemaBase):
+            return self.canonical(value)
+        elif isinstance(value, dict):
+            return _FrozenDict((key, self._canonical_value(val))
+                               for key, val in value.items())
+        elif isinstance(value, list):
+            return _FrozenList(self._canonical_value(val) for val in value)
+        elif isinstance(value, tuple):
+            return tuple(self._canonical_value(val) for val in value)
+        return value
+
+    def canonical(self, obj):
+        """Return the canonical object for the current state of obj"""
+        if obj._interned:
+            return obj
+        if obj._canonical is not None:
+            return obj._canonical
+        args = self._canonical_value(obj._args)
+        kwds = self._canonical_value(obj._kwds)
+        key = (type(obj), self._key(args), self._key(kwds))
+        canonical = self._entries.get(key)
+        if canonical is not None:
+            self.hits += 1
+            return canonical
+        self.misses += 1
+        canonical = object.__new__(type(obj))
+        object.__setattr__(canonical, '_args', args)
+        object.__setattr__(canonical, '_kwds', kwds)
+        object.__setattr__(canonical, '_interned', True)
+        self._entries[key] = canonical
+        return canonical
+
+    def intern(self, obj):
+        """Make obj borrow the state of its canonical object"""
+        _borrow(obj, self.canonical(obj))
+
+
+def _borrow(obj, canonical):
+    object.__setattr__(obj, '_args', canonical._args)
+    object.__setattr__(obj, '_kwds', canonical._kwds)
+    object.__setattr__(obj, '_canonical', canonical)
+
+
+def shell(canonical):
+    """Return a new object borrowing the state of a canonical object"""
+    obj = object.__new__(type(canonical))
+    _borrow(obj, canonical)
+    return obj
+
+
+def child(obj, key):
+    """Return the schema object in property key of obj, which borrows its
+    state, without unsharing obj
+
+    The child borrows the state of the canonical child. It is handed out
+    again by later reads, and put in place in obj when either is unshared.
+    """
+    shells = obj._shells
+    if shells is None:
+        shells = {}
+        object.__setattr__(obj, '_shells', shells)
+    value = shells.get(key)
+    if value is None:
+        value = shells[key] = shell(obj._canonical._kwds[key])
+        object.__setattr__(value, '_owner', (obj, key))
+    return value
+
+
+def _private(value):
+    """Copy a canonical value down to the next schema objects"""
+    if isinstance(value, _schemapi.SchemaBase):
+        return shell(value) if value._interned else value
+    elif isinstance(value, dict):
+        return {key: _private(val) for key, val in value.items()}
+    elif isinstance(value, list):
+        return [_private(val) for val in value]
+    elif isinstance(value, tuple):
+        return tuple(_private(val) for val in value)
+    return value
+
+
+def unshare(obj):
+    """Give obj a private copy of the state it borrows (copy-on-write)
+
+    The children of obj which are schema objects are replaced by new objects
+    borrowing their state (or by those handed out by child()), so that this
+    is cheap for deep trees. If obj was handed out by child(), its parent is
+    unshared first, so that obj is put in place in the parent.
+    """
+    canonical = obj._canonical
+    if canonical is None:
+        return
+    owner = obj._owner
+    if owner is not None:
+        object.__setattr__(obj, '_owner', None)
+        unshare(owner[0])
+    kwds = _private(canonical._kwds)
+    if obj._shells is not None:
+        for key, value in obj._shells.items():
+            kwds[key] = value
+            object.__setattr__(value, '_owner', None)
+        object.__setattr__(obj, '_shells', None)
+    object.__setattr__(obj, '_args', _private(canonical._args))
+    object.__setattr__(obj, '_kwds', kwds)
+    object.__setattr__(obj, '_canonical', None)
+    # the cached digest depends on the children it replaces
+    object.__setattr__(obj, '_digest', None)
+
+
+def enable_interning(table=None):
+    """Enable interning into table (default: a new InternTable)"""
+    global _TABLE
+    _TABLE = InternTable() if table is None else table
+    return _TABLE
+
+
+def disable_interning():
+    """Disable interning, returning the InternTable used so far"""
+    global _TABLE
+    table, _TABLE = _TABLE, None
+    return table
+
+
+def get_intern_table():
+    """Return the active InternTable, or None if interning is disabled"""
+    return _TABLE
+
+
+@contextlib.contextmanager
+def interning(table=None):
+    """Context manager which enables interning within its block
+
+    Yields the InternTable in which objects are interned. The previous
+    interning state is restored on exit.
+    """
+    global _TABLE
+    original = _TABLE
+    _TABLE = InternTable() if table is None else table
+    try:
+        yield _TABLE
+    finally:
+        _TABLE = original
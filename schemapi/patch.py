@@ -0,0 +1,323 @@
+"""Structural diffs of schema objects as JSON Patch (RFC 6902)
+
+``diff(old, new)`` compares two trees of schema objects, dicts and lists,
+and returns the list of JSON Patch operations transforming the JSON
+representation of ``old`` into that of ``new``. Subtrees which are identical
+objects, or schema objects with equal cached digests which determine their
+JSON (see ``schemapi.hashing``), are skipped without being traversed.
+``apply_patch(obj, patch)`` applies such a patch to a tree of schema objects
+in place.
+
+>>> diff({'a': 1, 'b': [1, 2]}, {'a': 1, 'b': [1, 3], 'c': 'x'})
+[{'op': 'replace', 'path': '/b/1', 'value': 3}, {'op': 'add', 'path': '/c', 'value': 'x'}]
+"""
+import copy
+
+from . import buffers
+from . import hashing
+from . import interning
+from .profiling import _escape
+from .schemapi import SchemaBase, Undefined, _FromDict
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def _split(pointer):
+    """Split a JSON pointer into unescaped tokens"""
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError("Invalid JSON pointer {!r}".format(pointer))
+    return [_unescape(token) for token in pointer[1:].split('/')]
+
+
+def _content(obj):
+    """Return the dict, list or scalar represented by obj, without copying"""
+    if isinstance(obj, SchemaBase):
+        if obj._args and not obj._kwds:
+            return _content(obj._args[0])
+        return {key: val for key, val in obj._kwds.items()
+                if val is not Undefined}
+    elif isinstance(obj, tuple):
+        return list(obj)
+    elif buffers.is_buffer(obj):
+        return buffers.tolist(obj)
+    return obj
+
+
+def _todict(obj):
+    """Return the JSON representation of obj"""
+    if isinstance(obj, SchemaBase):
+        return obj.to_dict(validate=False)
+    obj = _content(obj)
+    if isinstance(obj, dict):
+        return {key: _todict(val) for key, val in obj.items()
+                if val is not Undefined}
+    elif isinstance(obj, list):
+        return [_todict(val) for val in obj]
+    return obj
+
+
+def diff(old, new):
+    """Return a JSON Patch transforming the JSON of old into that of new
+
+    Parameters
+    ----------
+    old, new : SchemaBase, dict, list or scalar
+        The trees to compare
+
+    Returns
+    -------
+    patch : list of dicts
+        The JSON Patch operations. Values are JSON representations.
+    """
+    patch = []
+
+    def _diff(old, new, path):
+        if old is new:
+            return
+        if isinstance(old, SchemaBase) and type(old) is type(new):
+            digests = hashing.cached(old), hashing.cached(new)
+            if (None not in digests and digests[0][1] and digests[1][1]
+                    and digests[0][0] == digests[1][0]):
+                return
+        old, new = _content(old), _content(new)
+        if old is new:
+            return
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key, val in old.items():
+                if key not in new:
+                    patch.append({'op': 'remove',
+                                  'path': path + '/' + _escape(key)})
+                else:
+                    _diff(val, new[key], path + '/' + _escape(key))
+            for key, val in new.items():
+                if key not in old:
+                    patch.append({'op': 'add',
+                                  'path': path + '/' + _escape(key),
+                                  'value': _todict(val)})
+        elif isinstance(old, list) and isinstance(new, list):
+            common = min(len(old), len(new))
+            for i in range(common):
+                _diff(old[i], new[i], '{}/{}'.format(path, i))
+            for i in range(len(old) - 1, common - 1, -1):
+                patch.append({'op': 'remove', 'path': '{}/{}'.format(path, i)})
+            for i in range(common, len(new)):
+                patch.append({'op': 'add', 'path': '{}/{}'.format(path, i),
+                              'value': _todict(new[i])})
+        elif type(old) is not type(new) or old != new:
+            patch.append({'op': 'replace', 'path': path,
+                          'value': _todict(new)})
+
+    _diff(old, new, '')
+    return patch
+
+
+def _wrap(parent, key, value):
+    """Wrap a JSON value assigned to a property of a schema object"""
+    cls = type(parent)
+    schema = cls.resolve_references(cls._schema)
+    props = schema.get('properties', {})
+    if key not in props:
+        return value
+    converter = _FromDict(cls._default_wrapper_classes())
+    constructor, prop_schema = converter._get_constructor(cls, props[key])
+    return converter.from_dict(constructor, cls, prop_schema, value)
+
+
+class _Location(object):
+    """The parent container of a JSON pointer and the key within it
+
+    Locating a pointer does not modify the tree: the objects on the path are
+    only prepared for modification by add() and remove().
+    """
+    def __init__(self, root, pointer):
+        tokens = _split(pointer)
+        if not tokens:
+            raise ValueError("Operation not supported on the root object")
+        self.root = root
+        self.tokens = tokens
+        self.token = tokens[-1]
+        self.pointer = pointer
+        self.parent = self._walk()[0]
+
+    def _walk(self, write=False):
+        """Return the parent of the pointer and the nearest schema object
+        holding it (the parent itself, if it is one)
+
+        If write is True, the schema objects on the path hand out children
+        which may be modified (see _child()).
+        """
+        parent = owner = self.root
+        for token in self.tokens[:-1]:
+            parent = self._child(parent, token, write)
+            if isinstance(parent, SchemaBase):
+                owner = parent
+        return parent, owner
+
+    @staticmethod
+    def _container(obj):
+        """Return the dict or list holding the children of obj"""
+        if isinstance(obj, SchemaBase):
+            if obj._args and not obj._kwds:
+                return _Location._container(obj._args[0])
+            return obj._kwds
+        return obj
+
+    @classmethod
+    def _child(cls, obj, token, write=False):
+        """Return the child of obj under token
+
+        If write is True, schema objects borrowing their state (see
+        ``schemapi.interning``) hand out children which are put in place
+        when they are modified, and are unshared if the child is a list or
+        dict.
+        """
+        container = cls._container(obj)
+        if isinstance(container, list):
+            key = cls._index(container, token)
+        elif isinstance(container, dict):
+            if container.get(token, Undefined) is Undefined:
+                raise KeyError(token)
+            key = token
+        else:
+            raise ValueError("Cannot index {!r} with {!r}".format(obj, token))
+        if write and isinstance(obj, SchemaBase):
+            if container is obj._kwds:
+                return obj._get(key)
+            interning.unshare(obj)
+            container = cls._container(obj)
+        return container[key]
+
+    @staticmethod
+    def _index(container, token, insert=False):
+        if insert and token == '-':
+            return len(container)
+        if not token.isdigit() or (token != '0' and token.startswith('0')):
+            raise ValueError("Invalid array index {!r}".format(token))
+        index = int(token)
+        if index > len(container) or (index == len(container) and not insert):
+            raise IndexError(index)
+        return index
+
+    def _target(self):
+        """Prepare the parent for modification, and return its container"""
+        parent, owner = self._walk(write=True)
+        if isinstance(owner, SchemaBase):
+            owner._prepare_mutation()
+            if owner._index is not None:
+                owner._index.invalidate()
+        self.parent = parent
+        return self._container(parent)
+
+    def get(self):
+        return self._child(self.parent, self.token)
+
+    def add(self, value):
+        container = self._target()
+        if isinstance(container, list):
+            container.insert(self._index(container, self.token, insert=True),
+                             value)
+        elif container is getattr(self.parent, '_kwds', None):
+            container[self.token] = _wrap(self.parent, self.token, value)
+        elif isinstance(container, dict):
+            container[self.token] = value
+        else:
+            raise ValueError("Cannot add to {!r}".format(self.parent))
+
+    def remove(self):
+        container = self._target()
+        value = self.get()
+        if isinstance(container, list):
+            del container[self._index(container, self.token)]
+        elif container is getattr(self.parent, '_kwds', None):
+            # generated classes keep unset properties as Undefined
+            container[self.token] = Undefined
+        else:
+            del container[self.token]
+        return value
+
+    def replace(self, value):
+        self.remove()
+        self.add(value)
+
+
+def _get(obj, pointer):
+    if pointer == '':
+        return obj
+    return _Location(obj, pointer).get()
+
+
+def _add(obj, pointer, value):
+    if pointer == '':
+        # adding the root replaces the whole document
+        _replace_root(obj, _todict(value))
+    else:
+        _Location(obj, pointer).add(value)
+
+
+def _replace_root(obj, value):
+    """Replace the contents of a schema object in place"""
+    new = type(obj).from_dict(value, validate=False)
+    # puts obj in place in its parent, if it was handed out by one
+    obj._prepare_mutation()
+    object.__setattr__(obj, '_args', new._args)
+    object.__setattr__(obj, '_kwds', new._kwds)
+    object.__setattr__(obj, '_canonical', new._canonical)
+    if obj._index is not None:
+        obj._index.invalidate()
+
+
+def apply_patch(obj, patch):
+    """Apply a JSON Patch to a tree of schema objects in place
+
+    Values added to properties of schema objects are wrapped as from_dict()
+    would wrap them; values added within plain dicts and lists are stored as
+    is. Operations are applied in order: if one fails, the previous ones
+    remain applied.
+
+    Parameters
+    ----------
+    obj : SchemaBase
+        The root of the tree to modify
+    patch : list of dicts
+        The JSON Patch operations
+
+    Raises
+    ------
+    ValueError :
+        if an operation is invalid or a ``test`` operation fails
+    KeyError, IndexError :
+        if a path does not exist
+    """
+    for operation in patch:
+        op = operation.get('op')
+        if op in ('add', 'replace', 'test'):
+            value = copy.deepcopy(operation['value'])
+        if op == 'add':
+            _add(obj, operation['path'], value)
+        elif op == 'remove':
+            _Location(obj, operation['path']).remove()
+        elif op == 'replace' and operation['path'] == '':
+            _add(obj, '', value)
+        elif op == 'replace':
+            _Location(obj, operation['path']).replace(value)
+        elif op == 'move':
+            if (operation['path'] + '/').startswith(operation['from'] + '/'):
+                raise ValueError("Cannot move {from} into itself"
+                                 "".format(**operation))
+            value = _Location(obj, operation['from']).remove()
+            _add(obj, operation['path'], value)
+        elif op == 'copy':
+            value = copy.deepcopy(_todict(_get(obj, operation['from'])))
+            _add(obj, operation['path'], value)
+        elif op == 'test':
+            actual = _todict(_get(obj, operation['path']))
+            if actual != value:
+                raise ValueError("Test of {} failed: {!r} != {!r}"
+                                 "".format(operation['path'], actual, value))
+        else:
+            raise ValueError("Unknown JSON Patch operation {!r}".format(op))
+    return obj
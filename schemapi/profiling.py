@@ -0,0 +1,298 @@
+"""Profiling of schema validation by schema path
+
+While a profile is active, ``SchemaBase.validate`` runs jsonschema with
+instrumented keyword callbacks, and the time spent in each keyword is
+attributed to the JSON pointer of the subschema it belongs to (e.g.
+``#/definitions/Encoding/properties/x``). ``anyOf``/``oneOf`` alternatives
+tried by ``SchemaBase.from_dict`` are recorded as well, along with whether they
+were rejected.
+
+>>> from schemapi import profiling
+>>> with profiling.profile_validation() as profile:
+...     pass  # validate or construct some objects here
+>>> print(profile.report(n=10))  # doctest: +SKIP
+"""
+import collections
+import contextlib
+import threading
+import time
+
+import jsonschema
+
+from . import buffers
+
+
+# The active ValidationProfile, or None if profiling is disabled.
+_PROFILE = None
+
+
+def _escape(token):
+    """Escape a JSON pointer token (RFC 6901)"""
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def schema_pointers(schema, base='#'):
+    """Return a dict mapping id() of each subschema to its JSON pointer"""
+    pointers = {}
+
+    def _walk(obj, pointer):
+        if isinstance(obj, dict):
+            pointers.setdefault(id(obj), pointer)
+            for key, val in obj.items():
+                _walk(val, pointer + '/' + _escape(key))
+        elif isinstance(obj, list):
+            for i, val in enumerate(obj):
+                _walk(val, pointer + '/' + _escape(i))
+
+    _walk(schema, base)
+    return pointers
+
+
+class KeywordStats(object):
+    """Counters for one keyword of one subschema
+
+    Attributes
+    ----------
+    calls : int
+        the number of times the keyword was evaluated
+    failures : int
+        the number of evaluations which produced errors
+    time : float
+        the cumulative time of the evaluations in seconds, including
+        subschemas evaluated by the keyword
+    self_time : float
+        the cumulative time excluding subschemas evaluated by the keyword
+    """
+    __slots__ = ('calls', 'failures', 'time', 'self_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.time = 0.0
+        self.self_time = 0.0
+
+    def __repr__(self):
+        return ("KeywordStats(calls={}, failures={}, time={!r}, self_time={!r})"
+                "".format(self.calls, self.failures, self.time, self.self_time))
+
+
+class BranchStats(object):
+    """Counters for one anyOf/oneOf alternative tried within from_dict
+
+    Attributes
+    ----------
+    tried : int
+        the number of times the alternative was validated
+    rejected : int
+        the number of times the instance was invalid under the alternative
+    time : float
+        the cumulative validation time in seconds
+    """
+    __slots__ = ('tried', 'rejected', 'time')
+
+    def __init__(self):
+        self.tried = 0
+        self.rejected = 0
+        self.time = 0.0
+
+    def __repr__(self):
+        return "BranchStats(tried={}, rejected={}, time={!r})".format(
+            self.tried, self.rejected, self.time)
+
+
+class ValidationProfile(object):
+    """Time and visit counts of validation, aggregated by schema pointer
+
+    Attributes
+    ----------
+    keywords : dict
+        maps (pointer, keyword) to KeywordStats
+    branches : dict
+        maps (root class name, pointer) to BranchStats for the anyOf/oneOf
+        alternatives tried by from_dict
+
+    A profile may be active while several threads validate.
+    """
+    def __init__(self):
+        self.keywords = collections.defaultdict(KeywordStats)
+        self.branches = collections.defaultdict(BranchStats)
+        self._pointers = {}
+        # schemas whose pointers are registered, kept alive so that the ids
+        # of their subschemas cannot be reused
+        self._schemas = []
+        self._validator_classes = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _stack(self):
+        """The child time accumulated by each active keyword call of the
+        current thread"""
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def reset(self):
+        with self._lock:
+            self.keywords.clear()
+            self.branches.clear()
+
+    def _pointer(self, schema, owner=None):
+        pointer = self._pointers.get(id(schema))
+        if pointer is not None:
+            return pointer
+        if isinstance(schema, dict) and list(schema) == ['$ref']:
+            return schema['$ref']
+        return '<{}>'.format(getattr(owner, '__name__', 'schema'))
+
+    def _register(self, schema, base):
+        """Record the pointers of all subschemas of schema"""
+        pointers = schema_pointers(schema, base)
+        with self._lock:
+            self._schemas.append(schema)
+            for key, pointer in pointers.items():
+                self._pointers.setdefault(key, pointer)
+
+    def _validator_class(self, schema):
+        base = buffers.validator_for(schema)
+        with self._lock:
+            cls = self._validator_classes.get(base)
+            if cls is None:
+                wrapped = {keyword: self._wrap(keyword, func)
+                           for keyword, func in base.VALIDATORS.items()}
+                cls = jsonschema.validators.extend(base, wrapped)
+                self._validator_classes[base] = cls
+        return cls
+
+    def _wrap(self, keyword, func):
+        def wrapper(validator, value, instance, schema):
+            stack = self._stack
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                # errors are materialized so that the time spent producing
+                # them is attributed to this keyword.
+                errors = list(func(validator, value, instance, schema) or ())
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+            pointer = self._pointer(schema)
+            with self._lock:
+                stats = self.keywords[pointer, keyword]
+                stats.calls += 1
+                stats.failures += bool(errors)
+                stats.time += elapsed
+                stats.self_time += elapsed - child_time
+            return errors
+        return wrapper
+
+    def _validator(self, schema, rootschema, owner=None):
+        if id(rootschema) not in self._pointers:
+            self._register(rootschema, '#')
+        if id(schema) not in self._pointers and schema is not rootschema:
+            self._register(schema, '<{}>'.format(getattr(owner, '__name__',
+                                                         'schema')))
+        cls = self._validator_class(schema)
+        resolver = jsonschema.RefResolver.from_schema(rootschema)
+        return cls(schema, resolver=resolver)
+
+    def validate(self, instance, schema, rootschema, owner=None):
+        """Validate instance against schema, recording the profile
+
+        This behaves like ``jsonschema.validate`` with a resolver for
+        rootschema: the schema is checked against its metaschema (which is
+        not profiled), and the best-matching ValidationError is raised.
+        """
+        validator = self._validator(schema, rootschema, owner)
+        type(validator).check_schema(schema)
+        error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+    def is_valid(self, instance, schema, rootschema, owner=None):
+        """Return True if instance is valid under schema, recording the profile
+
+        Like ``SchemaBase.is_valid``, this stops at the first error.
+        """
+        validator = self._validator(schema, rootschema, owner)
+        return next(validator.iter_errors(instance), None) is None
+
+    def record_branch(self, root, schema, rejected, elapsed):
+        """Record an anyOf/oneOf alternative tried within from_dict"""
+        rootschema = root._rootschema or root._schema
+        if id(rootschema) not in self._pointers:
+            self._register(rootschema, '#')
+        pointer = self._pointer(schema, root)
+        with self._lock:
+            stats = self.branches[root.__name__, pointer]
+            stats.tried += 1
+            stats.rejected += bool(rejected)
+            stats.time += elapsed
+
+    def by_pointer(self):
+        """Return a dict mapping pointers to (visits, time, self_time)
+
+        visits is the largest number of evaluations of any keyword of the
+        subschema.
+        """
+        with self._lock:
+            keywords = list(self.keywords.items())
+        totals = {}
+        for (pointer, keyword), stats in keywords:
+            visits, total, self_time = totals.get(pointer, (0, 0.0, 0.0))
+            totals[pointer] = (max(visits, stats.calls), total + stats.time,
+                               self_time + stats.self_time)
+        return totals
+
+    def top(self, n=10, key='self_time'):
+        """Return the n costliest (pointer, keyword), KeywordStats pairs"""
+        with self._lock:
+            keywords = list(self.keywords.items())
+        return sorted(keywords, key=lambda item: getattr(item[1], key),
+                      reverse=True)[:n]
+
+    def report(self, n=20, key='self_time'):
+        """Return a report of the n costliest schema paths as a string"""
+        lines = ['{:<60} {:<14} {:>8} {:>8} {:>10} {:>10}'.format(
+            'schema path', 'keyword', 'calls', 'failed', 'time (ms)',
+            'self (ms)')]
+        for (pointer, keyword), stats in self.top(n, key=key):
+            lines.append('{:<60} {:<14} {:>8} {:>8} {:>10.3f} {:>10.3f}'.format(
+                pointer, keyword, stats.calls, stats.failures,
+                1000 * stats.time, 1000 * stats.self_time))
+        if self.branches:
+            lines += ['', '{:<30} {:<40} {:>8} {:>8} {:>10}'.format(
+                'from_dict root', 'alternative', 'tried', 'rejected',
+                'time (ms)')]
+            branches = sorted(self.branches.items(),
+                              key=lambda item: item[1].time, reverse=True)
+            for (root, pointer), stats in branches[:n]:
+                lines.append('{:<30} {:<40} {:>8} {:>8} {:>10.3f}'.format(
+                    root, pointer, stats.tried, stats.rejected,
+                    1000 * stats.time))
+        return '\n'.join(lines)
+
+
+def get_profile():
+    """Return the active ValidationProfile, or None"""
+    return _PROFILE
+
+
+@contextlib.contextmanager
+def profile_validation(profile=None):
+    """Context manager which profiles validation within its block
+
+    Yields the ValidationProfile in which results are recorded. The previous
+    profiling state is restored on exit.
+    """
+    global _PROFILE
+    original = _PROFILE
+    _PROFILE = ValidationProfile() if profile is None else profile
+    try:
+        yield _PROFILE
+    finally:
+        _PROFILE = original
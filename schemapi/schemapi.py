@@ -1,11 +1,22 @@
 import collections
 import contextlib
 import inspect
-import json
+import threading
+import time
 
 import jsonschema
 import six
 
+from . import aio
+from . import buffers
+from . import caching
+from . import hashing
+from . import indexing
+from . import interning
+from . import profiling
+from . import serializers
+from .instrumentation import instrumented
+
 
 # If DEBUG_MODE is True, then schema objects are converted to dict and
 # validated at creation time. This slows things down, particularly for
@@ -36,6 +47,22 @@ def debug_mode(arg):
         DEBUG_MODE = original
 
 
+# Per-thread state: skip_validation is True while copy() constructs objects,
+# which are not validated even if DEBUG_MODE is True. Unlike debug_mode(),
+# this does not affect objects constructed by other threads.
+_THREAD_STATE = threading.local()
+
+
+@contextlib.contextmanager
+def _skip_validation():
+    original = getattr(_THREAD_STATE, 'skip_validation', False)
+    _THREAD_STATE.skip_validation = True
+    try:
+        yield
+    finally:
+        _THREAD_STATE.skip_validation = original
+
+
 class SchemaValidationError(jsonschema.ValidationError):
     """A wrapper for jsonschema.ValidationError with friendlier traceback"""
     def __init__(self, obj, err):
@@ -93,6 +120,37 @@ class UndefinedType(object):
 Undefined = UndefinedType()
 
 
+# Types of values which cannot be modified in place
+_IMMUTABLE_TYPES = (str, int, float, type(None), UndefinedType)
+
+
+def _validate(instance, schema, rootschema):
+    """Validate instance against schema in the context of rootschema"""
+    resolver = jsonschema.RefResolver.from_schema(rootschema)
+    return jsonschema.validate(instance, schema,
+                               cls=buffers.validator_for(schema),
+                               resolver=resolver)
+
+
+def _is_valid(instance, schema, rootschema):
+    """Return True if instance is valid under schema"""
+    resolver = jsonschema.RefResolver.from_schema(rootschema)
+    validator = buffers.validator_for(schema)(schema, resolver=resolver)
+    return validator.is_valid(instance)
+
+
+def _may_be_modified(obj, val):
+    """Invalidate the index of obj if val, read from obj, may be modified in
+    place by the caller
+
+    Schema objects update the index themselves when they are modified.
+    """
+    if not isinstance(val, _IMMUTABLE_TYPES + (SchemaBase,)):
+        if obj._index is not None:
+            obj._index.invalidate()
+    return val
+
+
 class SchemaBase(object):
     """Base class for schema wrappers.
 
@@ -102,6 +160,20 @@ class SchemaBase(object):
     _schema = None
     _rootschema = None
     _class_is_valid_at_instantiation = True
+    # Set on canonical objects while interning (see schemapi.interning)
+    _interned = False
+    # The canonical object whose state this object borrows, if any
+    _canonical = None
+    # For borrowing objects: the (parent, key) of an object handed out by
+    # interning.child(), and the children handed out by a parent
+    _owner = None
+    _shells = None
+    # The cached digest entry (see schemapi.hashing)
+    _digest = None
+    # The TypeIndex containing this object and its path within the indexed
+    # tree (see schemapi.indexing)
+    _index = None
+    _path = None
 
     def __init__(self, *args, **kwds):
         # Two valid options for initialization, which should be handled by
@@ -122,9 +194,14 @@ class SchemaBase(object):
         object.__setattr__(self, '_args', args)
         object.__setattr__(self, '_kwds', kwds)
 
-        if DEBUG_MODE and self._class_is_valid_at_instantiation:
+        if (DEBUG_MODE and self._class_is_valid_at_instantiation
+                and not getattr(_THREAD_STATE, 'skip_validation', False)):
             self.to_dict(validate=True)
 
+        if interning._TABLE is not None:
+            interning._TABLE.intern(self)
+
+    @instrumented('copy')
     def copy(self, deep=True, ignore=()):
         """Return a copy of the object
 
@@ -136,6 +213,8 @@ class SchemaBase(object):
         ignore : list, optional
             A list of keys for which the contents should not be copied, but
             only stored by reference.
+
+        Buffers (see ``schemapi.buffers``) are always stored by reference.
         """
         def _deep_copy(obj, ignore=()):
             if isinstance(obj, SchemaBase):
@@ -143,8 +222,7 @@ class SchemaBase(object):
                 kwds = {k: (_deep_copy(v, ignore=ignore)
                             if k not in ignore else v)
                         for k, v in obj._kwds.items()}
-                with debug_mode(False):
-                    return obj.__class__(*args, **kwds)
+                return obj.__class__(*args, **kwds)
             elif isinstance(obj, list):
                 return [_deep_copy(v, ignore=ignore) for v in obj]
             elif isinstance(obj, dict):
@@ -154,15 +232,18 @@ class SchemaBase(object):
             else:
                 return obj
         if deep:
-            return _deep_copy(self, ignore=ignore)
+            with _skip_validation():
+                return _deep_copy(self, ignore=ignore)
+        elif self._canonical is not None:
+            return interning.shell(self._canonical)
         else:
-            with debug_mode(False):
+            with _skip_validation():
                 return self.__class__(*self._args, **self._kwds)
 
     def __getattr__(self, attr):
         # reminder: getattr is called after the normal lookups
         if attr in self._kwds:
-            return self._kwds[attr]
+            return self._get(attr)
         else:
             try:
                 _getattr = super(SchemaBase, self).__getattr__
@@ -171,13 +252,39 @@ class SchemaBase(object):
             return _getattr(attr)
 
     def __setattr__(self, item , val):
-        self._kwds[item] = val
+        self._assign(item, val)
 
     def __getitem__(self, item):
-        return self._kwds[item]
+        return self._get(item)
+
+    def _get(self, item):
+        val = self._kwds[item]
+        if self._canonical is not None and not isinstance(val, _IMMUTABLE_TYPES):
+            if isinstance(val, SchemaBase):
+                return interning.child(self, item)
+            # the caller may modify val in place
+            interning.unshare(self)
+            val = self._kwds[item]
+        return _may_be_modified(self, val)
 
     def __setitem__(self, item, val):
+        self._assign(item, val)
+
+    def _assign(self, item, val):
+        self._prepare_mutation()
+        old = self._kwds.get(item, Undefined)
         self._kwds[item] = val
+        if self._index is not None:
+            self._index._replace(self, item, old, val)
+
+    def _prepare_mutation(self):
+        """Ensure that the state of this object can be modified in place"""
+        if self._interned:
+            raise ValueError("Cannot modify an interned {} object"
+                             "".format(self.__class__.__name__))
+        if self._canonical is not None:
+            interning.unshare(self)
+        hashing.invalidate(self)
 
     def __repr__(self):
         if self._kwds:
@@ -191,10 +298,71 @@ class SchemaBase(object):
             return "{}({!r})".format(self.__class__.__name__, self._args[0])
 
     def __eq__(self, other):
-        return (type(self) is type(other)
-                and self._args == other._args
-                and self._kwds == other._kwds)
+        if self is other:
+            return True
+        if type(self) is not type(other):
+            return False
+        # objects with different cached digests are unequal
+        digests = hashing.cached(self), hashing.cached(other)
+        if (None not in digests and digests[0][0] != digests[1][0]
+                and not (digests[0][2] or digests[1][2])):
+            return False
+        return self._args == other._args and self._kwds == other._kwds
+
+    def __hash__(self):
+        digest, _, opaque = hashing.digest_entry(self)
+        if opaque:
+            # objects with other digests may be equal to this one
+            return hash(type(self))
+        return int.from_bytes(digest[:8], 'little')
+
+    def diff(self, other):
+        """Return a JSON Patch (RFC 6902) transforming self into other
+
+        Parameters
+        ----------
+        other : SchemaBase, dict, list or scalar
+            The object to compare with
+
+        Returns
+        -------
+        patch : list of dicts
+            The patch operations, which transform the output of
+            self.to_dict() into that of other.to_dict(). Identical subtrees
+            are skipped without being compared.
+        """
+        from .patch import diff
+        return diff(self, other)
+
+    def apply_patch(self, patch, validate=True):
+        """Apply a JSON Patch (RFC 6902) to this object in place
+
+        Parameters
+        ----------
+        patch : list of dicts
+            The patch operations, e.g. the output of diff()
+        validate : boolean
+            If True (default), then validate the result against the schema.
 
+        Returns
+        -------
+        self : SchemaBase
+            The modified object
+
+        Raises
+        ------
+        ValueError :
+            if an operation is invalid, or a ``test`` operation fails
+        SchemaValidationError :
+            if validate=True and the result does not conform to the schema
+        """
+        from .patch import apply_patch
+        apply_patch(self, patch)
+        if validate:
+            self.to_dict(validate=True)
+        return self
+
+    @instrumented('to_dict')
     def to_dict(self, validate=True, ignore=[], context={}):
         """Return a dictionary representation of the object
 
@@ -232,6 +400,8 @@ class SchemaBase(object):
             elif isinstance(val, dict):
                 return {k: _todict(v) for k, v in val.items()
                         if v is not Undefined}
+            elif buffers.is_buffer(val):
+                return buffers.tolist(val)
             else:
                 return val
 
@@ -250,6 +420,7 @@ class SchemaBase(object):
                 raise SchemaValidationError(self, err)
         return result
 
+    @instrumented('to_json', nbytes=lambda result: len(result.encode('utf-8')))
     def to_json(self, validate=True, ignore=[], context={},
                 indent=2, sort_keys=True, **kwargs):
         """Emit the JSON representation for this object as a string.
@@ -272,7 +443,9 @@ class SchemaBase(object):
         sort_keys : boolean, default True
             if True, sort keys in the output
         **kwargs
-            Additional keyword arguments are passed to ``json.dumps()``
+            Additional keyword arguments are passed to ``json.dumps()``.
+            The active JSON backend (see ``schemapi.serializers``) is used
+            unless additional keyword arguments are given.
 
         Returns
         -------
@@ -280,7 +453,74 @@ class SchemaBase(object):
             The JSON specification of the chart object.
         """
         dct = self.to_dict(validate=validate, ignore=ignore, context=context)
-        return json.dumps(dct, indent=indent, sort_keys=sort_keys, **kwargs)
+        return serializers.get_json_backend().dumps(
+            dct, indent=indent, sort_keys=sort_keys, **kwargs)
+
+    async def to_json_async(self, validate=True, ignore=[], context={},
+                            indent=2, sort_keys=True, stream=None, **kwargs):
+        """Emit the JSON representation for this object, without blocking.
+
+        Serialization and validation run in the executor of
+        ``schemapi.aio``. Arguments are as for to_json(), and:
+
+        Parameters
+        ----------
+        stream : writable stream (optional)
+            If specified, the UTF-8 encoded JSON is written to this stream
+            (e.g. an ``asyncio.StreamWriter``) rather than returned.
+
+        Returns
+        -------
+        spec : string or None
+            The JSON specification of the chart object, or None if stream
+            was specified.
+        """
+        spec = await aio.run_in_executor(
+            self.to_json, validate=validate, ignore=ignore, context=context,
+            indent=indent, sort_keys=sort_keys, **kwargs)
+        if stream is None:
+            return spec
+        await aio.write_stream(stream, spec.encode('utf-8'))
+
+    @classmethod
+    def _binary_codec(cls, codec, intern):
+        strings = None
+        if intern:
+            strings = serializers.string_table(cls._rootschema or cls._schema)
+        return serializers.get_binary_codec(codec, strings)
+
+    @instrumented('to_msgpack', nbytes=len)
+    def to_msgpack(self, validate=True, ignore=[], context={}, intern=False,
+                   codec='msgpack'):
+        """Emit a compact binary representation of this object as bytes.
+
+        Parameters
+        ----------
+        validate : boolean or string
+            If True (default), then validate the output dictionary
+            against the schema. If "deep" then recursively validate
+            all objects in the spec.
+        ignore : list
+            A list of keys to ignore. This will *not* passed to child to_dict
+            function calls.
+        context : dict (optional)
+            A context dictionary that will be passed to all child to_dict
+            function calls
+        intern : boolean, default False
+            If True, encode the property names and enum strings of the root
+            schema as indices. This makes the output smaller, but slower to
+            encode and decode, and it can then only be decoded with
+            from_msgpack(intern=True) of a class with the same root schema.
+        codec : string, default 'msgpack'
+            The name of the binary codec (see ``schemapi.serializers``)
+
+        Returns
+        -------
+        data : bytes
+            The encoded specification.
+        """
+        dct = self.to_dict(validate=validate, ignore=ignore, context=context)
+        return self._binary_codec(codec, intern).dumps(dct)
 
     @classmethod
     def _default_wrapper_classes(cls):
@@ -288,7 +528,8 @@ class SchemaBase(object):
         return SchemaBase.__subclasses__()
 
     @classmethod
-    def from_dict(cls, dct, validate=True, _wrapper_classes=None):
+    @instrumented('from_dict')
+    def from_dict(cls, dct, validate=True, index=False, _wrapper_classes=None):
         """Construct class from a dictionary representation
 
         Parameters
@@ -297,6 +538,10 @@ class SchemaBase(object):
             The dict from which to construct the class
         validate : boolean
             If True (default), then validate the input against the schema.
+        index : boolean
+            If True, then build a TypeIndex of the objects within the result
+            (see ``schemapi.indexing``), which is kept up to date as they are
+            modified.
         _wrapper_classes : list (optional)
             The set of SchemaBase classes to use when constructing wrappers
             of the dict inputs. If not specified, the result of
@@ -317,8 +562,11 @@ class SchemaBase(object):
         if _wrapper_classes is None:
             _wrapper_classes = cls._default_wrapper_classes()
         converter = _FromDict(_wrapper_classes)
-        return converter.from_dict(constructor=cls, root=cls,
-                                   schema=cls._schema, dct=dct)
+        obj = converter.from_dict(constructor=cls, root=cls,
+                                  schema=cls._schema, dct=dct)
+        if index:
+            indexing.TypeIndex(obj)
+        return obj
 
     @classmethod
     def from_json(cls, json_string, validate=True, **kwargs):
@@ -331,17 +579,57 @@ class SchemaBase(object):
         validate : boolean
             If True (default), then validate the input against the schema.
         **kwargs :
-            Additional keyword arguments are passed to json.loads
+            Additional keyword arguments are passed to json.loads. The active
+            JSON backend (see ``schemapi.serializers``) is used unless
+            additional keyword arguments are given.
 
         Returns
         -------
         chart : Chart object
             The altair Chart object built from the specification.
         """
-        dct = json.loads(json_string, **kwargs)
+        dct = serializers.get_json_backend().loads(json_string, **kwargs)
         return cls.from_dict(dct, validate=validate)
 
     @classmethod
+    async def from_json_async(cls, json_string, validate=True, **kwargs):
+        """Instantiate the object from JSON, without blocking.
+
+        Parsing, validation and construction run in the executor of
+        ``schemapi.aio``. Arguments are as for from_json(), except that
+        json_string may also be bytes, an ``asyncio.StreamReader`` or an
+        async iterable of bytes, which is read to the end first.
+        """
+        json_string = await aio.read_stream(json_string)
+        return await aio.run_in_executor(cls.from_json, json_string,
+                                         validate=validate, **kwargs)
+
+    @classmethod
+    def from_msgpack(cls, data, validate=True, intern=False, codec='msgpack'):
+        """Instantiate the object from the output of to_msgpack()
+
+        Parameters
+        ----------
+        data : bytes
+            The encoded specification.
+        validate : boolean
+            If True (default), then validate the input against the schema.
+        intern : boolean, default False
+            Whether the data was encoded with interned strings. This must
+            match the argument passed to to_msgpack().
+        codec : string, default 'msgpack'
+            The name of the binary codec (see ``schemapi.serializers``)
+
+        Returns
+        -------
+        obj : Schema object
+            The wrapped schema
+        """
+        dct = cls._binary_codec(codec, intern).loads(data)
+        return cls.from_dict(dct, validate=validate)
+
+    @classmethod
+    @instrumented('validate')
     def validate(cls, instance, schema=None):
         """
         Validate the instance against the class schema in the context of the
@@ -349,8 +637,46 @@ class SchemaBase(object):
         """
         if schema is None:
             schema = cls._schema
-        resolver = jsonschema.RefResolver.from_schema(cls._rootschema or cls._schema)
-        return jsonschema.validate(instance, schema, resolver=resolver)
+        if profiling._PROFILE is not None:
+            return profiling._PROFILE.validate(instance, schema,
+                                               cls._rootschema or cls._schema,
+                                               owner=cls)
+        if caching._CACHE is not None:
+            return caching._CACHE.validate(instance, schema,
+                                           cls._rootschema or cls._schema,
+                                           _validate)
+        return _validate(instance, schema, cls._rootschema or cls._schema)
+
+    @classmethod
+    @instrumented('is_valid')
+    def is_valid(cls, instance, schema=None):
+        """
+        Return True if the instance is valid under the class schema in the
+        context of the rootschema.
+
+        Unlike validate(), this does not raise an exception for invalid
+        instances, stops at the first error, and does not validate the schema
+        itself, which makes it cheaper when invalid instances are expected.
+        """
+        if schema is None:
+            schema = cls._schema
+        if profiling._PROFILE is not None:
+            return profiling._PROFILE.is_valid(instance, schema,
+                                               cls._rootschema or cls._schema,
+                                               owner=cls)
+        if caching._CACHE is not None:
+            return caching._CACHE.is_valid(instance, schema,
+                                           cls._rootschema or cls._schema,
+                                           _is_valid)
+        return _is_valid(instance, schema, cls._rootschema or cls._schema)
+
+    @classmethod
+    async def validate_async(cls, instance, schema=None):
+        """Validate the instance in the executor of ``schemapi.aio``
+
+        This is the non-blocking counterpart of validate().
+        """
+        return await aio.run_in_executor(cls.validate, instance, schema)
 
     @classmethod
     def resolve_references(cls, schema):
@@ -401,7 +727,7 @@ class _FromDict(object):
             schema = {key: val for key, val in schema.items()
                       if key not in cls._hash_exclude_keys}
         if use_json:
-            s = json.dumps(schema, sort_keys=True)
+            s = serializers.canonical_dumps(schema)
             return hash(s)
         else:
             def _freeze(val):
@@ -426,29 +752,57 @@ class _FromDict(object):
         else:
             raise ValueError("Both args and kwds supplied")
 
+    @instrumented('get_constructor',
+                  owner=lambda args, result: result[0] if result else None)
+    def _get_constructor(self, root, schema):
+        """Return the constructor and resolved schema for a subschema"""
+        # TODO: do something more than simply selecting the last match?
+        hash_ = self.hash_schema(schema)
+        matches = self.class_dict[hash_]
+        constructor = matches[-1] if matches else self._passthrough
+        schema = root.resolve_references(schema)
+        return constructor, schema
+
+    @staticmethod
+    def _branch_is_valid(root, dct, schema):
+        """Return True if dct is valid under an anyOf/oneOf alternative"""
+        profile = profiling._PROFILE
+        if profile is not None:
+            start = time.perf_counter()
+        valid = root.is_valid(dct, schema)
+        if profile is not None:
+            profile.record_branch(root, schema, not valid,
+                                  time.perf_counter() - start)
+        return valid
+
+    @staticmethod
+    def _is_leaf(schema):
+        """Return True if from_dict wraps no part of any instance of schema"""
+        return not any(key in schema for key in ('anyOf', 'oneOf', 'properties',
+                                                  'items', '$ref'))
+
+    @classmethod
+    def _rebuild(cls, val):
+        """Copy val as from_dict does under a leaf schema: lists are copied
+        with their items, and dicts are copied"""
+        if isinstance(val, list):
+            return [cls._rebuild(v) if isinstance(v, (list, dict)) else v
+                    for v in val]
+        elif isinstance(val, dict):
+            return dict(val)
+        return val
+
     def from_dict(self, constructor, root, schema, dct):
         """Construct an object from a dict representation"""
         # TODO: introspect lists, objects, etc. when they don't have a wrapper.
         #       could do this by passing the schema rather than cls.
         schema = root.resolve_references(schema)
 
-        def _get_constructor(schema):
-            # TODO: do something more than simply selecting the last match?
-            hash_ = self.hash_schema(schema)
-            matches = self.class_dict[hash_]
-            constructor = matches[-1] if matches else self._passthrough
-            schema = root.resolve_references(schema)
-            return constructor, schema
-
         if 'anyOf' in schema or 'oneOf' in schema:
             schemas = schema.get('anyOf', []) + schema.get('oneOf', [])
             for this_schema in schemas:
-                this_constructor, this_schema = _get_constructor(this_schema)
-                try:
-                    root.validate(dct, this_schema)
-                except jsonschema.ValidationError:
-                    continue
-                else:
+                this_constructor, this_schema = self._get_constructor(root, this_schema)
+                if self._branch_is_valid(root, dct, this_schema):
                     return self.from_dict(this_constructor, root, this_schema, dct)
 
         if isinstance(dct, dict):
@@ -457,7 +811,7 @@ class _FromDict(object):
             kwds = {}
             for key, val in dct.items():
                 if key in props:
-                    prop_constructor, prop_schema = _get_constructor(props[key])
+                    prop_constructor, prop_schema = self._get_constructor(root, props[key])
                     val = self.from_dict(prop_constructor, root, prop_schema, val)
                 kwds[key] = val
             return constructor(**kwds)
@@ -465,12 +819,17 @@ class _FromDict(object):
         elif isinstance(dct, list):
             if 'items' in schema:
                 item_schema = schema['items']
-                item_constructor, item_schema = _get_constructor(item_schema)
+                item_constructor, item_schema = self._get_constructor(root, item_schema)
             else:
                 item_schema = {}
                 item_constructor = self._passthrough
-            dct = [self.from_dict(item_constructor, root, item_schema, val)
-                   for val in dct]
+            if (item_constructor is not self._passthrough
+                    or not self._is_leaf(item_schema)):
+                dct = [self.from_dict(item_constructor, root, item_schema, val)
+                       for val in dct]
+            else:
+                dct = self._rebuild(dct)
             return constructor(dct)
         else:
+            # e.g. buffers, which are opaque: their items are never wrapped
             return constructor(dct)
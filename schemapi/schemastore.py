@@ -0,0 +1,120 @@
+"""Loading of schemas shared within and between processes
+
+``load_schema`` memory-maps a JSON schema file and parses it once per
+process: later calls return the same dict, so that all modules and wrapper
+classes using a schema file share one copy of it. Schemas returned by
+``load_schema`` must be treated as read-only.
+
+To share schemas between forked worker processes, load them in the parent
+before forking and call ``freeze()``. The schema objects are then shared
+copy-on-write with the workers, and the garbage collector of the workers does
+not touch (and so does not copy) the memory pages holding them.
+
+>>> import os, tempfile
+>>> path = os.path.join(tempfile.mkdtemp(), 'schema.json')
+>>> write_schema({'type': 'object', 'properties': {'a': {}}}, path)
+>>> load_schema(path)
+{'type': 'object', 'properties': {'a': {}}}
+>>> load_schema(path) is load_schema(path)
+True
+"""
+import gc
+import json
+import mmap
+import os
+
+from . import serializers
+
+
+# Loaded schemas, keyed by real path. Each entry is ((inode, mtime, ctime,
+# size), schema).
+_SCHEMAS = {}
+
+# The backends which parse documents as the json module does
+_EXACT_BACKENDS = (serializers.JSONBackend, serializers.OrjsonBackend,
+                   serializers.RapidjsonBackend, serializers.UjsonBackend)
+
+
+def _parse(view):
+    """Parse JSON from a buffer as the json module does, without copying it
+    if the backend allows"""
+    backend = serializers.get_json_backend()
+    if type(backend) not in _EXACT_BACKENDS:
+        backend = serializers.JSONBackend()
+    try:
+        return backend.loads(view)
+    except TypeError:
+        return backend.loads(view.tobytes())
+
+
+def load_schema(path):
+    """Load a JSON schema file, once per process
+
+    The file is memory-mapped and parsed with the active JSON backend if it
+    is a built-in one, which parses as the ``json`` module does, and with the
+    ``json`` module otherwise. The result is cached: later calls with the
+    same path return the same dict, unless the file has been replaced or
+    modified.
+
+    Parameters
+    ----------
+    path : string or Path
+        The path of the schema file
+
+    Returns
+    -------
+    schema : dict
+        The schema. It is shared between callers, and must not be modified.
+    """
+    path = os.path.realpath(os.fspath(path))
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns,
+               stat.st_size)
+        entry = _SCHEMAS.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        if stat.st_size == 0:
+            raise ValueError("Schema file {} is empty".format(path))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                schema = _parse(view)
+    _SCHEMAS[path] = (key, schema)
+    return schema
+
+
+def write_schema(schema, path):
+    """Write a schema to a file in the format read by load_schema
+
+    The schema is written as compact JSON. The file is replaced atomically,
+    so that concurrent processes never load a partially-written schema.
+    """
+    path = os.fspath(path)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    data = json.dumps(schema, separators=(',', ':'), ensure_ascii=False)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def clear_cache():
+    """Forget the schemas loaded by load_schema"""
+    _SCHEMAS.clear()
+
+
+def freeze():
+    """Exclude all objects allocated so far from garbage collection
+
+    Call this in a parent process after loading schemas and importing
+    wrapper modules, and before forking workers, so that the workers share
+    these objects with the parent rather than copying them. See
+    ``gc.freeze`` for details.
+    """
+    gc.freeze()
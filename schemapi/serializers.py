@@ -0,0 +1,539 @@
+"""Pluggable JSON backends for serialization of schema objects
+
+``SchemaBase.to_json`` and ``SchemaBase.from_json`` use the active JSON
+backend. By default this is the first available of orjson, rapidjson and
+ujson, falling back to the standard library ``json`` module. The default can
+be overridden with the ``SCHEMAPI_JSON_BACKEND`` environment variable, or with
+``set_json_backend``/``json_backend``:
+
+>>> from schemapi import serializers
+>>> with serializers.json_backend('json'):
+...     serializers.get_json_backend().dumps({'b': 1, 'a': [2]}, sort_keys=True)
+'{"a": [2], "b": 1}'
+
+Every backend honors ``indent`` and ``sort_keys``, and behaves as the
+standard library ``json`` module does. A faster library only serializes data
+made of dicts with string keys, lists, tuples, strings, numbers, booleans and
+None (values of other types, e.g. dates, are rejected by the json module), and
+its output is only used if it is indented (compact output differs in
+whitespace) and contains no non-ASCII or DEL characters, floats in exponent
+notation or non-finite floats, which libraries format differently. Documents
+are only parsed by a faster library if they contain no integers which may be
+too large for it, and documents it rejects (e.g. containing ``NaN``) are
+parsed by the ``json`` module. Any other keyword arguments, options a backend
+does not support (e.g. orjson only indents by two spaces) and data a backend
+cannot serialize are also handled by the ``json`` module.
+
+``SchemaBase.to_msgpack`` and ``SchemaBase.from_msgpack`` use a binary codec,
+by default MessagePack (which requires the ``msgpack`` package). Optionally,
+property names and enum strings of the schema are interned: they are encoded
+as indices into a ``StringTable`` built from the schema, so both ends of an
+exchange must use the same schema.
+"""
+import contextlib
+import json
+import math
+import os
+import re
+
+
+class JSONBackend(object):
+    """A JSON backend based on the standard library ``json`` module
+
+    Subclasses override dumps() and loads(), and should defer to this class
+    for arguments they do not support.
+    """
+    name = 'json'
+
+    def dumps(self, obj, indent=None, sort_keys=False, **kwargs):
+        """Serialize obj to a JSON string"""
+        return json.dumps(obj, indent=indent, sort_keys=sort_keys, **kwargs)
+
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes"""
+        return json.loads(s, **kwargs)
+
+    def _loads_with(self, loads, s):
+        """Deserialize s with the loads function of a faster library, or with
+        the json module if the results may differ"""
+        if not _may_lose_precision(s):
+            try:
+                return loads(s)
+            except (TypeError, ValueError):
+                # e.g. NaN, lone surrogates or deeply nested documents
+                pass
+        return json.loads(s)
+
+    def __repr__(self):
+        return '{}()'.format(self.__class__.__name__)
+
+
+# Numbers in exponent notation, which libraries format differently (e.g.
+# 1e20 rather than 1e+20). Some matches may be within strings.
+_EXPONENT = re.compile(r'(?:^|[\[:,])\s*-?\d+(?:\.\d+)?[eE]')
+
+
+# Integers of 19 digits or more, which may not fit in 64 bits. Some matches
+# may be within strings.
+_LONG_INTEGER = re.compile(r'\d{19}')
+_LONG_INTEGER_BYTES = re.compile(br'\d{19}')
+
+
+def _is_portable(text):
+    """Return True if text, the indented output of a JSON library, is the same
+    as the output of the json module
+
+    Non-ASCII and DEL characters are escaped by the json module, and floats
+    in exponent notation may be formatted differently.
+    """
+    return (text.isascii() and '\x7f' not in text
+            and not _EXPONENT.search(text))
+
+
+def _is_plain(obj):
+    """Return True if obj is made of dicts with string keys, lists, tuples,
+    strings, integers, finite floats, booleans and None, and of no subclasses
+    of these types"""
+    cls = type(obj)
+    if cls is str or cls is int or cls is bool or obj is None:
+        return True
+    elif cls is float:
+        return math.isfinite(obj)
+    elif cls is dict:
+        return all(type(key) is str and _is_plain(val)
+                   for key, val in obj.items())
+    elif cls is list or cls is tuple:
+        return all(_is_plain(val) for val in obj)
+    return False
+
+
+def _may_lose_precision(s):
+    """Return True if s, a JSON document, may hold integers which a faster
+    library would parse as floats or reject"""
+    if isinstance(s, str):
+        return _LONG_INTEGER.search(s) is not None
+    try:
+        return _LONG_INTEGER_BYTES.search(s) is not None
+    except TypeError:
+        return True
+
+
+def _unsupported(obj):
+    """The default of orjson: leave values of other types to the json
+    module"""
+    raise TypeError("{} is left to the json module".format(type(obj)))
+
+
+class OrjsonBackend(JSONBackend):
+    """A JSON backend based on orjson"""
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj, indent=None, sort_keys=False, **kwargs):
+        if not kwargs and indent == 2 and _is_plain(obj):
+            orjson = self._orjson
+            # types the json module does not serialize are left to it
+            option = (orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATACLASS
+                      | orjson.OPT_PASSTHROUGH_DATETIME
+                      | orjson.OPT_PASSTHROUGH_SUBCLASS)
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                text = orjson.dumps(obj, default=_unsupported,
+                                    option=option).decode('utf-8')
+            except TypeError:
+                # e.g. integers larger than 64 bits
+                text = None
+            if text is not None and _is_portable(text):
+                return text
+        return super(OrjsonBackend, self).dumps(
+            obj, indent=indent, sort_keys=sort_keys, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super(OrjsonBackend, self).loads(s, **kwargs)
+        return self._loads_with(self._orjson.loads, s)
+
+
+class RapidjsonBackend(JSONBackend):
+    """A JSON backend based on python-rapidjson"""
+    name = 'rapidjson'
+
+    def __init__(self):
+        import rapidjson
+        self._rapidjson = rapidjson
+
+    def dumps(self, obj, indent=None, sort_keys=False, **kwargs):
+        if not kwargs and indent and _is_plain(obj):
+            try:
+                text = self._rapidjson.dumps(obj, indent=indent,
+                                             sort_keys=sort_keys,
+                                             ensure_ascii=False)
+            except (TypeError, ValueError, OverflowError):
+                text = None
+            if text is not None and _is_portable(text):
+                return text
+        return super(RapidjsonBackend, self).dumps(
+            obj, indent=indent, sort_keys=sort_keys, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super(RapidjsonBackend, self).loads(s, **kwargs)
+        return self._loads_with(self._rapidjson.loads, s)
+
+
+class UjsonBackend(JSONBackend):
+    """A JSON backend based on ujson"""
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj, indent=None, sort_keys=False, **kwargs):
+        if not kwargs and indent and _is_plain(obj):
+            try:
+                text = self._ujson.dumps(obj, indent=indent,
+                                         sort_keys=sort_keys,
+                                         ensure_ascii=False,
+                                         escape_forward_slashes=False)
+            except (TypeError, ValueError, OverflowError):
+                text = None
+            if text is not None and _is_portable(text):
+                return text
+        return super(UjsonBackend, self).dumps(
+            obj, indent=indent, sort_keys=sort_keys, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super(UjsonBackend, self).loads(s, **kwargs)
+        return self._loads_with(self._ujson.loads, s)
+
+
+# Registered backend classes, in order of preference
+_JSON_BACKENDS = {
+    'orjson': OrjsonBackend,
+    'rapidjson': RapidjsonBackend,
+    'ujson': UjsonBackend,
+    'json': JSONBackend,
+}
+
+# Instances of the backends which have been loaded
+_LOADED = {}
+
+# The active backend; set on first use
+_ACTIVE = None
+
+
+def register_json_backend(name, backend_class):
+    """Register a JSON backend class under a name
+
+    backend_class is instantiated without arguments when the backend is first
+    used, and should raise ImportError if it is unavailable. Backends
+    registered later are preferred over the built-in ones by default.
+    """
+    global _JSON_BACKENDS
+    _JSON_BACKENDS = dict([(name, backend_class)] +
+                          [(key, val) for key, val in _JSON_BACKENDS.items()
+                           if key != name])
+    _LOADED.pop(name, None)
+
+
+def _load(name):
+    """Return the backend instance for a name, or None if unavailable"""
+    if name not in _LOADED:
+        try:
+            backend_class = _JSON_BACKENDS[name]
+        except KeyError:
+            raise ValueError("Unknown JSON backend {!r}; registered backends "
+                             "are {}".format(name, list(_JSON_BACKENDS)))
+        try:
+            _LOADED[name] = backend_class()
+        except ImportError:
+            _LOADED[name] = None
+    return _LOADED[name]
+
+
+def available_json_backends():
+    """Return the names of the JSON backends which can be used"""
+    return [name for name in _JSON_BACKENDS if _load(name) is not None]
+
+
+def _default_backend():
+    name = os.environ.get('SCHEMAPI_JSON_BACKEND')
+    if name:
+        backend = _load(name)
+        if backend is not None:
+            return backend
+    return _load(available_json_backends()[0])
+
+
+def get_json_backend():
+    """Return the active JSON backend"""
+    global _ACTIVE
+    if _ACTIVE is None:
+        _ACTIVE = _default_backend()
+    return _ACTIVE
+
+
+def set_json_backend(name):
+    """Set the active JSON backend by name
+
+    Raises ValueError if the backend is unknown, and ImportError if the
+    library it requires is not installed.
+    """
+    global _ACTIVE
+    backend = _load(name)
+    if backend is None:
+        raise ImportError("JSON backend {!r} is not installed".format(name))
+    _ACTIVE = backend
+
+
+@contextlib.contextmanager
+def json_backend(name):
+    """Context manager which sets the active JSON backend within its block"""
+    global _ACTIVE
+    original = _ACTIVE
+    set_json_backend(name)
+    try:
+        yield
+    finally:
+        _ACTIVE = original
+
+
+def _make_canonical_dumps():
+    try:
+        import orjson
+    except ImportError:
+        return lambda obj: json.dumps(obj, sort_keys=True)
+
+    def canonical_dumps(obj):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return json.dumps(obj, sort_keys=True)
+    return canonical_dumps
+
+
+canonical_dumps = _make_canonical_dumps()
+canonical_dumps.__doc__ = """Serialize obj deterministically, with sorted keys
+
+The result (a str or bytes) is only meant for hashing and comparison within a
+process. It does not depend on the active JSON backend.
+"""
+
+
+class StringTable(object):
+    """A table of strings which are encoded by index
+
+    Parameters
+    ----------
+    strings : iterable of strings
+        The interned strings. The index of each string is its position.
+    """
+    def __init__(self, strings):
+        self.strings = tuple(strings)
+        self.index = {string: i for i, string in enumerate(self.strings)}
+
+    @classmethod
+    def from_schema(cls, schema):
+        """Build the table of property names and enum strings of a schema
+
+        The table depends only on the content of the schema, so that tables
+        built from equal schemas in different processes agree.
+        """
+        strings = set()
+
+        def _walk(obj):
+            if isinstance(obj, dict):
+                properties = obj.get('properties')
+                if isinstance(properties, dict):
+                    strings.update(properties)
+                enum = obj.get('enum')
+                if isinstance(enum, list):
+                    strings.update(val for val in enum
+                                   if isinstance(val, str))
+                for val in obj.values():
+                    _walk(val)
+            elif isinstance(obj, list):
+                for val in obj:
+                    _walk(val)
+
+        _walk(schema)
+        return cls(sorted(strings))
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __repr__(self):
+        return 'StringTable(<{} strings>)'.format(len(self.strings))
+
+    def intern(self, obj, ref, escape=None):
+        """Return a copy of obj with interned strings replaced by indices
+
+        Interned dict keys are replaced by their index, and interned string
+        values by ``ref(index)``. Integer dict keys, which restore_pairs()
+        would otherwise take for interned keys, are replaced by
+        ``escape(key)``; a ValueError is raised if they occur and escape is
+        None.
+        """
+        index = self.index
+
+        def _key(key):
+            if type(key) is int:
+                if escape is None:
+                    raise ValueError("Cannot intern the integer key "
+                                     "{!r}".format(key))
+                return escape(key)
+            return index.get(key, key)
+
+        def _intern(obj):
+            if isinstance(obj, dict):
+                return {_key(key): _intern(val) for key, val in obj.items()}
+            elif isinstance(obj, (list, tuple)):
+                return [_intern(val) for val in obj]
+            elif isinstance(obj, str) and obj in index:
+                return ref(index[obj])
+            else:
+                return obj
+        return _intern(obj)
+
+    def restore_pairs(self, pairs):
+        """Build a dict from key, value pairs with interned keys restored
+
+        Integer keys are interned keys, and ``EscapedKey`` keys are the
+        integer keys escaped by intern().
+        """
+        strings = self.strings
+        result = {}
+        for key, val in pairs:
+            if type(key) is int:
+                key = strings[key]
+            elif type(key) is EscapedKey:
+                key = key.key
+            result[key] = val
+        return result
+
+
+class EscapedKey(object):
+    """An integer dict key which is not an interned key"""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __repr__(self):
+        return 'EscapedKey({!r})'.format(self.key)
+
+
+# StringTables of schemas, keyed by id(schema). Each entry keeps a reference
+# to the schema so that its id cannot be reused.
+_STRING_TABLES = {}
+
+
+def string_table(schema):
+    """Return the StringTable of a schema, building it on first use"""
+    entry = _STRING_TABLES.get(id(schema))
+    if entry is None or entry[0] is not schema:
+        entry = _STRING_TABLES[id(schema)] = (schema,
+                                              StringTable.from_schema(schema))
+    return entry[1]
+
+
+class BinaryCodec(object):
+    """Base class of binary codecs for to_msgpack()/from_msgpack()
+
+    Parameters
+    ----------
+    strings : StringTable, optional
+        The strings to intern. If not specified, no strings are interned.
+    """
+    name = None
+
+    def __init__(self, strings=None):
+        self.strings = strings
+
+    def dumps(self, obj):
+        """Serialize obj to bytes"""
+        raise NotImplementedError()
+
+    def loads(self, data):
+        """Deserialize bytes"""
+        raise NotImplementedError()
+
+
+class MsgpackCodec(BinaryCodec):
+    """A binary codec based on msgpack
+
+    Interned dict keys are encoded as integers, and interned string values as
+    a msgpack extension type holding the index. Integer dict keys are then
+    encoded as another extension type holding the packed key.
+    """
+    name = 'msgpack'
+    ext_code = 42
+    key_ext_code = 43
+
+    def __init__(self, strings=None):
+        import msgpack
+        self._msgpack = msgpack
+        super(MsgpackCodec, self).__init__(strings)
+
+    def _ref(self, i):
+        return self._msgpack.ExtType(self.ext_code,
+                                     i.to_bytes((i.bit_length() + 7) // 8 or 1,
+                                                'big'))
+
+    def _escape(self, key):
+        return self._msgpack.ExtType(self.key_ext_code,
+                                     self._msgpack.packb(key))
+
+    def _ext_hook(self, code, data):
+        if self.strings is None:
+            return self._msgpack.ExtType(code, data)
+        elif code == self.ext_code:
+            return self.strings.strings[int.from_bytes(data, 'big')]
+        elif code == self.key_ext_code:
+            return EscapedKey(self._msgpack.unpackb(data))
+        return self._msgpack.ExtType(code, data)
+
+    def dumps(self, obj):
+        if self.strings is not None:
+            obj = self.strings.intern(obj, self._ref, self._escape)
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        if self.strings is None:
+            return self._msgpack.unpackb(data, raw=False)
+        return self._msgpack.unpackb(
+            data, raw=False, strict_map_key=False, ext_hook=self._ext_hook,
+            object_pairs_hook=self.strings.restore_pairs)
+
+
+# Registered binary codec classes
+_BINARY_CODECS = {'msgpack': MsgpackCodec}
+
+
+def register_binary_codec(name, codec_class):
+    """Register a BinaryCodec subclass under a name
+
+    codec_class is called with the StringTable to use (or None), and should
+    raise ImportError if it is unavailable.
+    """
+    _BINARY_CODECS[name] = codec_class
+
+
+def get_binary_codec(name='msgpack', strings=None):
+    """Return an instance of the binary codec with the given name
+
+    Raises ValueError if the codec is unknown, and ImportError if the library
+    it requires is not installed.
+    """
+    try:
+        codec_class = _BINARY_CODECS[name]
+    except KeyError:
+        raise ValueError("Unknown binary codec {!r}; registered codecs are {}"
+                         "".format(name, list(_BINARY_CODECS)))
+    return codec_class(strings)
@@ -0,0 +1,183 @@
+"""Random JSON schemas and matching instances for scale testing
+
+The schemas produced here use a restricted subset of JSON schema (objects,
+arrays, ``anyOf`` unions, enums, simple types and ``$ref``), so that a valid
+instance can always be generated for them. Both functions are deterministic
+for a given ``seed``.
+
+>>> schema = random_schema(n_definitions=20, depth=3, seed=0)
+>>> instance = random_instance(schema, seed=0)
+>>> jsonschema.validate(instance, schema)
+"""
+import random
+
+import jsonschema
+
+from .utils import resolve_references
+
+
+__all__ = ['random_schema', 'random_instance']
+
+
+_SIMPLE_TYPES = ('string', 'number', 'integer', 'boolean', 'null')
+
+_PROPERTY_NAMES = ('name', 'type', 'value', 'field', 'title', 'data', 'scale',
+                   'axis', 'color', 'size', 'format', 'orient', 'values',
+                   'width', 'height', 'padding', 'range', 'domain', 'sort',
+                   'filter', 'labelAngle', 'tickCount', 'stack', 'zero')
+
+_WORDS = ('alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta',
+          'theta', 'iota', 'kappa', 'lambda', 'mu')
+
+
+def random_schema(n_definitions=10, depth=3, union_width=3, n_properties=5,
+                  seed=None):
+    """Generate a random JSON schema with definitions
+
+    Definitions are arranged in ``depth`` levels, and definitions at one level
+    only reference definitions at the next level. This keeps the schema
+    acyclic, so that instances are finite, while the longest chain of
+    ``$ref`` is ``depth`` definitions long. The root schema is an object with
+    a property referencing each definition of the first level.
+
+    Parameters
+    ----------
+    n_definitions : int
+        The number of definitions in the schema (at least ``depth``)
+    depth : int
+        The number of levels of definitions, i.e. the length of the longest
+        ``$ref`` chain
+    union_width : int
+        The number of alternatives in each ``anyOf`` definition
+    n_properties : int
+        The maximum number of properties of each object definition
+    seed : int, optional
+        The random seed
+
+    Returns
+    -------
+    schema : dict
+        A draft-04 JSON schema
+    """
+    if depth < 1 or n_definitions < depth:
+        raise ValueError("need depth >= 1 and n_definitions >= depth")
+    rand = random.Random(seed)
+
+    # Spread the definitions over the levels
+    levels = [[] for _ in range(depth)]
+    for i in range(n_definitions):
+        level = i if i < depth else rand.randrange(depth)
+        levels[level].append('Def{}'.format(i))
+
+    def simple():
+        typ = rand.choice(_SIMPLE_TYPES)
+        if typ == 'string' and rand.random() < 0.3:
+            return {'type': 'string', 'enum': rand.sample(_WORDS, 3)}
+        return {'type': typ}
+
+    def reference(level):
+        if level + 1 < depth:
+            name = rand.choice(levels[level + 1])
+            return {'$ref': '#/definitions/{}'.format(name)}
+        return simple()
+
+    def subschema(level):
+        kind = rand.random()
+        if kind < 0.4:
+            return reference(level)
+        elif kind < 0.6:
+            return {'type': 'array', 'items': reference(level)}
+        elif kind < 0.7:
+            return {'anyOf': [reference(level), {'type': 'null'}]}
+        else:
+            return simple()
+
+    def definition(level):
+        kind = rand.random()
+        if kind < 0.6:
+            names = rand.sample(_PROPERTY_NAMES,
+                                rand.randint(1, min(n_properties,
+                                                    len(_PROPERTY_NAMES))))
+            properties = {name: subschema(level) for name in names}
+            required = [name for name in names if rand.random() < 0.3]
+            schema = {'type': 'object', 'properties': properties,
+                      'description': 'A synthetic object definition.'}
+            if required:
+                schema['required'] = required
+            return schema
+        elif kind < 0.8:
+            return {'anyOf': [reference(level) for _ in range(union_width)]}
+        elif kind < 0.9:
+            return {'type': 'array', 'items': reference(level)}
+        else:
+            return simple()
+
+    definitions = {}
+    for level, names in enumerate(levels):
+        for name in names:
+            definitions[name] = definition(level)
+
+    return {
+        'definitions': definitions,
+        'type': 'object',
+        'properties': {name.lower(): {'$ref': '#/definitions/{}'.format(name)}
+                       for name in levels[0]},
+    }
+
+
+def random_instance(schema, rootschema=None, array_length=10,
+                    optional_probability=0.5, seed=None):
+    """Generate a random instance which is valid under the schema
+
+    Only the subset of JSON schema produced by random_schema() is supported.
+
+    Parameters
+    ----------
+    schema : dict
+        The schema to generate an instance of
+    rootschema : dict, optional
+        The root schema used to resolve references (default: schema)
+    array_length : int
+        The length of each generated array
+    optional_probability : float
+        The probability with which each optional property is included
+    seed : int, optional
+        The random seed
+
+    Returns
+    -------
+    instance :
+        A JSON-compatible instance of the schema
+    """
+    rootschema = rootschema or schema
+    rand = random.Random(seed)
+
+    def generate(schema):
+        schema = resolve_references(schema, rootschema)
+        if 'anyOf' in schema:
+            return generate(rand.choice(schema['anyOf']))
+        elif 'enum' in schema:
+            return rand.choice(schema['enum'])
+        typ = schema.get('type', 'object')
+        if typ == 'object':
+            required = schema.get('required', [])
+            return {key: generate(subschema)
+                    for key, subschema in schema.get('properties', {}).items()
+                    if key in required or rand.random() < optional_probability}
+        elif typ == 'array':
+            return [generate(schema.get('items', {}))
+                    for _ in range(array_length)]
+        elif typ == 'string':
+            return rand.choice(_WORDS)
+        elif typ == 'number':
+            return rand.uniform(-100, 100)
+        elif typ == 'integer':
+            return rand.randint(-100, 100)
+        elif typ == 'boolean':
+            return rand.random() < 0.5
+        elif typ == 'null':
+            return None
+        else:
+            raise ValueError("Unsupported schema: {}".format(schema))
+
+    return generate(schema)
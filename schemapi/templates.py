@@ -0,0 +1,322 @@
+"""Precompiled spec templates with named placeholders
+
+A ``Template`` is compiled once from a tree of schema objects in which some
+values are ``Placeholder`` objects. The invariant parts of the tree are
+converted to a dict and validated at compile time; rendering a template then
+only fills in the placeholders and validates the substituted values against
+the subschemas of the properties holding them:
+
+>>> from schemapi.schemapi import SchemaBase, debug_mode
+>>> class Spec(SchemaBase):
+...     _schema = {'type': 'object',
+...                'properties': {'field': {'type': 'string'},
+...                               'size': {'type': 'integer'}}}
+>>> with debug_mode(False):
+...     spec = Spec(field=Placeholder('field'), size=10)
+>>> template = Template(spec)
+>>> template.to_dict({'field': 'price'})
+{'field': 'price', 'size': 10}
+
+Schema objects validate themselves on construction unless debug mode is
+disabled, so trees containing placeholders must be built with
+``debug_mode(False)``.
+
+A placeholder is validated against the subschema of the property of the
+nearest enclosing schema object, so constraints relating it to other parts of
+the tree (e.g. the choice of an ``anyOf`` branch of an enclosing object) are
+only checked at compile time, as far as they hold for any value.
+"""
+import re
+
+import jsonschema
+
+from . import buffers
+from . import serializers
+from .schemapi import SchemaBase, SchemaValidationError, Undefined
+
+
+class Placeholder(object):
+    """A named slot in a template
+
+    Parameters
+    ----------
+    name : string
+        The name of the placeholder. Placeholders with the same name are
+        filled with the same value.
+    default : optional
+        The value used when no value is given for the placeholder. If it is
+        Undefined (default), a value must be given. A value of Undefined
+        removes the property holding the placeholder.
+    """
+    def __init__(self, name, default=Undefined):
+        self.name = name
+        self.default = default
+
+    def __repr__(self):
+        return 'Placeholder({!r})'.format(self.name)
+
+
+def _scan(value, path, units):
+    """Collect the validation units of the schema objects within value
+
+    Returns True if a placeholder occurs within value outside of any schema
+    object.
+    """
+    if isinstance(value, Placeholder):
+        return True
+    elif isinstance(value, SchemaBase):
+        _units(value, path, units)
+        return False
+    elif isinstance(value, (list, tuple)):
+        return any([_scan(val, path + (i,), units)
+                    for i, val in enumerate(value)])
+    elif isinstance(value, dict):
+        return any([_scan(val, path + (key,), units)
+                    for key, val in value.items() if val is not Undefined])
+    return False
+
+
+def _units(obj, path, units):
+    """Collect the (path, class, schema) units validating the placeholders
+    within a schema object"""
+    cls = type(obj)
+    if obj._args and not obj._kwds:
+        if _scan(obj._args[0], path, units):
+            units.append((path, cls, cls._schema))
+        return
+    schema = cls.resolve_references(cls._schema)
+    props = schema.get('properties', {})
+    additional = schema.get('additionalProperties')
+    whole = False
+    for key, val in obj._kwds.items():
+        if val is Undefined or not _scan(val, path + (key,), units):
+            continue
+        if key in props:
+            units.append((path + (key,), cls, props[key]))
+        elif isinstance(additional, dict):
+            units.append((path + (key,), cls, additional))
+        else:
+            whole = True
+    if whole:
+        units.append((path, cls, cls._schema))
+
+
+def _slots(value, slots):
+    """Collect the placeholders within a dict representation"""
+    if isinstance(value, Placeholder):
+        slots[value.name] = value
+    elif isinstance(value, list):
+        for val in value:
+            _slots(val, slots)
+    elif isinstance(value, dict):
+        for val in value.values():
+            _slots(val, slots)
+
+
+def _lookup(dct, path):
+    """Return the value at path within dct, or Undefined if there is none"""
+    for key in path:
+        try:
+            dct = dct[key]
+        except (KeyError, IndexError, TypeError):
+            return Undefined
+    return dct
+
+
+def _copy(value):
+    """Return a copy of the lists and dicts within a JSON value"""
+    if isinstance(value, list):
+        return [_copy(val) for val in value]
+    elif isinstance(value, dict):
+        return {key: _copy(val) for key, val in value.items()}
+    return value
+
+
+def _fill(value, values):
+    """Return a copy of a dict representation with placeholders filled"""
+    if isinstance(value, Placeholder):
+        # each occurrence of a placeholder gets its own copy of the value
+        return _copy(values[value.name])
+    elif isinstance(value, list):
+        return [_fill(val, values) for val in value]
+    elif isinstance(value, dict):
+        result = {}
+        for key, val in value.items():
+            val = _fill(val, values)
+            if val is not Undefined:
+                result[key] = val
+        return result
+    return value
+
+
+def _todict(value):
+    """Return the JSON representation of a value filling a placeholder"""
+    if isinstance(value, SchemaBase):
+        return value.to_dict(validate=False)
+    elif isinstance(value, (list, tuple)):
+        return [_todict(val) for val in value]
+    elif isinstance(value, dict):
+        return {key: _todict(val) for key, val in value.items()
+                if val is not Undefined}
+    elif buffers.is_buffer(value):
+        return buffers.tolist(value)
+    return value
+
+
+def _is_placeholder_error(error, prefixes):
+    """Return True if error may not occur once the placeholders are filled
+
+    prefixes are the paths of the values validated when rendering.
+    """
+    if error.context:
+        # e.g. anyOf: the error may disappear if any branch may be valid
+        branches = {}
+        for suberror in error.context:
+            branches.setdefault(suberror.relative_schema_path[0],
+                                []).append(suberror)
+        return any(all(_is_placeholder_error(suberror, prefixes)
+                       for suberror in branch)
+                   for branch in branches.values())
+    path = tuple(error.absolute_path)
+    return any(path[:len(prefix)] == prefix for prefix in prefixes)
+
+
+# Types of values spliced into precompiled JSON
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+class Template(object):
+    """A tree of schema objects with placeholders, compiled for rendering
+
+    Parameters
+    ----------
+    obj : SchemaBase
+        The root of the tree, built with ``debug_mode(False)``
+    validate : boolean, default True
+        If True, validate the invariant parts of the tree
+
+    Raises
+    ------
+    SchemaValidationError :
+        if validate is True and the invariant parts of the tree are invalid
+    """
+    def __init__(self, obj, validate=True):
+        if not isinstance(obj, SchemaBase):
+            raise ValueError("Template root must be a schema object, "
+                             "not {!r}".format(obj))
+        self.obj = obj
+        self._dict = obj.to_dict(validate=False)
+        self._placeholders = {}
+        _slots(self._dict, self._placeholders)
+
+        units = []
+        _units(obj, (), units)
+        root_unit = ((), type(obj), type(obj)._schema)
+        # to_dict() of custom classes may restructure their output
+        self._units = [unit if _lookup(self._dict, unit[0]) is not Undefined
+                       else root_unit for unit in units]
+        self._fragments = {}
+        if validate:
+            self._validate_invariants()
+
+    @property
+    def placeholders(self):
+        """The sorted names of the placeholders of the template"""
+        return sorted(self._placeholders)
+
+    def _validate_invariants(self):
+        cls = type(self.obj)
+        schema = cls._schema
+        resolver = jsonschema.RefResolver.from_schema(cls._rootschema
+                                                      or cls._schema)
+        validator = buffers.validator_for(schema)(schema, resolver=resolver)
+        prefixes = [path for path, _, _ in self._units]
+        for error in validator.iter_errors(self._dict):
+            if not _is_placeholder_error(error, prefixes):
+                raise SchemaValidationError(self.obj, error)
+
+    def _values(self, values):
+        result = {}
+        for name, placeholder in self._placeholders.items():
+            value = values.get(name, placeholder.default)
+            if value is Undefined and name not in values:
+                raise ValueError("No value given for placeholder "
+                                 "{!r}".format(name))
+            result[name] = _todict(value)
+        return result
+
+    def _validate(self, values):
+        for path, cls, schema in self._units:
+            value = _fill(_lookup(self._dict, path), values)
+            if value is Undefined:
+                continue
+            try:
+                cls.validate(value, schema)
+            except jsonschema.ValidationError as err:
+                raise SchemaValidationError(self.obj, err)
+
+    def to_dict(self, values, validate=True):
+        """Return the dict representation with the placeholders filled
+
+        Parameters
+        ----------
+        values : dict
+            The values of the placeholders, by name. Values may be schema
+            objects.
+        validate : boolean, default True
+            If True, validate the substituted values
+
+        Returns
+        -------
+        dct : dict
+            A new dict: rendered dicts share no lists or dicts.
+        """
+        values = self._values(values)
+        if validate:
+            self._validate(values)
+        return _fill(self._dict, values)
+
+    def _compile_json(self, backend, indent, sort_keys):
+        """Split the JSON of the template around its placeholders"""
+        key = (backend, indent, sort_keys)
+        if key not in self._fragments:
+            markers = {name: '__schemapi_placeholder_{}__'.format(i)
+                       for i, name in enumerate(self.placeholders)}
+            names = {backend.dumps(marker): name
+                     for name, marker in markers.items()}
+            text = backend.dumps(_fill(self._dict, markers), indent=indent,
+                                 sort_keys=sort_keys)
+            pattern = '({})'.format('|'.join(map(re.escape, names)))
+            parts = re.split(pattern, text) if names else [text]
+            self._fragments[key] = [
+                (part if i % 2 == 0 else names[part])
+                for i, part in enumerate(parts)]
+        return self._fragments[key]
+
+    def to_json(self, values, validate=True, indent=2, sort_keys=True):
+        """Return the JSON representation with the placeholders filled
+
+        Arguments are as for to_dict(), and:
+
+        Parameters
+        ----------
+        indent : integer, default 2
+            the number of spaces of indentation to use
+        sort_keys : boolean, default True
+            if True, sort keys in the output
+
+        When all values are strings, numbers, booleans or None, the JSON is
+        assembled from fragments precompiled with the active JSON backend,
+        without serializing the invariant parts of the tree again.
+        """
+        filled = self._values(values)
+        if validate:
+            self._validate(filled)
+        backend = serializers.get_json_backend()
+        if not all(type(value) in _SCALAR_TYPES for value in filled.values()):
+            return backend.dumps(_fill(self._dict, filled), indent=indent,
+                                 sort_keys=sort_keys)
+        parts = self._compile_json(backend, indent, sort_keys)
+        dumped = {name: backend.dumps(value) for name, value in filled.items()}
+        return ''.join(part if i % 2 == 0 else dumped[part]
+                       for i, part in enumerate(parts))
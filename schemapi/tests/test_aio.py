@@ -0,0 +1,103 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+
+import jsonschema
+import pytest
+
+from .. import aio
+from .test_schemapi import MySchema
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self):
+        super(RecordingExecutor, self).__init__(max_workers=1)
+        self.threads = set()
+
+    def submit(self, fn, *args, **kwargs):
+        def record():
+            self.threads.add(threading.get_ident())
+            return fn(*args, **kwargs)
+        return super(RecordingExecutor, self).submit(record)
+
+
+class Writer(object):
+    def __init__(self):
+        self.chunks = []
+        self.drained = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+    async def drain(self):
+        self.drained += 1
+
+
+def test_async_api():
+    async def main():
+        obj = await MySchema.from_json_async(json.dumps(DCT))
+        spec = await obj.to_json_async()
+        await MySchema.validate_async(DCT)
+        with pytest.raises(jsonschema.ValidationError):
+            await MySchema.validate_async({'a': 'not a mapping'})
+        return obj, spec
+
+    executor = RecordingExecutor()
+    with executor, aio.use_executor(executor):
+        obj, spec = asyncio.run(main())
+    assert aio.get_executor() is None
+    assert obj.to_dict() == DCT
+    assert json.loads(spec) == DCT
+    assert executor.threads and threading.get_ident() not in executor.threads
+
+
+def test_async_streams(monkeypatch):
+    monkeypatch.setattr(aio, 'CHUNK_SIZE', 16)
+    data = json.dumps(DCT).encode('utf-8')
+
+    async def chunks():
+        for i in range(0, len(data), 10):
+            yield data[i:i + 10]
+
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        obj1 = await MySchema.from_json_async(reader)
+        obj2 = await MySchema.from_json_async(chunks())
+
+        writer = Writer()
+        assert await obj1.to_json_async(stream=writer) is None
+        return obj1, obj2, writer
+
+    obj1, obj2, writer = asyncio.run(main())
+    assert obj1.to_dict() == obj2.to_dict() == DCT
+    payload = b''.join(writer.chunks)
+    assert json.loads(payload) == DCT
+    assert max(len(chunk) for chunk in writer.chunks) == 16
+    assert writer.drained == len(writer.chunks)
+
+
+def test_thread_safety():
+    from .. import instrumentation, profiling, schemapi
+
+    obj = MySchema.from_dict(DCT)
+    with instrumentation.instrument() as stats, \
+            profiling.profile_validation() as profile, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        copies = list(executor.map(lambda _: obj.copy(), range(200)))
+        list(executor.map(lambda _: MySchema.validate(DCT), range(200)))
+        # copying in one thread does not disable validation in others
+        with schemapi._skip_validation():
+            future = executor.submit(MySchema, a='not a mapping')
+            with pytest.raises(jsonschema.ValidationError):
+                future.result()
+    assert schemapi.DEBUG_MODE is True
+    assert all(copy.to_dict() == DCT for copy in copies)
+    assert stats[MySchema, 'copy'].calls == 200
+    # two per validation of DCT, and one for the invalid object
+    assert profile.keywords['#/definitions/StringMapping', 'type'].calls == 401
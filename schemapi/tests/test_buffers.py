@@ -0,0 +1,88 @@
+import array
+import json
+
+import jsonschema
+import pytest
+
+from .. import buffers
+from .test_schemapi import _TestSchema
+
+
+class Data(_TestSchema):
+    _schema = {
+        'type': 'object',
+        'properties': {
+            'values': {'type': 'array', 'items': {'type': 'number'}},
+            'counts': {'type': 'array', 'items': {'type': 'integer'}},
+            'name': {'type': 'string'},
+        },
+        'additionalProperties': False,
+    }
+
+
+def test_is_buffer():
+    assert buffers.is_buffer(memoryview(b'abc'))
+    assert buffers.is_buffer(array.array('i', [1, 2]))
+    assert not buffers.is_buffer([1, 2])
+    assert not buffers.is_buffer((1, 2))
+    assert not buffers.is_buffer(b'abc')
+    assert not buffers.is_buffer('abc')
+
+
+def test_register_buffer_type():
+    class Column(object):
+        def __init__(self, values):
+            self.values = values
+
+        def tolist(self):
+            return list(self.values)
+
+    assert not buffers.is_buffer(Column([1]))
+    buffers.register_buffer_type(Column)
+    try:
+        assert buffers.is_buffer(Column([1]))
+        obj = Data(values=Column([1.5, 2.5]))
+        assert obj.to_dict() == {'values': [1.5, 2.5]}
+    finally:
+        buffers._BUFFER_TYPES = tuple(cls for cls in buffers._BUFFER_TYPES
+                                      if cls is not Column)
+
+
+def test_buffer_roundtrip():
+    values = array.array('d', [0.5, 1.5, 2.5])
+    counts = memoryview(array.array('q', [1, 2, 3]))
+    obj = Data(values=values, counts=counts, name='data')
+    dct = obj.to_dict()
+    assert dct == {'values': [0.5, 1.5, 2.5], 'counts': [1, 2, 3],
+                   'name': 'data'}
+    assert type(dct['values']) is list
+
+    # copies share buffers rather than copying them
+    assert obj.copy().values is values
+    assert obj.copy(deep=False).counts is counts
+
+    # from_dict stores buffers as is
+    new_obj = Data.from_dict({'values': values, 'counts': counts})
+    assert new_obj.values is values
+    assert new_obj.counts is counts
+    assert json.loads(new_obj.to_json()) == {'counts': [1, 2, 3],
+                                             'values': [0.5, 1.5, 2.5]}
+
+    with pytest.raises(jsonschema.ValidationError):
+        Data.from_dict({'counts': array.array('d', [0.5])})
+
+
+def test_numpy_buffers():
+    np = pytest.importorskip('numpy')
+    values = np.linspace(0, 1, 5)
+    counts = np.arange(4)
+    assert buffers.is_buffer(values)
+
+    obj = Data.from_dict({'values': values, 'counts': counts})
+    assert obj.values is values
+    assert obj.to_dict() == {'values': values.tolist(),
+                             'counts': [0, 1, 2, 3]}
+    assert obj.copy().counts is counts
+
+    with pytest.raises(jsonschema.ValidationError):
+        Data.from_dict({'counts': np.array(['a', 'b'])})
@@ -0,0 +1,133 @@
+import threading
+import weakref
+
+import jsonschema
+import pytest
+
+from .. import caching
+from ..caching import ValidationCache
+from .test_schemapi import MySchema, StringArray
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+class Clock(object):
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+def test_disabled_by_default():
+    assert caching.get_validation_cache() is None
+
+
+def test_cached_validation(monkeypatch):
+    calls = []
+    original = jsonschema.validate
+    monkeypatch.setattr(jsonschema, 'validate',
+                        lambda *args, **kwds: calls.append(1) or
+                        original(*args, **kwds))
+    with caching.cached_validation() as cache:
+        assert caching.get_validation_cache() is cache
+        MySchema.validate(DCT)
+        MySchema.validate({'d': ['x', 'y', 'z'], 'b': ['a', 'b', 'c'],
+                           'a': {'foo': 'bar'}})
+        assert len(calls) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        for _ in range(2):
+            with pytest.raises(jsonschema.ValidationError):
+                StringArray.validate(['a', 1])
+        assert len(calls) == 2
+        assert StringArray.is_valid(['a', 'b'])
+        assert not StringArray.is_valid(['a', 1])
+        assert cache.hit_rate == 0.5
+    assert caching.get_validation_cache() is None
+    MySchema.validate(DCT)
+    assert len(calls) == 3
+
+
+def test_keys():
+    cache = ValidationCache()
+    schema = {'type': 'number'}
+    key = cache.key({'a': 1, 'b': 2}, schema, schema)
+    assert key == cache.key({'b': 2, 'a': 1}, schema, schema)
+    assert key != cache.key({'a': 1, 'b': 2}, {'type': 'number'}, schema)
+    assert key != cache.key({'a': 1.0, 'b': 2}, schema, schema)
+    assert cache.key({'a': object()}, schema, schema) is None
+
+    # values which validate differently have different keys, or none
+    assert key != cache.key({'a': True, 'b': 2}, schema, schema)
+    assert cache.key([float('nan')], schema, schema) is None
+    assert cache.key({1: 'a'}, schema, schema) is None
+    assert cache.key((1, 2), schema, schema) is None
+    assert cache.key(['a', 'b'], schema, schema) != \
+        cache.key(['ab'], schema, schema)
+
+
+def test_lossless_keys():
+    class Numbers(MySchema):
+        _schema = {'type': 'array', 'items': {'type': 'number'}}
+
+    with caching.cached_validation():
+        Numbers.validate([float('nan')])
+        with pytest.raises(jsonschema.ValidationError):
+            Numbers.validate([None])
+        assert not Numbers.is_valid([None])
+
+
+def test_entries_hold_schemas():
+    class Schema(dict):
+        pass
+
+    cache = ValidationCache(maxsize=1)
+    schema = Schema(type='number')
+    ref = weakref.ref(schema)
+    cache.validate(1, schema, schema, lambda *args: None)
+    del schema
+    assert ref() is not None
+    cache.validate(1, {}, {}, lambda *args: None)
+    assert ref() is None
+
+
+def test_lru_and_ttl():
+    clock = Clock()
+    cache = ValidationCache(maxsize=2, ttl=10, clock=clock)
+    cache.put('a', None)
+    cache.put('b', None)
+    assert cache.get('a') is None
+    cache.put('c', None)
+    assert cache.evictions == 1
+    assert cache.get('b') is caching._MISSING
+    assert len(cache) == 2
+
+    clock.time = 10
+    assert cache.get('a') is caching._MISSING
+    assert cache.expirations == 1
+    assert len(cache) == 1
+
+    cache.clear()
+    assert (len(cache), cache.hits, cache.misses) == (0, 0, 0)
+    with pytest.raises(ValueError):
+        ValidationCache(maxsize=0)
+
+
+def test_thread_safety():
+    cache = ValidationCache(maxsize=50)
+
+    def work(offset):
+        for i in range(1000):
+            key = (offset + i) % 100
+            if cache.get(key) is caching._MISSING:
+                cache.put(key, None)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) == 50
+    assert cache.hits + cache.misses == 8000
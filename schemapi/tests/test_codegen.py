@@ -1,5 +1,10 @@
+import importlib.util
+
 import pytest
-from schemapi import SchemaBase, SchemaModuleGenerator
+from schemapi import SchemaBase, SchemaInfo, SchemaModuleGenerator, Undefined
+from schemapi.codegen import (ConstantPool, SchemaClassGenerator, SignatureTable,
+                              import_cached)
+from schemapi.schemastore import write_schema
 
 
 @pytest.fixture
@@ -60,4 +65,200 @@ def test_dynamic_module(schema):
     dct = family.to_dict()
     assert dct == {'family_name': 'Smith', 'people': [{'name': 'Alice', 'age': 25}, {'name': 'Bob', 'age': 26}]}
     family2 = Family.from_dict(dct)
-    assert family2.to_dict() == dct
\ No newline at end of file
+    assert family2.to_dict() == dct
+
+def test_signature_table():
+    schema = {
+        'definitions': {
+            'Base': {
+                'type': 'object',
+                'properties': {'a': {'type': 'string'},
+                               'for': {'type': 'string'}},
+                'required': ['a']
+            },
+            'Child1': {'allOf': [{'$ref': '#/definitions/Base'},
+                                 {'properties': {'b': {'type': 'integer'}}}]},
+            'Child2': {'allOf': [{'$ref': '#/definitions/Base'},
+                                 {'properties': {'c': {'type': 'integer'}}}]},
+        }
+    }
+    table = SignatureTable()
+    definitions = schema['definitions']
+    child1 = SchemaInfo(definitions['Child1'], schema)
+    child2 = SchemaInfo(definitions['Child2'], schema)
+
+    args = table[child1]
+    assert args.nonkeyword is False
+    assert args.required == {'a'}
+    assert args.kwds == {'b'}
+    assert args.invalid_kwds == {'for'}
+    assert args.additional is True
+    size = len(table)
+
+    # The shared Base parent is only computed once
+    assert table[child2].kwds == {'c'}
+    assert len(table) == size + 2
+    assert table[SchemaInfo(definitions['Child1'], schema)] is args
+
+    gen = SchemaClassGenerator('Child1', definitions['Child1'], schema,
+                               signature_table=table)
+    assert 'a=Undefined, b=Undefined' in gen.init_code()
+    assert len(table) == size + 2
+
+
+def test_import_cached(schema, tmp_path, monkeypatch):
+    mod1 = import_cached(schema, 'testmod_cached1', root_name='Family',
+                         cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # A warm cache neither regenerates nor revalidates the module
+    def fail(*args, **kwargs):
+        raise AssertionError("module regenerated")
+    monkeypatch.setattr(SchemaModuleGenerator, 'module_code', fail)
+    monkeypatch.setattr(SchemaModuleGenerator, '_validate', fail)
+    mod2 = import_cached(schema, 'testmod_cached2', root_name='Family',
+                         cache_dir=tmp_path)
+    assert mod2.Family._schema == mod1.Family._schema
+    family = mod2.Family(family_name='Smith', people=[mod2.Person(name='Alice')])
+    assert family.to_dict() == {'family_name': 'Smith', 'people': [{'name': 'Alice'}]}
+
+    from testmod_cached2 import Person
+    assert Person is mod2.Person
+
+
+def test_import_as_cache_dir(schema, tmp_path):
+    gen = SchemaModuleGenerator(schema, root_name='Family')
+    mod1 = gen.import_as('testmod_cache_dir1', cache_dir=tmp_path)
+    (path,) = tmp_path.iterdir()
+    mtime = path.stat().st_mtime_ns
+    mod2 = gen.import_as('testmod_cache_dir2', cache_dir=tmp_path)
+    assert path.stat().st_mtime_ns == mtime
+    assert mod1.Family._schema == mod2.Family._schema == schema
+
+    # corrupt cache files are regenerated
+    path.write_bytes(b'garbage')
+    mod3 = gen.import_as('testmod_cache_dir3', cache_dir=tmp_path)
+    assert mod3.Family._schema == schema
+
+
+def test_schema_file(schema, tmp_path):
+    schema_file = tmp_path / 'schema.json'
+    gen = SchemaModuleGenerator(schema, root_name='Family',
+                                schema_file=schema_file)
+    # the schema file is written when the code is generated
+    code = gen.module_code()
+    assert 'load_schema(' in code
+    assert "'family_name'" not in code
+    assert schema_file.exists()
+
+    # and rewritten if it holds another schema
+    write_schema({'type': 'string'}, schema_file)
+    mod1 = gen.import_as('testmod_schema_file1', add_to_sys_modules=False)
+    assert mod1.Family._schema == schema
+
+    # written modules refer to the schema file relative to themselves
+    module_dir = tmp_path / 'package'
+    module_dir.mkdir()
+    gen.write_module(module_dir / 'family.py')
+    code = (module_dir / 'family.py').read_text()
+    assert str(tmp_path) not in code
+    spec = importlib.util.spec_from_file_location('testmod_schema_file_written',
+                                                  module_dir / 'family.py')
+    written = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(written)
+    assert written.Family._schema == schema
+
+    mod2 = gen.import_as('testmod_schema_file2', add_to_sys_modules=False)
+    assert mod1.Family._schema is mod2.Family._schema
+    assert mod1.Person._rootschema is mod1.Family._schema
+    family = mod1.Family(family_name='Smith', people=[mod1.Person(name='Alice')])
+    assert family.to_dict() == {'family_name': 'Smith', 'people': [{'name': 'Alice'}]}
+
+    # the schema file is part of the cache key
+    gen.import_as('testmod_schema_file3', add_to_sys_modules=False,
+                  cache_dir=tmp_path / 'cache')
+    SchemaModuleGenerator(schema, root_name='Family').import_as(
+        'testmod_schema_file4', add_to_sys_modules=False,
+        cache_dir=tmp_path / 'cache')
+    assert len(list((tmp_path / 'cache').iterdir())) == 2
+
+
+def test_include():
+    schema = {
+        'definitions': {
+            'Person': {'properties': {'name': {'$ref': '#/definitions/Name'},
+                                      'pet': {'$ref': '#/definitions/Pet'}}},
+            'Name': {'type': 'string'},
+            'Pet': {'properties': {'owner': {'$ref': '#/definitions/Person'}}},
+            'Company': {'properties': {'name': {'$ref': '#/definitions/Name'}}},
+        },
+        'properties': {
+            'people': {'type': 'array',
+                       'items': {'$ref': '#/definitions/Person'}},
+        },
+    }
+    gen = SchemaModuleGenerator(schema, root_name='Root', include=['Pet'])
+    assert list(gen.schema['definitions']) == ['Person', 'Name', 'Pet']
+    assert gen.schema['properties'] == schema['properties']
+    mod = gen.import_as('testmod_include', add_to_sys_modules=False)
+    assert not hasattr(mod, 'Company')
+    pet = mod.Pet(owner=mod.Person(name='Alice'))
+    assert pet.to_dict() == {'owner': {'name': 'Alice'}}
+    root = mod.Root.from_dict({'people': [{'name': 'Bob'}]})
+    assert isinstance(root.people[0], mod.Person)
+
+    # the root schema references a definition which is not included
+    gen = SchemaModuleGenerator(schema, root_name='Root', include=['Company'])
+    assert gen.schema == {'definitions': {
+        'Name': schema['definitions']['Name'],
+        'Company': schema['definitions']['Company']}}
+
+    with pytest.raises(ValueError):
+        SchemaModuleGenerator(schema, include=['Missing'])
+
+
+def test_share_constants(tmp_path):
+    name = {'type': 'string', 'description': 'A name'}
+    schema = {
+        'definitions': {
+            'Person': {'properties': {'first': name, 'last': dict(name)}},
+            '_SCHEMA_0': {'type': 'array', 'items': dict(name)},
+        },
+        'properties': {'name': dict(name), 'short': {'type': 'string'}},
+    }
+    code = SchemaModuleGenerator(schema).module_code()
+    assert code.count("'A name'") == 1
+    assert "_SCHEMA_1 = {'description': 'A name', 'type': 'string'}" in code
+    mod = SchemaModuleGenerator(schema).import_as('testmod_constants',
+                                                  add_to_sys_modules=False)
+    assert mod.Root._schema == schema
+    props = mod.Root._schema['definitions']['Person']['properties']
+    assert props['first'] is props['last'] is mod.Root._schema['properties']['name']
+    assert mod.Person(first='a').to_dict() == {'first': 'a'}
+
+    code = SchemaModuleGenerator(schema, share_constants=False).module_code()
+    assert code.count("'A name'") == 4
+    assert '_SCHEMA_1' not in code
+
+    # the option is part of the cache key
+    for share_constants in [True, False]:
+        gen = SchemaModuleGenerator(schema, share_constants=share_constants)
+        mod = gen.import_as('testmod_constants', add_to_sys_modules=False,
+                            cache_dir=tmp_path)
+        assert hasattr(mod, '_SCHEMA_1') == share_constants
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_constant_pool():
+    schema = {'properties': {'a': {'type': 'string', 'minLength': 1},
+                             'b': {'type': 'string', 'minLength': 1}}}
+    pool = ConstantPool(prefix='_C')
+    pool.add(schema)
+    code = SchemaClassGenerator('Foo', schema, constants=pool).schema_class()
+    code = pool.code() + '\n' + code
+    assert code.count('minLength') == 1
+
+    namespace = {'SchemaBase': SchemaBase, 'Undefined': Undefined}
+    exec(code, namespace)
+    assert namespace['Foo']._schema == schema
+    assert namespace['Foo'](a='x').to_dict() == {'a': 'x'}
@@ -1,5 +1,7 @@
 import inspect
 
+import pytest
+
 from .. import SchemaBase, Undefined, schemaclass
 
 @schemaclass
@@ -55,3 +57,46 @@ def test_stringarray_decorator():
     assert argspec.args == ['self']
     assert argspec.varargs == 'args'
     assert argspec.keywords is None
+
+
+def test_lazy_docstring():
+    @schemaclass
+    class Lazy(SchemaBase):
+        _schema = {'type': 'string', 'pattern': '^lazy'}
+
+    assert type(Lazy.__dict__['__doc__']).__name__ == '_LazyDocstring'
+    assert Lazy.__doc__.startswith('Lazy schema wrapper')
+    assert Lazy('lazy foo').__doc__ == Lazy.__doc__
+    assert inspect.getdoc(Lazy).startswith('Lazy schema wrapper')
+
+
+def test_shared_init_factory():
+    @schemaclass
+    class First(SchemaBase):
+        _schema = {'properties': {'x': {'type': 'string'}},
+                   'additionalProperties': {'type': 'string'}}
+
+    @schemaclass
+    class Second(SchemaBase):
+        _schema = {'properties': {'x': {'type': 'integer'}},
+                   'additionalProperties': {'type': 'integer'}}
+
+    assert First.__init__.__code__ is Second.__init__.__code__
+    assert First.__init__.__qualname__.endswith('First.__init__')
+    assert str(inspect.signature(First.__init__)) == "(self, x=Undefined, **kwds)"
+    assert First(x='a').to_dict() == {'x': 'a'}
+    assert Second(x=1).to_dict() == {'x': 1}
+
+
+def test_property_names_shadowing_class():
+    @schemaclass
+    class C(SchemaBase):
+        _schema = {'properties': {'cls': {'type': 'string'},
+                                  'a': {'type': 'string'}}}
+
+    assert C(cls='x', a='y').to_dict() == {'cls': 'x', 'a': 'y'}
+
+    with pytest.raises(ValueError):
+        @schemaclass
+        class Reserved(SchemaBase):
+            _schema = {'properties': {'__class_': {'type': 'string'}}}
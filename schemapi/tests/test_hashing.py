@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+from .. import hashing
+from ..hashing import digest
+from ..schemapi import Undefined
+from .test_schemapi import MySchema, StringArray, StringMapping
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+def test_digest_values():
+    assert len(digest(DCT)) == 16
+    assert digest({'a': 1, 'b': 2}) == digest({'b': 2, 'a': 1})
+    assert digest([1, 2]) == digest((1, 2)) == digest([1.0, 2])
+    assert digest({'a': 1, 'b': Undefined}) == digest({'a': 1})
+    assert len({digest(val) for val in
+                (1, '1', None, 1.5, [1], {'1': 1}, ['1'], [[1]])}) == 8
+    assert digest(['ab', 'c']) != digest(['a', 'bc'])
+    # values which compare equal have equal digests
+    assert digest(True) == digest(1) == digest(1.0) == digest(Decimal(1))
+    assert digest({1: 'a', '1': 'b'}) == digest({'1': 'b', 1.0: 'a'})
+
+
+def test_digest_objects():
+    obj1 = MySchema.from_dict(DCT)
+    obj2 = MySchema(a=StringMapping(foo='bar'),
+                    b=StringArray(['a', 'b', 'c']),
+                    d=StringArray(['x', 'y', 'z']))
+    assert digest(obj1) == digest(obj2)
+    assert digest(obj1) != digest(DCT)
+    assert digest(StringArray(['a'])) != digest(MySchema(['a']))
+    # objects holding lists or dicts are not cached
+    assert hashing.is_cached(obj1._kwds['a'])
+    assert not hashing.is_cached(obj1._kwds['b'])
+    assert not hashing.is_cached(obj1)
+
+
+def test_invalidation():
+    obj = MySchema.from_dict(DCT)
+    original = digest(obj)
+
+    obj.a.foo = 'baz'
+    assert not hashing.is_cached(obj.a)
+    assert digest(obj) != original
+    obj.a.foo = 'bar'
+    assert digest(obj) == original
+
+    obj = MySchema.from_dict({'b2': [1, 2]})
+    original = digest(obj)
+    obj.b2.append(3)
+    assert digest(obj) != original
+
+    obj = MySchema.from_dict(DCT)
+    original = digest(obj)
+    obj.apply_patch([{'op': 'replace', 'path': '/a/foo', 'value': 'x'}])
+    assert obj.a.foo == 'x'
+    assert digest(obj) != original
+
+
+def test_eq_and_hash():
+    obj1 = MySchema.from_dict(DCT)
+    obj2 = MySchema.from_dict(DCT)
+    assert obj1 == obj2
+    assert hash(obj1) == hash(obj2)
+    assert len({obj1, obj2, obj1.copy()}) == 1
+    assert {obj1: 'value'}[obj2] == 'value'
+
+    # equality is that of the arguments
+    assert MySchema(c=1) == MySchema(c=1.0)
+    assert hash(MySchema(c=1)) == hash(MySchema(c=1.0))
+    assert MySchema(c=1, d=Undefined) != MySchema(c=1)
+    assert StringArray(['a']) != MySchema(['a'])
+
+    obj2.c = 'new'
+    assert obj1 != obj2
+
+
+def test_eq_after_modification_in_place():
+    obj1 = MySchema(b2=[1, 2])
+    inner = obj1.b2
+    obj2 = MySchema(b2=[1, 2])
+    assert obj1 == obj2
+    inner.append(3)
+    assert obj1 != obj2
+    assert obj2 not in {obj1}
+
+    values = [1, 2]
+    obj1 = MySchema(b2=values)
+    assert obj1 == obj2
+    values.append(3)
+    assert obj1 != obj2
+    assert obj2 not in {obj1}
+
+    # a child which holds no list or dict keeps its digest cached; its
+    # parent sees its changes
+    obj1 = MySchema.from_dict(DCT)
+    obj2 = MySchema.from_dict(DCT)
+    assert hash(obj1) == hash(obj2)
+    child = obj1.a
+    child.foo = 'changed'
+    assert obj1 != obj2
+    assert hash(obj1) != hash(obj2)
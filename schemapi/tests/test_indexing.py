@@ -0,0 +1,87 @@
+import pytest
+
+from .. import interning
+from ..indexing import TypeIndex, index_of
+from ..schemapi import SchemaBase
+from .test_schemapi import MySchema, StringArray, StringMapping
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+def test_from_dict_index():
+    obj = MySchema.from_dict(DCT, index=True)
+    index = index_of(obj)
+    assert isinstance(index, TypeIndex)
+    assert len(index) == 4
+    assert [path for path, _ in index.items(StringArray)] == [('b',), ('d',)]
+    assert index.find(StringMapping) == [obj._kwds['a']]
+    assert index.find(SchemaBase, subclasses=False) == []
+    assert len(index.find(SchemaBase)) == 4
+    assert index.at(('d',)) == [obj._kwds['d']]
+    assert index_of(MySchema.from_dict(DCT)) is None
+
+
+def test_incremental_updates():
+    obj = MySchema.from_dict(DCT, index=True)
+    index = index_of(obj)
+    old = obj._kwds['b']
+
+    obj.b = StringMapping(foo='baz')
+    obj['a'] = StringArray(['q'])
+    obj.c = 'x'
+    assert not index._stale
+    assert index.find(StringArray) == [obj._kwds['d'], obj._kwds['a']]
+    assert [path for path, _ in index.items(StringMapping)] == [('b',)]
+    assert index_of(old) is None
+
+    # detached objects no longer update the index
+    old.extra = StringMapping(foo='x')
+    assert index.at(('b', 'extra')) == []
+
+    nested = MySchema(a=StringMapping(foo='y'))
+    obj.c = [nested]
+    assert index.at(('c', 0, 'a')) == [nested._kwds['a']]
+    nested.b = StringArray(['z'])
+    assert index.at(('c', 0, 'b')) == [nested._kwds['b']]
+    assert not index._stale
+
+
+def test_stale_index():
+    obj = MySchema.from_dict({'x': []}, index=True)
+    index = index_of(obj)
+    obj.x.append(StringArray(['a']))
+    assert index._stale
+    assert index.at(('x', 0)) == [obj._kwds['x'][0]]
+
+    obj.apply_patch([{'op': 'add', 'path': '/b', 'value': ['x']}])
+    assert [path for path, _ in index.items(StringArray)] == [('x', 0), ('b',)]
+
+
+def test_aliased_objects():
+    shared = StringMapping(foo='bar')
+    obj = MySchema(a=shared, d=shared)
+    index = TypeIndex(obj)
+    assert [path for path, _ in index.items(StringMapping)] == [('a',), ('d',)]
+    shared.other = StringMapping(foo='x')
+    assert index.at(('a', 'other')) == index.at(('d', 'other'))
+    assert len(index.at(('d', 'other'))) == 1
+
+
+def test_objects_moving_between_indexes():
+    shared = StringMapping(foo='bar')
+    index1 = TypeIndex(MySchema(a=shared))
+    index2 = TypeIndex(MySchema(d=shared))
+    assert index1._stale
+    shared.sub = StringMapping(foo='x')
+    assert index1.at(('a', 'sub')) == [shared._kwds['sub']]
+    assert len(index1) == 3
+    assert index2.at(('d', 'sub')) == [shared._kwds['sub']]
+    assert len(index2) == 3
+
+
+def test_interned_trees():
+    with interning.interning():
+        obj = MySchema.from_dict(DCT)
+    with pytest.raises(ValueError):
+        TypeIndex(obj)
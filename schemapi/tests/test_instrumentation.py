@@ -0,0 +1,69 @@
+import jsonschema
+import pytest
+
+from .. import instrumentation
+from ..instrumentation import CallStats, instrument
+from .test_schemapi import MySchema, StringArray, StringMapping
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+def test_disabled_by_default():
+    assert instrumentation.get_stats() is None
+    MySchema.from_dict(DCT).to_dict()
+    assert instrumentation.get_stats() is None
+
+
+def test_instrument():
+    obj = MySchema.from_dict(DCT)
+    with instrument() as stats:
+        assert instrumentation.get_stats() is stats
+        obj.to_dict()
+        MySchema.from_dict(DCT)
+        json_str = obj.to_json()
+        obj.copy()
+    assert instrumentation.get_stats() is None
+
+    # from_dict constructs objects in debug mode, which calls to_dict
+    assert stats[MySchema, 'to_dict'].calls == 3
+    assert stats[StringArray, 'to_dict'].calls == 8
+    assert stats[MySchema, 'from_dict'].calls == 1
+    # three from to_dict and one from from_dict
+    assert stats[MySchema, 'validate'].calls == 4
+    # two anyOf branches tried
+    assert stats[MySchema, 'is_valid'].calls == 2
+    assert stats[MySchema, 'copy'].calls == 1
+    assert stats[MySchema, 'to_json'].nbytes == len(json_str.encode('utf-8'))
+    assert stats[StringMapping, 'get_constructor'].calls == 2
+    assert stats[StringArray, 'get_constructor'].calls == 2
+    assert stats[MySchema, 'to_dict'].time > 0
+
+    by_class = stats.by_class()
+    assert by_class[MySchema].calls == 12
+    by_operation = stats.by_operation()
+    assert by_operation['to_dict'].calls == 15
+    assert stats.top(1)[0][0][0] is MySchema
+    assert 'test_schemapi.MySchema' in stats.report()
+
+    # unknown entries are empty
+    assert stats[StringMapping, 'copy'] == CallStats()
+
+
+def test_failed_calls_are_recorded():
+    with instrument() as stats:
+        with pytest.raises(jsonschema.ValidationError):
+            MySchema.validate({'a': 4})
+    assert stats[MySchema, 'validate'].calls == 1
+
+
+def test_enable_disable():
+    stats = instrumentation.enable_instrumentation()
+    try:
+        MySchema.validate(DCT)
+    finally:
+        assert instrumentation.disable_instrumentation() is stats
+    MySchema.validate(DCT)
+    assert stats[MySchema, 'validate'].calls == 1
+    stats.reset()
+    assert len(stats) == 0
@@ -0,0 +1,136 @@
+import gc
+
+import pytest
+
+from .. import interning
+from ..interning import InternTable
+from .test_schemapi import MySchema, StringArray, StringMapping
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+def test_disabled_by_default():
+    assert interning.get_intern_table() is None
+    obj = MySchema.from_dict(DCT)
+    assert obj._canonical is None
+
+
+def test_interning():
+    with interning.interning() as table:
+        assert interning.get_intern_table() is table
+        obj1 = MySchema.from_dict(DCT)
+        obj2 = MySchema.from_dict(DCT)
+        obj3 = MySchema(a=StringMapping(foo='bar'),
+                        b=StringArray(['a', 'b', 'c']),
+                        d=StringArray(['x', 'y', 'z']))
+    assert interning.get_intern_table() is None
+
+    assert obj1 is not obj2
+    assert obj1._kwds is obj2._kwds
+    assert obj3._canonical is obj1._canonical
+    assert obj1.to_dict() == obj3.to_dict() == DCT
+    assert obj1 == obj2
+    # one MySchema, one StringMapping and two StringArray canonical objects
+    assert len(table) == 4
+    assert table.misses == 4
+
+    other = MySchema(a=StringMapping(foo='bar'),
+                     b=StringArray(['a', 'b', 'c']),
+                     d=StringArray(['x', 'y', 'z']))
+    assert other._canonical is None
+    assert InternTable().canonical(other) is not obj1._canonical
+
+
+def test_shared_subtrees():
+    with interning.interning() as table:
+        objs = [MySchema.from_dict({'a': {'foo': 'bar'}, 'c': i})
+                for i in range(10)]
+    canonical_a = {id(obj._kwds['a']) for obj in objs}
+    assert len(canonical_a) == 1
+    assert len(table) == 11
+
+
+def test_copy_on_write():
+    with interning.interning():
+        obj1 = MySchema.from_dict(DCT)
+        obj2 = MySchema.from_dict(DCT)
+
+    canonical = obj2._canonical
+    assert obj2.copy(deep=False)._canonical is canonical
+    assert obj2.copy().to_dict() == DCT
+
+    obj1.a['foo'] = 'changed'
+    obj1.b = ['new']
+    assert obj1._canonical is None
+    assert obj1.to_dict() == {'a': {'foo': 'changed'}, 'b': ['new'],
+                              'd': ['x', 'y', 'z']}
+    assert obj2.to_dict() == DCT
+    assert obj2._canonical is canonical
+
+    # reading a child does not unshare its parent, until the child is
+    # modified
+    child = obj2.a
+    assert child is obj2['a']
+    assert child is not canonical._kwds['a']
+    assert child == canonical._kwds['a']
+    assert obj2._canonical is canonical
+    child.foo = 'changed'
+    assert obj2._canonical is None
+    assert obj2.a is child
+    assert obj2.to_dict()['a'] == {'foo': 'changed'}
+    assert MySchema.from_dict(DCT).to_dict() == DCT
+
+    # reading a list takes a private copy, which may be modified
+    with interning.interning():
+        obj3 = MySchema.from_dict({'b2': [1, 2]})
+    obj3.b2.append(3)
+    assert obj3._canonical is None
+    assert obj3.to_dict() == {'b2': [1, 2, 3]}
+
+    # the shared state cannot be modified directly
+    obj4 = interning.shell(canonical)
+    with pytest.raises(ValueError):
+        obj4._kwds['c'] = 1
+    with pytest.raises(ValueError):
+        obj4._kwds['b']._args[0].append('d')
+    assert obj4.to_dict() == DCT
+
+    # canonical objects cannot be modified
+    with pytest.raises(ValueError):
+        canonical.c = 1
+    with pytest.raises(ValueError):
+        canonical['c'] = 1
+
+
+def test_patch_interned():
+    with interning.interning():
+        obj1 = MySchema.from_dict(DCT)
+        obj2 = MySchema.from_dict(DCT)
+    obj1.apply_patch([{'op': 'replace', 'path': '/a/foo', 'value': 'x'}])
+    assert obj1.a.foo == 'x'
+    assert obj2.to_dict() == DCT
+
+
+def test_table_is_weak():
+    table = InternTable()
+    with interning.interning(table):
+        obj = MySchema.from_dict({'a': {'foo': 'weak'}})
+    assert len(table) == 2
+    del obj
+    gc.collect()
+    assert len(table) == 0
+
+
+def test_key_distinguishes_types():
+    with interning.interning():
+        objs = [MySchema(c=val) for val in (1, 1.0, '1', 0.0, -0.0)]
+    assert len({id(obj._canonical) for obj in objs}) == 5
+    assert [repr(obj.to_dict()['c']) for obj in objs] == \
+        ['1', '1.0', "'1'", '0.0', '-0.0']
+
+    with interning.interning():
+        objs = [MySchema(a2={key: 1}) for key in (1, True, 1.0)]
+    assert len({id(obj._canonical) for obj in objs}) == 3
+    assert [repr(obj.to_dict(validate=False)['a2']) for obj in objs] == \
+        ['{1: 1}', '{True: 1}', '{1.0: 1}']
@@ -0,0 +1,132 @@
+import copy
+
+import pytest
+
+from .. import hashing
+from .. import interning
+from ..indexing import index_of
+from ..patch import apply_patch, diff
+from ..schemapi import Undefined
+from ..synthetic import random_instance, random_schema
+from .test_schemapi import MySchema, StringArray, StringMapping
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z']}
+
+
+def test_diff():
+    obj = MySchema.from_dict(DCT)
+    assert obj.diff(obj) == []
+    assert obj.diff(obj.copy()) == []
+
+    other = obj.copy()
+    other.a = StringMapping(foo='baz', new='value')
+    other.b = ['a', 'c']
+    other.c = 'x/y'
+    del other._kwds['d']
+    assert obj.diff(other) == [
+        {'op': 'replace', 'path': '/a/foo', 'value': 'baz'},
+        {'op': 'add', 'path': '/a/new', 'value': 'value'},
+        {'op': 'replace', 'path': '/b/1', 'value': 'c'},
+        {'op': 'remove', 'path': '/b/2'},
+        {'op': 'remove', 'path': '/d'},
+        {'op': 'add', 'path': '/c', 'value': 'x/y'},
+    ]
+    assert diff({'a/b': 1}, {'a/b': 2}) == [
+        {'op': 'replace', 'path': '/a~1b', 'value': 2}]
+    assert diff([1], [1.0]) == [{'op': 'replace', 'path': '/0', 'value': 1.0}]
+    assert diff(1, 'a') == [{'op': 'replace', 'path': '', 'value': 'a'}]
+
+
+def test_diff_skips_identical_subtrees():
+    class Exploding(object):
+        def __eq__(self, other):
+            raise AssertionError("compared")
+
+    shared = Exploding()
+    assert diff({'a': shared, 'b': 1}, {'a': shared, 'b': 2}) == [
+        {'op': 'replace', 'path': '/b', 'value': 2}]
+
+
+def test_apply_patch():
+    obj = MySchema.from_dict(DCT)
+    a = obj.a
+    obj.apply_patch([
+        {'op': 'replace', 'path': '/a/foo', 'value': 'baz'},
+        {'op': 'add', 'path': '/b/1', 'value': 'inserted'},
+        {'op': 'add', 'path': '/b/-', 'value': 'last'},
+        {'op': 'remove', 'path': '/d/0'},
+        {'op': 'add', 'path': '/b2', 'value': [1, 2]},
+        {'op': 'copy', 'from': '/b2', 'path': '/a2'},
+        {'op': 'move', 'from': '/a2', 'path': '/c'},
+        {'op': 'test', 'path': '/c', 'value': [1, 2]},
+    ], validate=False)
+    assert obj.a is a
+    assert obj.to_dict(validate=False) == {
+        'a': {'foo': 'baz'}, 'b': ['a', 'inserted', 'b', 'c', 'last'],
+        'b2': [1, 2], 'c': [1, 2], 'd': ['y', 'z']}
+
+    with pytest.raises(ValueError):
+        obj.apply_patch([{'op': 'test', 'path': '/c', 'value': [2]}])
+    with pytest.raises(KeyError):
+        obj.apply_patch([{'op': 'remove', 'path': '/missing'}])
+    with pytest.raises(IndexError):
+        obj.apply_patch([{'op': 'replace', 'path': '/b/10', 'value': 'x'}])
+    with pytest.raises(ValueError):
+        obj.apply_patch([{'op': 'frobnicate', 'path': '/b'}])
+
+
+def test_apply_patch_wraps_properties():
+    obj = MySchema.from_dict({'a': {'foo': 'bar'}})
+    obj.apply_patch([{'op': 'add', 'path': '/b', 'value': ['x']},
+                     {'op': 'remove', 'path': '/a'},
+                     {'op': 'replace', 'path': '', 'value': DCT}])
+    assert isinstance(obj.b, StringArray)
+    assert obj.to_dict() == DCT
+
+    obj = MySchema.from_dict({'a': {'foo': 'bar'}})
+    obj.apply_patch([{'op': 'remove', 'path': '/a'},
+                     {'op': 'add', 'path': '/b', 'value': ['x']}])
+    assert isinstance(obj.b, StringArray)
+    assert obj.a is Undefined
+    assert obj.to_dict() == {'b': ['x']}
+
+    obj.apply_patch([{'op': 'add', 'path': '', 'value': {'b': ['y']}}])
+    assert isinstance(obj.b, StringArray)
+    assert obj.to_dict() == {'b': ['y']}
+
+
+def test_apply_patch_reads_without_modifying():
+    obj = MySchema.from_dict({'a': {'foo': 'bar'}, 'c': 1}, index=True)
+    hashing.digest(obj)
+    read_only = [{'op': 'test', 'path': '/a/foo', 'value': 'bar'},
+                 {'op': 'copy', 'from': '/a/foo', 'path': '/e'}]
+    obj.apply_patch(read_only[:1])
+    assert hashing.is_cached(obj) and hashing.is_cached(obj._kwds['a'])
+    assert not index_of(obj)._stale
+
+    with interning.interning():
+        obj = MySchema.from_dict(DCT)
+        other = MySchema.from_dict(DCT)
+    canonical = obj._canonical
+    obj.apply_patch(read_only[:1])
+    assert obj._canonical is canonical
+    obj.apply_patch(read_only[1:])
+    assert obj._canonical is None
+    assert obj._kwds['a']._canonical is canonical._kwds['a']
+    obj.apply_patch([{'op': 'add', 'path': '/b/-', 'value': 'd'},
+                     {'op': 'move', 'from': '/a/foo', 'path': '/a/bar'}])
+    assert obj.to_dict() == {'a': {'bar': 'bar'}, 'e': 'bar',
+                             'b': ['a', 'b', 'c', 'd'], 'd': ['x', 'y', 'z']}
+    assert other.to_dict() == DCT
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_diff_roundtrip(seed):
+    schema = random_schema(n_definitions=20, depth=4, seed=seed)
+    old = random_instance(schema, array_length=3, seed=seed)
+    new = random_instance(schema, array_length=2, seed=seed + 100)
+    for old, new in [(old, new), (new, old)]:
+        obj = MySchema(**copy.deepcopy(old))
+        obj.apply_patch(diff(old, new), validate=False)
+        assert obj.to_dict(validate=False) == new
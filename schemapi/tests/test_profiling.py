@@ -0,0 +1,59 @@
+import jsonschema
+import pytest
+
+from .. import profiling
+from ..profiling import profile_validation, schema_pointers
+from .test_schemapi import Derived, DefinitionUnion, MySchema
+
+
+def test_schema_pointers():
+    schema = {'definitions': {'a/b': {'type': 'string'}},
+              'anyOf': [{'$ref': '#/definitions/a~1b'}, {'type': 'null'}]}
+    pointers = schema_pointers(schema)
+    assert pointers[id(schema)] == '#'
+    assert pointers[id(schema['definitions']['a/b'])] == '#/definitions/a~1b'
+    assert pointers[id(schema['anyOf'][1])] == '#/anyOf/1'
+
+
+def test_profile_validation():
+    assert profiling.get_profile() is None
+    with profile_validation() as profile:
+        assert profiling.get_profile() is profile
+        MySchema.validate({'a': {'foo': 'bar'}, 'b2': [1, 2, 3]})
+    assert profiling.get_profile() is None
+
+    stats = profile.keywords['#/properties/b2/items', 'type']
+    assert stats.calls == 3
+    assert stats.failures == 0
+    assert profile.keywords['#/definitions/StringMapping', 'type'].calls == 1
+
+    properties = profile.keywords['#', 'properties']
+    assert properties.time >= properties.self_time > 0
+    visits, total, self_time = profile.by_pointer()['#/properties/b2/items']
+    assert visits == 3
+    assert '#/properties/b2/items' in profile.report()
+
+
+def test_profile_validation_errors():
+    with profile_validation() as profile:
+        with pytest.raises(jsonschema.ValidationError) as err:
+            Derived.validate({'a': 'yo'})
+    assert err.value.message == "'yo' is not of type 'integer'"
+    assert profile.keywords['#/properties/a', 'type'].failures == 1
+
+    # the schema is checked, as by jsonschema.validate
+    with pytest.raises(jsonschema.SchemaError):
+        Derived.validate(1, schema={'type': 'no-such-type'})
+    with profile_validation():
+        with pytest.raises(jsonschema.SchemaError):
+            Derived.validate(1, schema={'type': 'no-such-type'})
+
+
+def test_profile_from_dict_branches():
+    with profile_validation() as profile:
+        DefinitionUnion.from_dict('A')
+    rejected = profile.branches['DefinitionUnion', '#/definitions/Foo']
+    accepted = profile.branches['DefinitionUnion', '#/definitions/Bar']
+    assert (rejected.tried, rejected.rejected) == (1, 1)
+    assert (accepted.tried, accepted.rejected) == (1, 0)
+    assert 'DefinitionUnion' in profile.report()
@@ -169,6 +169,21 @@ def test_from_dict():
     assert isinstance(obj.c, Foo)
 
 
+def test_from_dict_copies_containers():
+    class Rows(SchemaBase):
+        _schema = {'type': 'object',
+                   'properties': {'rows': {'type': 'array'}}}
+
+    dct = {'b2': [1, 2]}
+    assert MySchema.from_dict(dct).b2 is not dct['b2']
+    rows = [{'x': [1]}, [{'y': 2}]]
+    obj = Rows.from_dict({'rows': rows})
+    assert obj.rows == rows
+    assert obj.rows is not rows
+    assert obj.rows[0] is not rows[0]
+    assert obj.rows[1][0] is not rows[1][0]
+
+
 def test_simple_type():
     assert SimpleUnion(4).to_dict() == 4
 
@@ -293,3 +308,18 @@ def test_schema_validation_error():
     assert 'test_schemapi.MySchema->a' in message
     assert "validating {!r}".format(the_err.validator) in message
     assert the_err.message in message
+
+
+def test_is_valid(monkeypatch):
+    assert MySchema.is_valid({'a': {'foo': 'bar'}, 'b2': [1, 2]})
+    assert not MySchema.is_valid({'a': {'foo': 1}})
+    assert StringArray.is_valid(['a', 'b'])
+    assert not StringArray.is_valid(['a', 1])
+    assert MySchema.is_valid(['a', 'b'], {'$ref': '#/definitions/StringArray'})
+
+    # anyOf branches are selected without computing the best-matching error
+    def fail(*args, **kwargs):
+        raise AssertionError("best match computed")
+    monkeypatch.setattr(jsonschema.exceptions, 'best_match', fail)
+    assert _FromDict._branch_is_valid(MySchema, ['a'], StringArray._schema)
+    assert not _FromDict._branch_is_valid(MySchema, ['a'], StringMapping._schema)
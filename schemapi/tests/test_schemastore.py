@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from .. import schemastore
+from ..schemastore import load_schema, write_schema
+from ..serializers import json_backend, available_json_backends
+
+
+SCHEMA = {'type': 'object', 'properties': {'name': {'type': 'string'},
+                                           'label': {'enum': ['é', 'ü']}}}
+
+
+@pytest.mark.parametrize('backend', available_json_backends())
+def test_load_schema(tmp_path, backend):
+    path = tmp_path / 'schema.json'
+    write_schema(SCHEMA, path)
+    assert list(tmp_path.iterdir()) == [path]
+    with json_backend(backend):
+        schemastore.clear_cache()
+        schema = load_schema(path)
+        assert schema == SCHEMA
+        assert load_schema(str(path)) is schema
+
+    # modified files are reloaded
+    write_schema({'type': 'string'}, path)
+    os.utime(path, ns=(0, 0))
+    assert load_schema(path) == {'type': 'string'}
+
+    # files replaced within the timestamp resolution are reloaded
+    write_schema({'type': 'number'}, path)
+    os.utime(path, ns=(0, 0))
+    assert load_schema(path) == {'type': 'number'}
+
+
+@pytest.mark.parametrize('backend', available_json_backends())
+def test_load_schema_parity(tmp_path, backend):
+    schema = {'default': [float('inf'), 10 ** 23, -2 ** 64], 'enum': ['\x7f']}
+    path = tmp_path / 'schema.json'
+    write_schema(schema, path)
+    with json_backend(backend):
+        schemastore.clear_cache()
+        loaded = load_schema(path)
+    assert repr(loaded) == repr(schema)
+
+
+def test_load_schema_errors(tmp_path):
+    path = tmp_path / 'empty.json'
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        load_schema(path)
+    with pytest.raises(OSError):
+        load_schema(tmp_path / 'missing.json')
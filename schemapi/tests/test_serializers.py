@@ -0,0 +1,196 @@
+import datetime
+import enum
+import json
+import math
+import uuid
+
+import pytest
+
+from .. import serializers
+from ..serializers import JSONBackend, json_backend
+from ..schemapi import _FromDict
+from .test_schemapi import MySchema
+
+
+class Color(enum.Enum):
+    red = 1
+
+
+class Number(enum.IntEnum):
+    one = 1
+
+
+DCT = {'a': {'foo': 'bar'}, 'b': ['a', 'b', 'c'], 'd': ['x', 'y', 'z'],
+       'e': 1.5, 'f': None}
+
+
+@pytest.mark.parametrize('name', serializers.available_json_backends())
+def test_backends_roundtrip(name):
+    with json_backend(name):
+        backend = serializers.get_json_backend()
+        assert backend.name == name
+        for indent in [None, 2, 4]:
+            for sort_keys in [True, False]:
+                s = backend.dumps(DCT, indent=indent, sort_keys=sort_keys)
+                assert isinstance(s, str)
+                assert json.loads(s) == DCT
+                assert backend.loads(s) == DCT
+        assert backend.dumps(DCT, indent=2, sort_keys=True) == \
+            json.dumps(DCT, indent=2, sort_keys=True)
+
+
+@pytest.mark.parametrize('name', serializers.available_json_backends())
+def test_backends_fallback(name):
+    with json_backend(name):
+        backend = serializers.get_json_backend()
+        # unsupported options and values are handled by the json module
+        assert backend.dumps({'a': 'é'}, ensure_ascii=True) == '{"a": "\\u00e9"}'
+        assert backend.dumps({'a': 2 ** 70}) == json.dumps({'a': 2 ** 70})
+        assert backend.loads('{"a": 1.5}', parse_float=str) == {'a': '1.5'}
+
+
+@pytest.mark.parametrize('name', serializers.available_json_backends())
+def test_backends_parity(name):
+    # the output does not depend on the backend
+    data = {'nan': float('nan'), 'inf': [float('inf'), -float('inf')],
+            'text': ['é', '\u2603', 'a/b', '1e5'], 'none': None,
+            'floats': [1e20, 1e-7, 0.1, 1.5, -0.0, 123456789.25],
+            'ints': [0, -1, 2 ** 63, 2 ** 70], 'empty': [[], {}],
+            'nested': {'b': [1, {'d': 'e', 'c': True}], 'a': False}}
+    with json_backend(name):
+        backend = serializers.get_json_backend()
+        for indent in [None, 2, 4]:
+            for sort_keys in [True, False]:
+                for value in [data, DCT] + list(data.values()):
+                    assert backend.dumps(value, indent=indent,
+                                         sort_keys=sort_keys) == \
+                        json.dumps(value, indent=indent, sort_keys=sort_keys)
+
+        # values of other types are rejected as by the json module
+        for value in [datetime.date(2020, 1, 1), uuid.UUID(int=1),
+                      Color.red]:
+            with pytest.raises(TypeError):
+                backend.dumps({'a': value}, indent=2)
+        other = [Number.one, 'a\x7fb', {1: 'a'}]
+        assert backend.dumps(other, indent=2) == json.dumps(other, indent=2)
+
+
+@pytest.mark.parametrize('name', serializers.available_json_backends())
+def test_backends_loads_parity(name):
+    # documents are parsed as by the json module
+    documents = ['{"a": NaN, "b": [Infinity, -Infinity]}',
+                 '[100000000000000000000000, -9223372036854775809, '
+                 '18446744073709551616, 1.5]', '"\\ud800"', '"a\x7fb"',
+                 '{"a": [1, 2, {"b": null}], "a": true}']
+    with json_backend(name):
+        backend = serializers.get_json_backend()
+        for document in documents:
+            expected = json.loads(document)
+            for s in [document, document.encode('utf-8')]:
+                assert repr(backend.loads(s)) == repr(expected)
+        value = MySchema.from_json(MySchema(c=float('nan')).to_json(
+            validate=False), validate=False).c
+        assert math.isnan(value)
+        big = MySchema.from_json('{"c": 100000000000000000000000}').c
+        assert big == 10 ** 23 and type(big) is int
+        with pytest.raises(ValueError):
+            backend.loads('{"a": ')
+
+
+def test_json_backend_context():
+    original = serializers.get_json_backend()
+    with json_backend('json'):
+        assert type(serializers.get_json_backend()) is JSONBackend
+    assert serializers.get_json_backend() is original
+
+    with pytest.raises(ValueError):
+        serializers.set_json_backend('not-a-backend')
+    assert serializers.get_json_backend() is original
+
+
+def test_register_json_backend():
+    calls = []
+
+    class RecordingBackend(JSONBackend):
+        name = 'recording'
+
+        def dumps(self, obj, **kwargs):
+            calls.append('dumps')
+            return super(RecordingBackend, self).dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            calls.append('loads')
+            return super(RecordingBackend, self).loads(s, **kwargs)
+
+    class MissingBackend(JSONBackend):
+        def __init__(self):
+            raise ImportError('not installed')
+
+    serializers.register_json_backend('recording', RecordingBackend)
+    serializers.register_json_backend('missing', MissingBackend)
+    try:
+        available = serializers.available_json_backends()
+        assert 'recording' in available
+        assert 'missing' not in available
+        with pytest.raises(ImportError):
+            serializers.set_json_backend('missing')
+
+        with json_backend('recording'):
+            obj = MySchema.from_json(MySchema.from_dict(DCT).to_json())
+        assert obj.to_dict() == DCT
+        assert calls == ['dumps', 'loads']
+    finally:
+        del serializers._JSON_BACKENDS['recording']
+        del serializers._JSON_BACKENDS['missing']
+
+
+def test_canonical_dumps():
+    a = {'b': [1, 2], 'a': {'y': 1, 'x': 2}}
+    b = {'a': {'x': 2, 'y': 1}, 'b': [1, 2]}
+    assert serializers.canonical_dumps(a) == serializers.canonical_dumps(b)
+    assert serializers.canonical_dumps(a) != serializers.canonical_dumps(DCT)
+    with json_backend('json'):
+        assert _FromDict.hash_schema(a) == _FromDict.hash_schema(b)
+
+
+def test_string_table():
+    schema = {'properties': {'b': {'enum': ['x', 'y', 1]}, 'a': {}},
+              'definitions': {'Foo': {'properties': {'c': {}}}}}
+    table = serializers.StringTable.from_schema(schema)
+    assert table.strings == ('a', 'b', 'c', 'x', 'y')
+    assert serializers.string_table(schema) is serializers.string_table(schema)
+
+    interned = table.intern({'a': 'x', 'd': ['y', 'z', 1]}, ref=lambda i: -i)
+    assert interned == {0: -3, 'd': [-4, 'z', 1]}
+    assert table.restore_pairs([(0, 1), ('d', 2)]) == {'a': 1, 'd': 2}
+
+    # integer keys are escaped, so that they are not taken for interned keys
+    with pytest.raises(ValueError):
+        table.intern({1: 'x'}, ref=lambda i: -i)
+    interned = table.intern({1: 'x'}, ref=lambda i: -i,
+                            escape=serializers.EscapedKey)
+    assert table.restore_pairs(interned.items()) == {1: -3}
+
+
+def test_msgpack_roundtrip():
+    pytest.importorskip('msgpack')
+    obj = MySchema.from_dict(DCT)
+    data = obj.to_msgpack(intern=True)
+    plain = obj.to_msgpack()
+    assert isinstance(data, bytes)
+    assert len(data) <= len(plain) < len(obj.to_json(indent=None))
+
+    new_obj = MySchema.from_msgpack(data, intern=True)
+    assert type(new_obj.a) is type(obj.a)
+    assert new_obj.to_dict() == DCT
+    assert MySchema.from_msgpack(plain).to_dict() == DCT
+
+    codec = serializers.get_binary_codec(
+        strings=serializers.StringTable(['a', 'b']))
+    data = {0: 'a', 1: {'b': 2, 2: 'c'}, 'a': [True]}
+    assert codec.loads(codec.dumps(data)) == data
+
+
+def test_unknown_binary_codec():
+    with pytest.raises(ValueError):
+        MySchema.from_dict(DCT).to_msgpack(codec='not-a-codec')
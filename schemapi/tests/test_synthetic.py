@@ -0,0 +1,40 @@
+import jsonschema
+import pytest
+
+from .. import SchemaModuleGenerator
+from ..synthetic import random_schema, random_instance
+from ..utils import load_metaschema
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_random_instance_is_valid(seed):
+    schema = random_schema(n_definitions=30, depth=4, union_width=4, seed=seed)
+    jsonschema.validate(schema, load_metaschema())
+    instance = random_instance(schema, array_length=3, seed=seed)
+    jsonschema.validate(instance, schema)
+
+
+def test_deterministic():
+    assert random_schema(seed=1) == random_schema(seed=1)
+    schema = random_schema(seed=1)
+    assert random_instance(schema, seed=2) == random_instance(schema, seed=2)
+
+
+def test_ref_depth():
+    schema = random_schema(n_definitions=5, depth=5, seed=0)
+    assert sorted(schema['definitions']) == ['Def{}'.format(i) for i in range(5)]
+    assert list(schema['properties']) == ['def0']
+
+    with pytest.raises(ValueError):
+        random_schema(n_definitions=2, depth=3)
+
+
+def test_round_trip():
+    schema = random_schema(n_definitions=20, depth=3, seed=0)
+    instance = random_instance(schema, array_length=2, seed=0)
+    module = SchemaModuleGenerator(schema).import_as('synthetic_testmod',
+                                                     add_to_sys_modules=False)
+    classes = [val for val in vars(module).values()
+               if isinstance(val, type) and issubclass(val, module.SchemaBase)]
+    obj = module.Root.from_dict(instance, _wrapper_classes=classes)
+    assert obj.to_dict() == instance
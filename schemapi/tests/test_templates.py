@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from .. import serializers
+from ..schemapi import SchemaValidationError, Undefined, debug_mode
+from ..serializers import json_backend
+from ..templates import Placeholder, Template
+from .test_schemapi import Derived, Foo, MySchema, StringArray, StringMapping
+
+
+def make_template(**kwds):
+    with debug_mode(False):
+        obj = MySchema(a=StringMapping(foo=Placeholder('foo')),
+                       b=StringArray(['x', Placeholder('item')]),
+                       c=Placeholder('c', default=Undefined),
+                       d=['y', 'z'])
+    return Template(obj, **kwds)
+
+
+def test_to_dict():
+    template = make_template()
+    assert template.placeholders == ['c', 'foo', 'item']
+    values = {'foo': 'bar', 'item': 'i', 'c': 4}
+    assert template.to_dict(values) == {
+        'a': {'foo': 'bar'}, 'b': ['x', 'i'], 'c': 4, 'd': ['y', 'z']}
+
+    first = template.to_dict(values)
+    first['d'].append('w')
+    assert template.to_dict(values)['d'] == ['y', 'z']
+
+    # a value of Undefined removes the property
+    assert 'c' not in template.to_dict({'foo': 'bar', 'item': 'i',
+                                        'c': Undefined})
+    with pytest.raises(ValueError):
+        template.to_dict({'foo': 'bar'})
+
+
+def test_to_dict_copies_values():
+    with debug_mode(False):
+        obj = MySchema(a=Placeholder('m'), d=Placeholder('m'))
+    value = {'foo': ['bar']}
+    rendered = Template(obj).to_dict({'m': value}, validate=False)
+    assert rendered == {'a': value, 'd': value}
+    assert rendered['a'] is not rendered['d']
+    assert rendered['a']['foo'] is not rendered['d']['foo']
+    assert rendered['a'] is not value
+
+
+def test_to_dict_schema_values():
+    with debug_mode(False):
+        obj = Derived(a=1, c=Placeholder('c'))
+    template = Template(obj)
+    assert template.to_dict({'c': Foo(d='x')}) == {'a': 1, 'c': {'d': 'x'}}
+    with pytest.raises(SchemaValidationError):
+        template.to_dict({'c': {'d': 2}})
+
+
+def test_validation():
+    template = make_template()
+    with pytest.raises(SchemaValidationError):
+        template.to_dict({'foo': 1, 'item': 'i', 'c': 4})
+    with pytest.raises(SchemaValidationError):
+        template.to_dict({'foo': 'bar', 'item': 2, 'c': 4})
+    with pytest.raises(SchemaValidationError):
+        template.to_dict({'foo': 'bar', 'item': 'i', 'c': [4]})
+    assert template.to_dict({'foo': 1, 'item': 'i', 'c': 4},
+                            validate=False)['a'] == {'foo': 1}
+
+    # only the property holding each placeholder is validated
+    assert [unit[:2] for unit in template._units] == [
+        (('a', 'foo'), StringMapping), (('b',), StringArray), (('c',), MySchema)]
+
+
+def test_invariants_are_validated():
+    with debug_mode(False):
+        obj = MySchema(a=StringMapping(foo=1), c=Placeholder('c'))
+    with pytest.raises(SchemaValidationError):
+        Template(obj)
+    Template(obj, validate=False)
+
+    with debug_mode(False):
+        obj = MySchema(d=[Placeholder('d')])
+    assert Template(obj).to_dict({'d': 'x'}) == {'d': ['x']}
+
+
+@pytest.mark.parametrize('backend', serializers.available_json_backends())
+def test_to_json(backend):
+    template = make_template()
+    for values in [{'foo': 'b"ar', 'item': 'i', 'c': 1.5},
+                   {'foo': 'caf\xe9', 'item': 'i', 'c': 1e20}]:
+        for kwds in [{}, {'indent': None, 'sort_keys': False}]:
+            with json_backend('json'):
+                expected = MySchema.from_dict(
+                    template.to_dict(values)).to_json(**kwds)
+            with json_backend(backend):
+                assert template.to_json(values, **kwds) == expected
+    with json_backend(backend):
+        assert json.loads(template.to_json(
+            {'foo': 'bar', 'item': 'i', 'c': Undefined})) == {
+                'a': {'foo': 'bar'}, 'b': ['x', 'i'], 'd': ['y', 'z']}
+    with pytest.raises(SchemaValidationError):
+        template.to_json({'foo': 'bar', 'item': 'i', 'c': [1]})
@@ -1,6 +1,10 @@
+import jsonschema
 import pytest
 
-from ..utils import get_valid_identifier
+from ..utils import (get_valid_identifier, is_valid_identifier,
+                     indent_docstring, load_metaschema, property_name_map,
+                     prune_schema, reachable_definitions, resolve_references,
+                     validate_schema, SchemaInfo)
 from ..schemapi import _FromDict
 
 
@@ -23,6 +27,28 @@ def test_get_valid_identifier():
     assert get_valid_identifier('$as') == 'as_'
     assert get_valid_identifier('for') == 'for_'
     assert get_valid_identifier('--') == '_'
+    assert get_valid_identifier('$schema', '_') == '_schema'
+    assert get_valid_identifier('x\u00e9', allow_unicode=True) == 'x\u00e9'
+    assert get_valid_identifier('x\u00e9') == 'x'
+
+
+def test_is_valid_identifier():
+    assert is_valid_identifier('foo')
+    assert not is_valid_identifier('for')
+    assert not is_valid_identifier('vega-lite')
+    assert not is_valid_identifier('2d')
+    assert not is_valid_identifier('x\u00e9')
+    assert is_valid_identifier('x\u00e9', allow_unicode=True)
+
+
+def test_property_name_map():
+    props = ['foo', 'for', 'vega-lite', '$schema']
+    assert property_name_map(props) == {'for': 'for_',
+                                        'vega-lite': 'vegalite',
+                                        '$schema': 'schema'}
+    assert property_name_map(props, '_') == {'for': 'for_',
+                                             'vega-lite': 'vega_lite',
+                                             '$schema': '_schema'}
 
 
 @pytest.mark.parametrize('use_json', [True, False])
@@ -31,3 +57,120 @@ def test_hash_schema(refschema, use_json):
     copy['description'] = "A schema"
     copy['title'] = "Schema to test"
     assert _FromDict.hash_schema(refschema) == _FromDict.hash_schema(copy)
+
+
+def test_description_cache():
+    schema = {
+        'definitions': {
+            'Foo': {'type': 'string'},
+        },
+        'properties': {
+            'a': {'anyOf': [{'$ref': '#/definitions/Foo'}, {'type': 'null'}]},
+            'b': {'type': 'array', 'items': {'type': ['string', 'number']}},
+        }
+    }
+    cache = {}
+    info = SchemaInfo(schema, cache=cache)
+    assert info.properties['a'].short_description == "anyOf(:class:`Foo`, None)"
+    assert info.properties['b'].short_description == "List(anyOf(string, float))"
+    size = len(cache)
+
+    # A second SchemaInfo sharing the cache computes nothing new
+    info2 = SchemaInfo(schema, cache=cache)
+    assert info2.properties['a'].short_description == "anyOf(:class:`Foo`, None)"
+    assert info2.properties['b'].medium_description == "List(anyOf(string, float))"
+    assert len(cache) == size
+
+
+def test_circular_references():
+    schema = {
+        'definitions': {
+            'Foo': {'$ref': '#/definitions/Bar'},
+            'Bar': {'$ref': '#/definitions/Foo'},
+        }
+    }
+    with pytest.raises(ValueError) as err:
+        resolve_references({'$ref': '#/definitions/Foo'}, schema)
+    assert str(err.value).startswith("Circular $ref chain")
+
+
+def test_indent_docstring():
+    lines = ['Foo schema wrapper', '', 'Mapping(required=[a])',
+             'A description which is long enough that it needs to be wrapped '
+             'onto a second line of text.',
+             '', 'Attributes', '----------', '',
+             'a : string',
+             '    * a list item which is also long enough that it needs to be '
+             'wrapped onto the next line\n* short item\n\nAfter.',
+             '']
+    expected = [
+        'Foo schema wrapper',
+        '',
+        '    Mapping(required=[a])',
+        '    A description which is long enough that it needs to',
+        '    be wrapped onto a second line of text.',
+        '',
+        '    Attributes',
+        '    ----------',
+        '',
+        '    a : string',
+        '        * a list item which is also long enough that',
+        '          it needs to be wrapped onto the next line',
+        '        * short item',
+        '',
+        '        After.',
+        '    ',
+    ]
+    # the second call is served from the cache and must be identical
+    for _ in range(2):
+        assert indent_docstring(lines, 4, width=60) == '\n'.join(expected)
+
+
+def test_load_metaschema():
+    metaschema = load_metaschema()
+    assert metaschema['id'] == 'http://json-schema.org/draft-04/schema#'
+    assert load_metaschema() is metaschema
+
+
+def test_validate_schema(monkeypatch):
+    from .. import utils
+    validator = utils.metaschema_validator()
+    assert utils.metaschema_validator() is validator
+
+    schema = {'type': 'object', 'properties': {'validated': {'type': 'integer'}}}
+    validate_schema(schema)
+    with pytest.raises(jsonschema.ValidationError):
+        validate_schema({'type': 'object', 'properties': {'x': {'type': 5}}})
+
+    # equal schemas are only validated once
+    def fail(*args, **kwargs):
+        raise AssertionError("schema revalidated")
+    monkeypatch.setattr(type(validator), 'iter_errors', fail)
+    validate_schema(dict(schema))
+    SchemaInfo(schema, validate=True)
+    with pytest.raises(AssertionError):
+        validate_schema({'type': 'string', 'title': 'not validated yet'})
+
+
+def test_validate_schema_distinguishes_values():
+    # schemas serialized alike are not taken for one another
+    validate_schema({'enum': [1, 2]})
+    with pytest.raises(jsonschema.ValidationError):
+        validate_schema({'enum': (1, 2)})
+
+
+def test_reachable_definitions():
+    schema = {
+        'definitions': {
+            'a/b': {'$ref': '#/definitions/C/properties/x'},
+            'C': {'properties': {'x': {'type': 'string'}}},
+            'D': {'$ref': '#'},
+            'E': {'type': 'string'},
+        },
+        '$ref': '#/definitions/E',
+    }
+    assert reachable_definitions(schema, ['a/b']) == {'a/b', 'C'}
+    assert reachable_definitions(schema, ['D']) == {'D', 'E'}
+    assert prune_schema(schema, ['C']) == {
+        'definitions': {'C': schema['definitions']['C']}}
+    assert prune_schema(schema, ['D'])['$ref'] == '#/definitions/E'
@@ -1,5 +1,6 @@
 """Utilities for working with schemas"""
 
+import functools
 import json
 import keyword
 import pkgutil
@@ -8,25 +9,178 @@ import textwrap
 
 import jsonschema
 
+from . import caching
+
 
 EXCLUDE_KEYS = ('definitions', 'title', 'description', '$schema', 'id')
 
+# Compiled patterns used for identifiers, keyed by allow_unicode
+_INVALID_CHARACTERS = {False: re.compile(r'\W', re.ASCII),
+                       True: re.compile(r'\W', re.UNICODE)}
+_INVALID_START = {False: re.compile(r'^[\d\W]', re.ASCII),
+                  True: re.compile(r'^[\d\W]', re.UNICODE)}
+_VALID_IDENTIFIER = {False: re.compile(r'^[^\d\W]\w*\Z', re.ASCII),
+                     True: re.compile(r'^[^\d\W]\w*\Z', re.UNICODE)}
+
 
+@functools.lru_cache(maxsize=None)
 def load_metaschema():
+    """Return the draft-04 metaschema
+
+    The metaschema is loaded once per process, and every call returns the
+    same dict: it must not be modified.
+    """
     schema = pkgutil.get_data(__name__, 'jsonschema-draft04.json')
     schema = schema.decode('utf-8')
     return json.loads(schema)
 
 
+@functools.lru_cache(maxsize=None)
+def metaschema_validator():
+    """Return a jsonschema validator for the draft-04 metaschema
+
+    The validator is built once per process.
+    """
+    metaschema = load_metaschema()
+    cls = jsonschema.validators.validator_for(metaschema)
+    cls.check_schema(metaschema)
+    return cls(metaschema)
+
+
+# Content digests of schemas which are known to conform to the metaschema
+_VALID_SCHEMA_DIGESTS = set()
+
+
+def validate_schema(schema):
+    """Validate a schema against the draft-04 metaschema
+
+    Schemas which have been validated are remembered by a digest of their
+    content, so that validating an equal schema again is cheap. Schemas
+    holding values other than JSON values (e.g. tuples, non-finite floats or
+    non-string keys) are validated every time.
+
+    Raises
+    ------
+    jsonschema.ValidationError :
+        if the schema does not conform to the metaschema
+    """
+    digest = caching._digest(schema)
+    if digest is not None and digest in _VALID_SCHEMA_DIGESTS:
+        return
+    error = jsonschema.exceptions.best_match(
+        metaschema_validator().iter_errors(schema))
+    if error is not None:
+        raise error
+    if digest is not None:
+        _VALID_SCHEMA_DIGESTS.add(digest)
+
+
 def resolve_references(schema, root=None):
-    """Resolve References within a JSON schema"""
+    """Resolve References within a JSON schema
+
+    Raises a ValueError if the chain of references is circular.
+    """
     resolver = jsonschema.RefResolver.from_schema(root or schema)
+    seen = set()
     while '$ref' in schema:
-        with resolver.resolving(schema['$ref']) as resolved:
+        ref = schema['$ref']
+        if ref in seen:
+            raise ValueError("Circular $ref chain involving {!r}".format(ref))
+        seen.add(ref)
+        with resolver.resolving(ref) as resolved:
             schema = resolved
     return schema
 
 
+def _refs(schema):
+    """Yield the $ref strings within a schema, recursively"""
+    if isinstance(schema, dict):
+        for key, val in schema.items():
+            if key == '$ref' and isinstance(val, str):
+                yield val
+            else:
+                yield from _refs(val)
+    elif isinstance(schema, list):
+        for val in schema:
+            yield from _refs(val)
+
+
+def _referenced_definition(ref):
+    """Return the definition name a local $ref points into, or None
+
+    The root schema itself is represented by ``'#'``.
+    """
+    if ref == '#':
+        return '#'
+    if not ref.startswith('#/definitions/'):
+        return None
+    name = ref[len('#/definitions/'):].split('/')[0]
+    return name.replace('~1', '/').replace('~0', '~')
+
+
+def reachable_definitions(schema, names):
+    """Return the definitions reachable from the named definitions
+
+    References are followed transitively. A reference to the root schema
+    (``'#'``) makes the definitions referenced by the root schema itself
+    reachable.
+
+    Parameters
+    ----------
+    schema : dict
+        The root schema
+    names : iterable of strings
+        The names of definitions within the root schema
+
+    Returns
+    -------
+    reachable : set
+        The names of the reachable definitions, including names
+    """
+    definitions = schema.get('definitions', {})
+    body = {key: val for key, val in schema.items() if key != 'definitions'}
+    reachable = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name in reachable:
+            continue
+        if name == '#':
+            subschema = body
+        elif name in definitions:
+            subschema = definitions[name]
+        else:
+            raise ValueError("Schema has no definition {!r}".format(name))
+        reachable.add(name)
+        stack.extend(filter(None, map(_referenced_definition,
+                                      _refs(subschema))))
+    reachable.discard('#')
+    return reachable
+
+
+def prune_schema(schema, names):
+    """Return a copy of the root schema with only the reachable definitions
+
+    The definitions reachable from the named definitions (see
+    reachable_definitions) are kept, in their original order. The
+    constraints of the root schema itself are kept only if all the
+    definitions they reference are reachable; otherwise the pruned root
+    schema accepts any value.
+    """
+    reachable = reachable_definitions(schema, names)
+    definitions = schema.get('definitions', {})
+    body = {key: val for key, val in schema.items() if key != 'definitions'}
+    body_refs = set(map(_referenced_definition, _refs(body)))
+    if body_refs - {None, '#'} <= reachable:
+        pruned = body
+    else:
+        pruned = {key: val for key, val in body.items() if key in EXCLUDE_KEYS}
+    pruned['definitions'] = {name: subschema
+                             for name, subschema in definitions.items()
+                             if name in reachable}
+    return pruned
+
+
 def get_valid_identifier(prop, replacement_character='', allow_unicode=False):
     """Given a string property, generate a valid Python identifier
 
@@ -51,9 +205,14 @@ def get_valid_identifier(prop, replacement_character='', allow_unicode=False):
     >>> get_valid_identifier('$*#$')
     '_'
     """
+    return _get_valid_identifier(prop, replacement_character,
+                                 bool(allow_unicode))
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_valid_identifier(prop, replacement_character, allow_unicode):
     # First substitute-out all non-valid characters.
-    flags = re.UNICODE if allow_unicode else re.ASCII
-    valid = re.sub('\W', replacement_character, prop, flags=flags)
+    valid = _INVALID_CHARACTERS[allow_unicode].sub(replacement_character, prop)
 
     # If nothing is left, use just an underscore
     if not valid:
@@ -61,7 +220,7 @@ def get_valid_identifier(prop, replacement_character='', allow_unicode=False):
 
     # first character must be a non-digit. Prefix with an underscore
     # if needed
-    if re.match('^[\d\W]', valid):
+    if _INVALID_START[allow_unicode].match(valid):
         valid = '_' + valid
 
     # if the result is a reserved keyword, then add an underscore at the end
@@ -80,17 +239,49 @@ def is_valid_identifier(var, allow_unicode=False):
     allow_unicode : bool (default: False)
         if True, then allow Python 3 style unicode identifiers.
     """
-    flags = re.UNICODE if allow_unicode else re.ASCII
-    is_valid = re.match("^[^\d\W]\w*\Z", var, flags)
-    return is_valid and not keyword.iskeyword(var)
+    return _is_valid_identifier(var, bool(allow_unicode))
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_valid_identifier(var, allow_unicode):
+    is_valid = _VALID_IDENTIFIER[allow_unicode].match(var)
+    return bool(is_valid) and not keyword.iskeyword(var)
+
+
+def property_name_map(props, replacement_character='', allow_unicode=False):
+    """Map property names to valid Python identifiers
+
+    Only properties which are not valid Python identifiers will be included
+    in the returned dictionary.
+
+    Parameters
+    ----------
+    props : iterable of strings
+        The property names to map
+    replacement_character: string, default ''
+        The character to replace invalid characters with.
+    allow_unicode: boolean, default False
+        If True, then allow Python 3-style unicode identifiers.
+
+    Examples
+    --------
+    >>> property_name_map(['foo', 'vega-lite', 'for'])
+    {'vega-lite': 'vegalite', 'for': 'for_'}
+    """
+    allow_unicode = bool(allow_unicode)
+    pairs = ((prop, _get_valid_identifier(prop, replacement_character,
+                                          allow_unicode))
+             for prop in props)
+    return {prop: val for prop, val in pairs if prop != val}
 
 
 class SchemaProperties(object):
     """A wrapper for properties within a schema"""
-    def __init__(self, properties, schema, rootschema=None):
+    def __init__(self, properties, schema, rootschema=None, cache=None):
         self._properties = properties
         self._schema = schema
         self._rootschema = rootschema or schema
+        self._cache = {} if cache is None else cache
 
     def __bool__(self):
         return bool(self._properties)
@@ -107,8 +298,16 @@ class SchemaProperties(object):
     def __getitem__(self, attr):
         dct = self._properties[attr]
         if 'definitions' in self._schema and 'definitions' not in dct:
-            dct = dict(definitions=self._schema['definitions'], **dct)
-        return SchemaInfo(dct, self._rootschema)
+            definitions = self._schema['definitions']
+            # Reuse the merged dict so that its descriptions stay cached
+            key = ('definitions', id(dct), id(definitions))
+            entry = self._cache.get(key)
+            if entry is None:
+                entry = (dct, definitions,
+                         dict(definitions=definitions, **dct))
+                self._cache[key] = entry
+            dct = entry[-1]
+        return SchemaInfo(dct, self._rootschema, cache=self._cache)
 
     def __iter__(self):
         return iter(self._properties)
@@ -123,9 +322,28 @@ class SchemaProperties(object):
         return (self[key] for key in self)
 
 
+# Marker for descriptions which are currently being computed
+_IN_PROGRESS = object()
+
+
 class SchemaInfo(object):
-    """A wrapper for inspecting a JSON schema"""
-    def __init__(self, schema, rootschema=None, validate=False):
+    """A wrapper for inspecting a JSON schema
+
+    Parameters
+    ----------
+    schema : dict or SchemaBase class
+        The schema to inspect
+    rootschema : dict, optional
+        The root schema used to resolve references
+    validate : boolean, default False
+        If True, then validate schema and rootschema against the metaschema
+    cache : dict, optional
+        A dictionary in which computed descriptions are memoized. It is shared
+        with all child SchemaInfo objects, and may be passed to several
+        SchemaInfo objects with the same rootschema so that each distinct
+        subschema is only described once.
+    """
+    def __init__(self, schema, rootschema=None, validate=False, cache=None):
         if hasattr(schema, '_schema'):
             if hasattr(schema, '_rootschema'):
                 schema, rootschema = schema._schema, schema._rootschema
@@ -134,15 +352,39 @@ class SchemaInfo(object):
         elif not rootschema:
             rootschema = schema
         if validate:
-            metaschema = load_metaschema()
-            jsonschema.validate(schema, metaschema)
-            jsonschema.validate(rootschema, metaschema)
+            validate_schema(schema)
+            validate_schema(rootschema)
         self.raw_schema = schema
         self.rootschema = rootschema
         self.schema = resolve_references(schema, rootschema)
+        self._cache = {} if cache is None else cache
 
     def child(self, schema):
-        return self.__class__(schema, rootschema=self.rootschema)
+        return self.__class__(schema, rootschema=self.rootschema,
+                              cache=self._cache)
+
+    def _cached(self, name, compute):
+        """Memoize compute() for this schema node within the shared cache
+
+        Entries keep references to the schemas they are keyed on, so that the
+        ids in the key cannot be reused while the cache is alive. If a node is
+        re-entered while its description is being computed (i.e. a recursive
+        chain of references) then a placeholder description is returned.
+        """
+        key = (name, id(self.raw_schema), id(self.rootschema))
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[-1] is _IN_PROGRESS:
+                return 'any'
+            return entry[-1]
+        self._cache[key] = (self.raw_schema, self.rootschema, _IN_PROGRESS)
+        try:
+            value = compute()
+        except:
+            del self._cache[key]
+            raise
+        self._cache[key] = (self.raw_schema, self.rootschema, value)
+        return value
 
     def __repr__(self):
         keys = []
@@ -167,6 +409,9 @@ class SchemaInfo(object):
 
     @property
     def short_description(self):
+        return self._cached('short_description', self._short_description)
+
+    def _short_description(self):
         if self.title:
             # use RST syntax for generated sphinx docs
             return ":class:`{}`".format(self.title)
@@ -175,6 +420,9 @@ class SchemaInfo(object):
 
     @property
     def medium_description(self):
+        return self._cached('medium_description', self._medium_description)
+
+    def _medium_description(self):
         _simple_types = {'string': 'string',
                          'number': 'float',
                          'integer': 'integer',
@@ -199,9 +447,8 @@ class SchemaInfo(object):
             return 'not {}'.format(self.not_.short_description)
         elif isinstance(self.type, list):
             options = []
-            subschema = SchemaInfo(dict(**self.schema))
             for typ_ in self.type:
-                subschema.schema['type'] = typ_
+                subschema = SchemaInfo(dict(self.schema, type=typ_))
                 options.append(subschema.short_description)
             return "anyOf({})".format(', '.join(options))
         elif self.is_object():
@@ -224,12 +471,12 @@ class SchemaInfo(object):
     @property
     def properties(self):
         return SchemaProperties(self.schema.get('properties', {}),
-                                self.schema, self.rootschema)
+                                self.schema, self.rootschema, self._cache)
 
     @property
     def definitions(self):
         return SchemaProperties(self.schema.get('definitions', {}),
-                                self.schema, self.rootschema)
+                                self.schema, self.rootschema, self._cache)
 
     @property
     def required(self):
@@ -347,8 +594,7 @@ class SchemaInfo(object):
         Only properties which are not valid Python identifiers will be included in
         the dictionary.
         """
-        pairs = [(prop, get_valid_identifier(prop)) for prop in self.properties]
-        return {prop: val for prop, val in pairs if prop != val}
+        return property_name_map(self.properties)
 
 
 def indent_arglist(args, indent_level, width=100, lstrip=True):
@@ -363,6 +609,42 @@ def indent_arglist(args, indent_level, width=100, lstrip=True):
     return wrapped
 
 
+@functools.lru_cache(maxsize=128)
+def _docstring_wrappers(indent, width):
+    """Return the (text, list item) TextWrappers for an indentation level"""
+    wrapper = textwrap.TextWrapper(width=width - indent,
+                                   initial_indent=indent * ' ',
+                                   subsequent_indent=indent * ' ',
+                                   break_long_words=False,
+                                   break_on_hyphens=False,
+                                   drop_whitespace=True)
+    list_wrapper = textwrap.TextWrapper(width=width - indent,
+                                        initial_indent=indent * ' ' + '* ',
+                                        subsequent_indent=indent * ' ' + '  ',
+                                        break_long_words=False,
+                                        break_on_hyphens=False,
+                                        drop_whitespace=True)
+    return wrapper, list_wrapper
+
+
+@functools.lru_cache(maxsize=4096)
+def _wrap_docstring_text(text, indent, width):
+    """Wrap a stripped block of docstring text, returning a tuple of lines
+
+    Results are cached: descriptions are frequently repeated within schemas.
+    """
+    wrapper, list_wrapper = _docstring_wrappers(indent, width)
+    final_lines = []
+    for line in text.split("\n"):
+        if line == '':
+            final_lines.append('')
+        elif line.startswith('* '):
+            final_lines.extend(list_wrapper.wrap(line[2:]))
+        else:
+            final_lines.extend(wrapper.wrap(line.lstrip()))
+    return tuple(final_lines)
+
+
 def indent_docstring(lines, indent_level, width=100, lstrip=True):
     """Indent a docstring for use in generated code"""
     final_lines = []
@@ -372,25 +654,7 @@ def indent_docstring(lines, indent_level, width=100, lstrip=True):
         if stripped:
             leading_space = len(line) - len(stripped)
             indent = indent_level + leading_space
-            wrapper = textwrap.TextWrapper(width=width - indent,
-                                            initial_indent= indent * ' ',
-                                            subsequent_indent=indent * ' ',
-                                            break_long_words=False,
-                                            break_on_hyphens=False,
-                                            drop_whitespace=True)
-            list_wrapper = textwrap.TextWrapper(width=width - indent,
-                                                initial_indent= indent * ' '+'* ',
-                                                subsequent_indent=indent * ' '+ '  ',
-                                                break_long_words=False,
-                                                break_on_hyphens=False,
-                                                drop_whitespace=True)
-            for line in stripped.split("\n"):
-                if line == '':
-                    final_lines.append('')
-                elif line.startswith('* '):
-                    final_lines.extend(list_wrapper.wrap(line[2:]))
-                else: 
-                    final_lines.extend(wrapper.wrap(line.lstrip()))
+            final_lines.extend(_wrap_docstring_text(stripped, indent, width))
 
         # If this is the last line, put in an indent
         elif i + 1 == len(lines):
@@ -399,12 +663,8 @@ def indent_docstring(lines, indent_level, width=100, lstrip=True):
         else:
             final_lines.append('')
     # Remove any trailing whitespaces on the right side
-    stripped_lines = []
-    for i, line in enumerate(final_lines):
-        if i + 1 == len(final_lines):
-            stripped_lines.append(line)
-        else:
-            stripped_lines.append(line.rstrip())
+    stripped_lines = [line.rstrip() for line in final_lines[:-1]]
+    stripped_lines.extend(final_lines[-1:])
     # Join it all together
     wrapped = '\n'.join(stripped_lines)
     if lstrip: